@@ -5,9 +5,12 @@ from typing import Awaitable
 from cmyui.logging import Ansi
 from cmyui.logging import log
 
+import misc.write_queue
 import packets
 from constants.privileges import Privileges
 from objects import glob
+from objects.beatmap import refresh_stale_sets
+from objects.player import flush_latest_activity
 
 __all__ = ('initialize_housekeeping_tasks',)
 
@@ -21,6 +24,9 @@ async def initialize_housekeeping_tasks() -> None:
             _remove_expired_donation_privileges(interval=30 * 60),
             _reroll_bot_status(interval=5 * 60),
             _disconnect_ghosts(interval=OSU_CLIENT_MIN_PING_INTERVAL // 3),
+            _flush_write_queue(interval=glob.config.write_queue_interval),
+            _flush_latest_activity(interval=glob.config.activity_flush_interval),
+            _refresh_stale_beatmapsets(interval=glob.config.beatmapset_refresh_interval),
         )
     ]
 
@@ -30,7 +36,7 @@ async def _remove_expired_donation_privileges(interval: int) -> None:
     while True:
         log('Removing expired donation privileges.', Ansi.LMAGENTA)
 
-        glob.db.users.find_and_modify(
+        await glob.db.users.update_many(
             {'privileges.donor': True, 'privileges.expire': {'$lt': time.time()}},
             {'$unset': {'privileges.donor': True}},
         )
@@ -59,3 +65,28 @@ async def _reroll_bot_status(interval: int) -> None:
     while True:
         await asyncio.sleep(interval)
         packets.botStats.cache_clear()
+
+
+async def _flush_write_queue(interval: float) -> None:
+    """Send queued database writes in bulk, every `interval`
+       (or sooner, if enough writes have queued up)."""
+    while True:
+        await misc.write_queue.wait_for_writes(timeout=interval)
+
+        # shielded so cancelling the loop at shutdown
+        # can't drop a batch we're part way through.
+        await asyncio.shield(misc.write_queue.flush())
+
+
+async def _flush_latest_activity(interval: int) -> None:
+    """Write players' latest activity times in bulk, every `interval`."""
+    while True:
+        await asyncio.sleep(interval)
+        await asyncio.shield(flush_latest_activity())
+
+
+async def _refresh_stale_beatmapsets(interval: int) -> None:
+    """Refresh expired beatmap sets from the osu!api, every `interval`."""
+    while True:
+        await asyncio.sleep(interval)
+        await refresh_stale_sets(glob.config.beatmapset_refresh_batch)
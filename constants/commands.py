@@ -1,7 +1,5 @@
-import asyncio
 import copy
 import importlib
-import math
 import os
 import pprint
 import random
@@ -20,10 +18,11 @@ from typing import (TYPE_CHECKING, Awaitable, Callable, NamedTuple, Optional,
                     Sequence, TypedDict, Union)
 
 import cmyui.utils
+import misc.osuapi
+import misc.performance
 import misc.utils
 import packets
 import psutil
-from cmyui.osu.oppai_ng import OppaiWrapper
 from misc.utils import seconds_readable
 from objects import glob
 from objects.beatmap import Beatmap, RankedStatus, ensure_local_osu_file
@@ -32,9 +31,7 @@ from objects.match import (MapPool, Match, MatchTeams, MatchTeamTypes,
                            MatchWinConditions, SlotStatus)
 from objects.player import Player
 from objects.score import SubmissionStatus
-from peace_performance_python.objects import Beatmap as PeaceMap
-from peace_performance_python.objects import Calculator as PeaceCalculator
-from pymongo import ASCENDING
+from pymongo import ASCENDING, UpdateOne
 
 from constants import regexes
 from constants.gamemodes import GameMode
@@ -238,14 +235,14 @@ async def changename(ctx: Context) -> Optional[str]:
         return 'Disallowed username; pick another.'
 
     # check if name is already in use using mongodb
-    if glob.db.players.find_one({'name': name}):
+    if await glob.db.users.find_one({'name': name}):
         return 'Username already in use.'
 
     # all checks passed, update their name
     safe_name = name.lower().replace(' ', '_')
 
     # Convert to mongodb
-    glob.db.users.update_one(
+    await glob.db.users.update_one(
         {'_id': ctx.player.id},
         {'$set': {'name': name, 'safe_name': safe_name}}
     )
@@ -318,6 +315,32 @@ async def recent(ctx: Context) -> Optional[str]:
 # TODO: !compare (compare to previous !last/!top post's map)
 
 
+async def _with_pp(
+    bmap: Beatmap, mode_vn: int,
+    params: misc.performance.PPParams,
+    step: Optional[float]
+) -> Optional[tuple[float, float]]:
+    """Calculate pp for !with, using the map's pp table where possible."""
+    if mode_vn == 3:  # mania
+        steps = glob.config.pp_cached_scores
+    else:
+        steps = glob.config.pp_cached_accs
+
+    if step is not None and step in steps:
+        # a common acc/score step, the map's pp table has us covered.
+        if values := await bmap.get_pp(mode_vn, Mods(params.mods or 0)):
+            return values[steps.index(step)]
+
+        return
+
+    osu_file_path = BEATMAPS_PATH / f'{bmap.id}.osu'
+    if not await ensure_local_osu_file(osu_file_path, bmap.id, bmap.md5):
+        return
+
+    return await misc.performance.calculate(bmap.md5, osu_file_path,
+                                            mode_vn, params)
+
+
 @command(Privileges.Normal, aliases=['w'], hidden=True)
 async def _with(ctx: Context) -> Optional[str]:
     """Specify custom accuracy & mod combinations with `/np`."""
@@ -328,12 +351,6 @@ async def _with(ctx: Context) -> Optional[str]:
         return 'Please /np a map first!'
 
     bmap: Beatmap = ctx.player.last_np['bmap']
-
-    osu_file_path = BEATMAPS_PATH / f'{bmap.id}.osu'
-    if not await ensure_local_osu_file(osu_file_path, bmap.id, bmap.md5):
-        return ('Mapfile could not be found; '
-                'this incident has been reported.')
-
     mode_vn = ctx.player.last_np['mode_vn']
 
     if mode_vn in (0, 1, 2):  # osu, taiko, catch
@@ -386,58 +403,34 @@ async def _with(ctx: Context) -> Optional[str]:
 
         msg = []
 
-        if mode_vn == 0:
-            with OppaiWrapper('oppai-ng/liboppai.so') as ezpp:
-                if mods is not None:
-                    ezpp.set_mods(int(mods))
-                    msg.append(f'{mods!r}')
+        if mods is not None:
+            msg.append(f'{mods!r}')
 
-                if nmiss is not None:
-                    ezpp.set_nmiss(nmiss)
-                    msg.append(f'{nmiss}m')
+        if nmiss is not None:
+            msg.append(f'{nmiss}m')
 
-                if combo is not None:
-                    ezpp.set_combo(combo)
-                    msg.append(f'{combo}x')
+        if combo is not None:
+            msg.append(f'{combo}x')
 
-                if acc is not None:
-                    ezpp.set_accuracy_percent(acc)
-                    msg.append(f'{acc:.2f}%')
+        if acc is not None:
+            msg.append(f'{acc:.2f}%')
 
-                ezpp.calculate(osu_file_path)
-                pp, sr = ezpp.get_pp(), ezpp.get_sr()
+        params = misc.performance.PPParams(
+            mods=int(mods) if mods is not None else None,
+            acc=acc, nmiss=nmiss, combo=combo
+        )
 
-                return f"{' '.join(msg)}: {pp:.2f}pp ({sr:.2f}*)"
+        if nmiss is None and combo is None:
+            step = acc if acc is not None else 100.0
         else:
-            beatmap = PeaceMap(osu_file_path)
-            peace = PeaceCalculator()
-
-            if mods is not None:
-                peace.set_mods(int(mods))
-                msg.append(f'{mods!r}')
-
-            if nmiss is not None:
-                peace.set_miss(nmiss)
-                msg.append(f'{nmiss}m')
-
-            if combo is not None:
-                peace.set_combo(combo)
-                msg.append(f'{combo}x')
-
-            if acc is not None:
-                peace.set_acc(acc)
-                msg.append(f'{acc:.2f}%')
+            step = None
 
-            if mode_vn:
-                peace.set_mode(mode_vn)
-
-            calculated = peace.calculate(beatmap)
+        if not (res := await _with_pp(bmap, mode_vn, params, step)):
+            return ('Mapfile could not be found; '
+                    'this incident has been reported.')
 
-            if calculated.pp not in (math.inf, math.nan):
-                return f"{' '.join(msg)}: {calculated.pp:.2f}pp ({calculated.stars:.2f}*)"
-            else:
-                # TODO: report to logserver
-                return f"{' '.join(msg)}: 0pp (0*)"
+        pp, sr = res
+        return f"{' '.join(msg)}: {pp:.2f}pp ({sr:.2f}*)"
     else:  # mania
         if not ctx.args or len(ctx.args) > 2:
             return 'Invalid syntax: !with <score/mods ...>'
@@ -457,19 +450,14 @@ async def _with(ctx: Context) -> Optional[str]:
             else:
                 return 'Invalid syntax: !with <score/mods ...>'
 
-        beatmap = PeaceMap(osu_file_path)
-        peace = PeaceCalculator()
-
-        if mods != Mods.NOMOD:
-            peace.set_mods(int(mods))
-
-        if mode_vn:
-            peace.set_mode(mode_vn)
+        params = misc.performance.PPParams(mods=int(mods), score=score * 1000)
 
-        peace.set_score(score * 1000)
+        if not (res := await _with_pp(bmap, mode_vn, params, score * 1000)):
+            return ('Mapfile could not be found; '
+                    'this incident has been reported.')
 
-        calc = peace.calculate(beatmap)
-        return f'{score}k {mods!r}: {calc.pp:.2f}pp ({calc.stars:.2f}*)'
+        pp, sr = res
+        return f'{score}k {mods!r}: {pp:.2f}pp ({sr:.2f}*)'
 
 
 @command(Privileges.Normal, aliases=['req'])
@@ -486,7 +474,7 @@ async def request(ctx: Context) -> Optional[str]:
     if bmap.status != RankedStatus.Pending:
         return 'Only pending maps may be requested for status change.'
 
-    glob.db.map_requests.insert_one({
+    await glob.db.map_requests.insert_one({
         'map_id': bmap.id,
         'player_id': ctx.player.id,
         'datetime': datetime.now(),
@@ -509,8 +497,8 @@ async def get_apikey(ctx: Context) -> Optional[str]:
     # generate new token
     ctx.player.api_key = str(uuid.uuid4())
 
-    glob.db.users.update_one(
-        {'id': ctx.player.id},
+    await glob.db.users.update_one(
+        {'_id': ctx.player.id},
         {'$set': {'api_key': ctx.player.api_key}}
     )
 
@@ -530,7 +518,7 @@ async def requests(ctx: Context) -> Optional[str]:
     if ctx.args:
         return 'Invalid syntax: !requests'
 
-    res = glob.db.map_requests.find({'active': True}).to_list(length=None)
+    res = await glob.db.map_requests.find({'active': True}).to_list(length=None)
 
     if not res:
         return 'The queue is clean! (0 map request(s))'
@@ -584,7 +572,7 @@ async def notes(ctx: Context) -> Optional[str]:
     elif days <= 0:
         return 'Invalid syntax: !notes <name> <days_back>'
 
-    res = glob.db.logs.find({
+    res = await glob.db.logs.find({
         'to': t.id,
         'time': {'$gte': datetime.now() - timedelta(days=days)
                  }
@@ -620,7 +608,7 @@ async def addnote(ctx: Context) -> Optional[str]:
     )
 
     # convert to mongodb
-    glob.db.logs.insert_one({
+    await glob.db.logs.insert_one({
         'from': ctx.player.id,
         'to': t.id,
         'msg': log_msg,
@@ -924,7 +912,7 @@ async def fakeusers(ctx: Context) -> Optional[str]:
             'login_time': 0x7fffffff  # never auto-dc
         }
 
-        _stats = packets.userStats(ctx.player)
+        _stats = ctx.player.stats_packet
 
         if _fake_users:
             current_fakes = max([x.id for x in _fake_users]
@@ -957,6 +945,9 @@ async def fakeusers(ctx: Context) -> Optional[str]:
             fake = copy.copy(base_player)
             fake.id = i
             fake.name = name
+            fake.safe_name = fake.make_safe(name)
+            fake.token = fake.generate_token()
+            fake.invalidate_packets()  # copied from base
 
             # append userpresence packet
             data += struct.pack(
@@ -1019,11 +1010,54 @@ async def stealth(ctx: Context) -> Optional[str]:
     return f'Stealth {"enabled" if ctx.player.stealth else "disabled"}.'
 
 
+async def _recalc_map(bmap_md5: str, osu_file_path: Path) -> None:
+    """Recalculate pp for all scores on a given map."""
+    for table in ('scores_vn', 'scores_rx', 'scores_ap'):
+        rows = await glob.db[table].find(
+            {'map_md5': bmap_md5},
+            {'mode': 1, 'acc': 1, 'mods': 1,
+             'max_combo': 1, 'nmiss': 1, 'score': 1}
+        ).to_list(None)
+
+        # group the scores by mode so each mode's scores can be
+        # sent to the pp calculation workers as a single batch.
+        by_mode: dict[int, list[dict]] = {}
+        for row in rows:
+            by_mode.setdefault(row['mode'], []).append(row)
+
+        updates = []
+
+        for mode_vn, mode_rows in by_mode.items():
+            if mode_vn == 3:  # mania
+                batch = [misc.performance.PPParams(
+                    mods=row['mods'], score=row['score']
+                ) for row in mode_rows]
+            else:
+                batch = [misc.performance.PPParams(
+                    mods=row['mods'], acc=row['acc'],
+                    nmiss=row['nmiss'], combo=row['max_combo']
+                ) for row in mode_rows]
+
+            results = await misc.performance.calculate_many(
+                bmap_md5, osu_file_path, mode_vn, batch
+            )
+
+            updates.extend(
+                UpdateOne({'_id': row['_id']}, {'$set': {'pp': pp}})
+                for row, (pp, _) in zip(mode_rows, results)
+            )
+
+        if updates:
+            await glob.db[table].bulk_write(updates, ordered=False)
+
+    # the scores' pp has changed; any cached top scores are stale.
+    for p in glob.players:
+        p.top_scores.clear()
+
+
 @command(Privileges.Dangerous)
 async def recalc(ctx: Context) -> Optional[str]:
     """Recalculate pp for a given map, or all maps."""
-    # NOTE: at the moment this command isn't very optimal and re-parses
-    # the beatmap file each iteration; this will be heavily improved.
     if len(ctx.args) != 1 or ctx.args[0] not in ('map', 'all'):
         return 'Invalid syntax: !recalc <map/all>'
 
@@ -1039,38 +1073,7 @@ async def recalc(ctx: Context) -> Optional[str]:
             return ('Mapfile could not be found; '
                     'this incident has been reported.')
 
-        with OppaiWrapper('oppai-ng/liboppai.so') as ezpp:
-            ezpp.set_mode(0)  # TODO: other modes
-            for table in ('scores_vn', 'scores_rx', 'scores_ap'):
-                await select_cursor.execute(
-                    'SELECT id, acc, mods, max_combo, nmiss '
-                    f'FROM {table} '
-                    'WHERE map_md5 = %s AND mode = 0',  # TODO: ""
-                    [bmap.md5]
-                )
-
-                async for row in select_cursor:
-                    ezpp.set_mods(row['mods'])
-                    ezpp.set_nmiss(row['nmiss'])  # clobbers acc
-                    ezpp.set_combo(row['max_combo'])
-                    ezpp.set_accuracy_percent(row['acc'])
-
-                    ezpp.calculate(osu_file_path)
-
-                    await update_cursor.execute(
-                        f'UPDATE {table} '
-                        'SET pp = %s '
-                        'WHERE id = %s',
-                        [ezpp.get_pp(), row['id']]
-                    )
-
-                    # convert to mongodb
-                    glob.db.scores.update_one(
-                        {'_id': row['id']},
-                        {'$set': {
-                            'pp': ezpp.get_pp()
-                        }}
-                    )
+        await _recalc_map(bmap.md5, osu_file_path)
 
         return f'Recalculated pp for {bmap.artist} - {bmap.title}.'
     else:
@@ -1081,17 +1084,12 @@ async def recalc(ctx: Context) -> Optional[str]:
             staff_chan.send_bot(f'{ctx.player} started a full recalculation.')
             st = time.time()
 
-            await bmap_select_cursor.execute(
-                'SELECT id, md5 '
-                'FROM maps '
-                'WHERE passes > 0'
-            )
-
-            map_count = bmap_select_cursor.rowcount
+            query = {'passes': {'$gt': 0}}
+            map_count = await glob.db.maps.count_documents(query)
             staff_chan.send_bot(f'Recalculating {map_count} maps.')
 
-            async for bmap_row in bmap_select_cursor:
-                bmap_id, bmap_md5 = bmap_row
+            async for bmap_row in glob.db.maps.find(query, {'id': 1, 'md5': 1}):
+                bmap_id, bmap_md5 = bmap_row['id'], bmap_row['md5']
 
                 osu_file_path = BEATMAPS_PATH / f'{bmap_id}.osu'
                 if not await ensure_local_osu_file(osu_file_path, bmap_id, bmap_md5):
@@ -1099,43 +1097,16 @@ async def recalc(ctx: Context) -> Optional[str]:
                                         f"{bmap_id} / {bmap_md5}")
                     continue
 
-                with OppaiWrapper('oppai-ng/liboppai.so') as ezpp:
-                    ezpp.set_mode(0)  # TODO: other modes
-                    for table in ('scores_vn', 'scores_rx', 'scores_ap'):
-                        await score_select_cursor.execute(
-                            'SELECT id, acc, mods, max_combo, nmiss '
-                            f'FROM {table} '
-                            'WHERE map_md5 = %s AND mode = 0',  # TODO: ""
-                            [bmap_md5]
-                        )
-
-                        async for row in score_select_cursor:
-                            ezpp.set_mods(row['mods'])
-                            # clobbers acc
-                            ezpp.set_nmiss(row['nmiss'])
-                            ezpp.set_combo(row['max_combo'])
-                            ezpp.set_accuracy_percent(row['acc'])
-
-                            ezpp.calculate(osu_file_path)
-
-                            await update_cursor.execute(
-                                f'UPDATE {table} '
-                                'SET pp = %s '
-                                'WHERE id = %s',
-                                [ezpp.get_pp(), row['id']]
-                            )
-
-                # leave at least 1/100th of
-                # a second for handling conns.
-                await asyncio.sleep(0.01)
+                # the calculations themselves are done by the
+                # pp workers, so the event loop is free meanwhile.
+                await _recalc_map(bmap_md5, osu_file_path)
 
-                elapsed = misc.utils.seconds_readable(int(time.time() - st))
-                staff_chan.send_bot(
-                    f'Recalculation complete. | Elapsed: {elapsed}')
+            elapsed = misc.utils.seconds_readable(int(time.time() - st))
+            staff_chan.send_bot(f'Recalculation complete. | Elapsed: {elapsed}')
 
-            glob.loop.create_task(recalc_all())
+        glob.loop.create_task(recalc_all())
 
-            return 'Starting a full recalculation.'
+        return 'Starting a full recalculation.'
 
 
 @command(Privileges.Dangerous, hidden=True)
@@ -1144,6 +1115,16 @@ async def debug(ctx: Context) -> Optional[str]:
     glob.app.debug = not glob.app.debug
     return f"Toggled {'on' if glob.app.debug else 'off'}."
 
+@command(Privileges.Admin, hidden=True)
+async def cache(ctx: Context) -> Optional[str]:
+    """Display the size & hit rates of the server's caches."""
+    return '\n'.join([
+        f'{c.name}: {len(c)} entries ({c.size // 1024}KB) | '
+        f'{c.hit_rate:.1%} hits | {c.evictions} evicted | '
+        f'{c.expirations} expired'
+        for c in glob.cache.values()
+    ])
+
 # NOTE: these commands will likely be removed
 #       with the addition of a good frontend.
 str_priv_dict = {
@@ -1214,10 +1195,14 @@ async def wipemap(ctx: Context) -> Optional[str]:
     map_md5 = ctx.player.last_np['bmap'].md5
 
     for t in ('vn', 'rx', 'ap'):
-        glob.db[f'scores_{t}'].delete_many(
+        await glob.db[f'scores_{t}'].delete_many(
             {'map_md5': map_md5}
         )
 
+    # the map's scores no longer count; any cached top scores are stale.
+    for p in glob.players:
+        p.top_scores.clear()
+
     return 'Scores wiped.'
 
 
@@ -1296,6 +1281,7 @@ async def server(ctx: Context) -> Optional[str]:
 
     mirror_url = glob.config.mirror
     using_osuapi = glob.config.osu_api_key != ''
+    osuapi_metrics = misc.osuapi.metrics
     advanced_mode = glob.config.advanced
     auto_logging = glob.config.automatically_report_problems
 
@@ -1304,6 +1290,8 @@ async def server(ctx: Context) -> Optional[str]:
         f'cpu(s): {cpus_info}',
         f'ram: {ram_info}',
         f'mirror: {mirror_url} | osu!api connection: {using_osuapi}',
+        'osu!api: {requests} requests ({failures} failed, {retries} retried, '
+        '{rate_limited} rate limited) | {wait_time:.1f}s queued'.format(**osuapi_metrics),
         f'advanced mode: {advanced_mode} | auto logging: {auto_logging}',
         '',
         'requirements',
@@ -2040,14 +2028,14 @@ async def pool_create(ctx: Context) -> Optional[str]:
         return 'Pool already exists by that name!'
 
     # convert to mongodb format
-    glob.db.tourney_pools.insert_one({
+    await glob.db.tourney_pools.insert_one({
         'name': name,
         'created_at': datetime.datetime.utcnow(),
         'created_by': ctx.player.id,
     })
 
     # add to cache (get from sql for id & time)
-    res = glob.db.tourney_pools.find_one({'name': name})
+    res = await glob.db.tourney_pools.find_one({'name': name})
 
     res['created_by'] = await glob.players.get_ensure(id=res['created_by'])
 
@@ -2151,7 +2139,7 @@ async def pool_remove(ctx: Context) -> Optional[str]:
         return f'Found no {mods_slot} pick in the pool.'
 
     # convert to mongodb format
-    glob.db.tourney_pool_maps.delete_one({
+    await glob.db.tourney_pool_maps.delete_one({
         'mods': mods,
         'slot': slot,
     })
@@ -2249,7 +2237,7 @@ async def clan_create(ctx: Context) -> Optional[str]:
     # https://stackoverflow.com/questions/14892731/how-to-get-mongodb-document-id-in-python
 
     # convert to mongodb format
-    clan_id = glob.db.tourney_clans.insert_one({
+    clan_id = await glob.db.tourney_clans.insert_one({
         'name': name,
         'tag': tag,
         'created_at': created_at,
@@ -2290,7 +2278,7 @@ async def clan_disband(ctx: Context) -> Optional[str]:
             return "You're not a member of a clan!"
 
     # convert to mongodb format
-    glob.db.clans.delete_one({
+    await glob.db.clans.delete_one({
         '_id': clan.id,
     })
 
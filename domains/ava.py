@@ -2,6 +2,7 @@ import re
 from pathlib import Path
 from typing import Optional, Union
 
+import misc.fileio
 from cmyui.web import Connection, Domain
 from objects import glob
 
@@ -24,13 +25,13 @@ async def get_avatar(conn: Connection) -> HTTPResponse:
     if '.' in filename:
         # user id & file extension provided
         path = AVATARS_PATH / filename
-        if not path.exists():
+        if not await misc.fileio.exists(path):
             path = DEFAULT_AVATAR
     elif filename not in ('', 'favicon.ico'):
         # user id provided - determine file extension
         for ext in ('jpg', 'jpeg', 'png'):
             path = AVATARS_PATH / f'{filename}.{ext}'
-            if path.exists():
+            if await misc.fileio.exists(path):
                 break
         else:
             # no file exists
@@ -41,4 +42,4 @@ async def get_avatar(conn: Connection) -> HTTPResponse:
 
     ext = 'png' if path.suffix == '.png' else 'jpeg'
     conn.resp_headers['Content-Type'] = f'image/{ext}'
-    return path.read_bytes()
+    return await misc.fileio.read_bytes(path)
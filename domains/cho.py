@@ -1,33 +1,30 @@
 import asyncio
 import ipaddress
 import re
-import struct
 import time
 from datetime import date, datetime, timedelta
-from pathlib import Path
 from typing import Callable, Optional, Type, Union
 
-import bcrypt
+import misc.osuapi
+import misc.passwords
 import misc.utils
 import packets
 from cmyui.logging import RGB, Ansi, log
-from cmyui.osu.oppai_ng import OppaiWrapper
 from cmyui.utils import magnitude_fmt_time
 from cmyui.web import Connection, Domain
 from constants import commands, regexes
 from constants.gamemodes import GameMode
 from constants.mods import SPEED_CHANGING_MODS, Mods
 from constants.privileges import ClientPrivileges, Privileges
+from misc.osuapi import Priority
 from objects import glob
-from objects.beatmap import Beatmap, ensure_local_osu_file
+from objects.beatmap import Beatmap
 from objects.channel import Channel
 from objects.clan import ClanPrivileges
 from objects.match import MatchTeams, MatchTeamTypes, Slot, SlotStatus
 from objects.menu import Menu, MenuCommands, MenuFunction
 from objects.player import Action, Player, PresenceFilter
 from packets import BanchoPacketReader, BasePacket, ClientPackets
-from peace_performance_python.objects import Beatmap as PeaceMap
-from peace_performance_python.objects import Calculator as PeaceCalculator
 
 HTTPResponse = Optional[Union[bytes, tuple[int, bytes]]]
 
@@ -35,8 +32,6 @@ IPAddress = Union[ipaddress.IPv4Address, ipaddress.IPv6Address]
 
 """ Bancho: handle connections from the osu! client """
 
-BEATMAPS_PATH = Path.cwd() / '.data/osu'
-
 BASE_DOMAIN = glob.config.domain
 _domain_escaped = BASE_DOMAIN.replace('.', r'\.')
 domain = Domain(re.compile(rf'^c[e4-6]?\.(?:{_domain_escaped}|ppy\.sh)$'))
@@ -89,8 +84,7 @@ async def bancho_handler(conn: Connection) -> HTTPResponse:
     if 'osu-token' not in conn.headers:
         # login is a bit of a special case,
         # so we'll handle it separately.
-        async with glob.players._lock:
-            login_data = await login(conn.body, ip)
+        login_data = await login(conn.body, ip)
 
         if login_data is None:
             # invalid login; failed.
@@ -186,12 +180,17 @@ class ChangeAction(BasePacket):
         elif p.status.mods & Mods.AUTOPILOT:
             self.mode = 7
 
-        p.status.mode = GameMode(self.mode)
+        if p.status.mode != (new_mode := GameMode(self.mode)):
+            # the mode is also sent in presence
+            # packets, and so that must be wiped.
+            p.status.mode = new_mode
+            p.invalidate_packets()
+
         p.status.map_id = self.map_id
 
         # broadcast it to all online players.
         if not p.restricted:
-            glob.players.enqueue(packets.userStats(p))
+            glob.players.enqueue(p.stats_packet)
 
 
 IGNORED_CHANNELS = ['#highlight', '#userlog']
@@ -293,7 +292,8 @@ class SendMessage(BasePacket):
                 # the player is /np'ing a map.
                 # save it to their player instance
                 # so we can use this elsewhere owo..
-                bmap = await Beatmap.from_bid(int(r_match['bid']))
+                with misc.osuapi.priority(Priority.Leaderboard):
+                    bmap = await Beatmap.from_bid(int(r_match['bid']))
 
                 if bmap:
                     # parse mode_vn int from regex
@@ -342,7 +342,7 @@ class Logout(BasePacket):
 @register(ClientPackets.REQUEST_STATUS_UPDATE, restricted=True)
 class StatsUpdateRequest(BasePacket):
     async def handle(self, p: Player) -> None:
-        p.enqueue(packets.userStats(p))
+        p.enqueue(p.stats_packet)
 
 
 # Some messages to send on welcome/restricted/etc.
@@ -382,7 +382,7 @@ async def login(
     client sends a request without an 'osu-token' header.
 
     Some notes:
-      this must be called with glob.players._lock held.
+      glob.players._lock is taken once the credentials are verified.
       we return a tuple of (response_bytes, user_token) on success.
 
     Request format:
@@ -471,28 +471,9 @@ async def login(
 
     login_time = time.time()
 
-    # TODO: improve tourney client support, this is not great.
-    if not using_tourney_client:
-        # Check if the player is already online
-        if p := glob.players.get(name=username):
-            # player is online, only allow multiple
-            # logins if they're on a tourney client.
-            if not p.tourney_client:
-                if (login_time - p.last_recv_time) > 10:
-                    # if the current player obj online hasn't
-                    # pinged the server in > 10 seconds, log
-                    # them out and login the new user.
-                    p.logout()
-                else:
-                    # the user is currently online, send back failure.
-                    data = packets.userID(-1) + \
-                        packets.notification('User already logged in.')
-
-                    return data, 'no'
-
     # userid = _id not id
 
-    user_info = glob.db.users.find_one({'name': username})
+    user_info = await glob.db.users.find_one({'name': username})
 
     if not user_info:
         # no account by this name exists.
@@ -509,296 +490,310 @@ async def login(
         # trying to use tourney client with insufficient privileges.
         return packets.userID(-1), 'no'
 
-    # get our bcrypt cache.
-    bcrypt_cache = glob.cache['bcrypt']
     pw_bcrypt = user_info['pw_bcrypt'].encode()
     user_info['pw_bcrypt'] = pw_bcrypt
 
     # check credentials against db. algorithms like these are intentionally
-    # designed to be slow; we'll cache the results to speed up subsequent logins.
-    if pw_bcrypt in bcrypt_cache:  # ~0.01 ms
-        if pw_md5 != bcrypt_cache[pw_bcrypt]:
-            return (packets.notification(f'{BASE_DOMAIN}: Incorrect password') +
-                    packets.userID(-1)), 'no'
-    else:  # ~200ms
-        if not bcrypt.checkpw(pw_md5, pw_bcrypt):
-            return (packets.notification(f'{BASE_DOMAIN}: Incorrect password') +
-                    packets.userID(-1)), 'no'
-
-        bcrypt_cache[pw_bcrypt] = pw_md5
+    # designed to be slow; the check runs in a worker pool (off the event
+    # loop) & the results are cached to speed up subsequent logins.
+    if not await misc.passwords.verify_password(pw_md5, pw_bcrypt):
+        return (packets.notification(f'{BASE_DOMAIN}: Incorrect password') +
+                packets.userID(-1)), 'no'
 
     """ login credentials verified """
 
-    glob.db.ingame_logins.insert_one(
-        {
-            'userid': user_info['id'],
-            'ip': str(ip),
-            'osu_ver': osu_ver_date,
-            'osu_stream': osu_ver_stream,
-            'datetime': datetime.utcnow()
-        }
-    )
+    # credentials are checked before taking the lock, so a slow
+    # bcrypt check doesn't hold up every other login behind it.
+    async with glob.players._lock:
+        # TODO: improve tourney client support, this is not great.
+        if not using_tourney_client:
+            # Check if the player is already online
+            if p := glob.players.get(name=username):
+                # player is online, only allow multiple
+                # logins if they're on a tourney client.
+                if not p.tourney_client:
+                    if (login_time - p.last_recv_time) > 10:
+                        # if the current player obj online hasn't
+                        # pinged the server in > 10 seconds, log
+                        # them out and login the new user.
+                        p.logout()
+                    else:
+                        # the user is currently online, send back failure.
+                        data = packets.userID(-1) + \
+                            packets.notification('User already logged in.')
+
+                        return data, 'no'
+
+        await glob.db.ingame_logins.insert_one(
+            {
+                'userid': user_info['id'],
+                'ip': str(ip),
+                'osu_ver': osu_ver_date,
+                'osu_stream': osu_ver_stream,
+                'datetime': datetime.utcnow()
+            }
+        )
 
-    # await db_cursor.execute(
-    #     'INSERT INTO client_hashes '
-    #     '(userid, osupath, adapters, uninstall_id,'
-    #     ' disk_serial, latest_time, occurrences) '
-    #     'VALUES (%s, %s, %s, %s, %s, NOW(), 1) '
-    #     'ON DUPLICATE KEY UPDATE '
-    #     'occurrences = occurrences + 1, '
-    #     'latest_time = NOW() ',
-    #     [user_info['id'], osu_path_md5,
-    #      adapters_md5, uninstall_md5, disk_sig_md5]
-    # )
+        # await db_cursor.execute(
+        #     'INSERT INTO client_hashes '
+        #     '(userid, osupath, adapters, uninstall_id,'
+        #     ' disk_serial, latest_time, occurrences) '
+        #     'VALUES (%s, %s, %s, %s, %s, NOW(), 1) '
+        #     'ON DUPLICATE KEY UPDATE '
+        #     'occurrences = occurrences + 1, '
+        #     'latest_time = NOW() ',
+        #     [user_info['id'], osu_path_md5,
+        #      adapters_md5, uninstall_md5, disk_sig_md5]
+        # )
     
-    #convert to mongodb format
-    glob.db.client_hashes.insert_one(
-        {
-            'userid': user_info['id'],
-            'osupath': osu_path_md5,
-            'adapters': adapters_md5,
-            'uninstall_id': uninstall_md5,
-            'disk_serial': disk_sig_md5,
-            'latest_time': datetime.utcnow()
-        }
-    )
+        #convert to mongodb format
+        await glob.db.client_hashes.insert_one(
+            {
+                'userid': user_info['id'],
+                'osupath': osu_path_md5,
+                'adapters': adapters_md5,
+                'uninstall_id': uninstall_md5,
+                'disk_serial': disk_sig_md5,
+                'latest_time': datetime.utcnow()
+            }
+        )
 
-    # TODO: store adapters individually
+        # TODO: store adapters individually
 
-    if is_wine:
-        hw_checks = 'h.uninstall_id = %s'
-        hw_args = [uninstall_md5]
-    else:
-        hw_checks = ('h.adapters = %s OR '
-                     'h.uninstall_id = %s OR '
-                     'h.disk_serial = %s')
-        hw_args = [adapters_md5, uninstall_md5, disk_sig_md5]
-
-    res = glob.db.client_hashes.find_one(
-        {
-            'userid': user_info['id'],
-            'osupath': osu_path_md5,
-            '$or': [
-                {'adapters': adapters_md5},
-                {'uninstall_id': uninstall_md5},
-                {'disk_serial': disk_sig_md5}
-            ]
-        }
-    )
+        if is_wine:
+            hw_checks = 'h.uninstall_id = %s'
+            hw_args = [uninstall_md5]
+        else:
+            hw_checks = ('h.adapters = %s OR '
+                         'h.uninstall_id = %s OR '
+                         'h.disk_serial = %s')
+            hw_args = [adapters_md5, uninstall_md5, disk_sig_md5]
+
+        res = await glob.db.client_hashes.find_one(
+            {
+                'userid': user_info['id'],
+                'osupath': osu_path_md5,
+                '$or': [
+                    {'adapters': adapters_md5},
+                    {'uninstall_id': uninstall_md5},
+                    {'disk_serial': disk_sig_md5}
+                ]
+            }
+        )
         
-    if res:
-        # we have other accounts with matching hashes
-        hw_matches = None
+        if res:
+            # we have other accounts with matching hashes
+            hw_matches = None
 
-        if user_info['priv'] & Privileges.Verified:
-            # TODO: this is a normal, registered & verified player.
-            ...
-        else:
-            # this player is not verified yet, this is their first
-            # time connecting in-game and submitting their hwid set.
-            # we will not allow any banned matches; if there are any,
-            # then ask the user to contact staff and resolve manually.
-            if not all([hw_match['priv'] & Privileges.Normal
-                        for hw_match in hw_matches]):
-                return (packets.notification('Please contact staff directly '
-                                             'to create an account.') +
-                        packets.userID(-1)), 'no'
-
-    """ All checks passed, player is safe to login """
-
-    # get clan & clan priv if we're in a clan
-    if user_info['clan_id'] != 0:
-        clan = glob.clans.get(id=user_info.pop('clan_id'))
-        clan_priv = ClanPrivileges(user_info.pop('clan_priv'))
-    else:
-        del user_info['clan_id']
-        del user_info['clan_priv']
-        clan = clan_priv = None
-
-    db_country = user_info.pop('country')
-
-    if not ip.is_private:
-        if glob.geoloc_db is not None:
-            # good, dev has downloaded a geoloc db from maxmind,
-            # so we can do a local db lookup. (typically ~1-5ms)
-            # https://www.maxmind.com/en/home
-            user_info['geoloc'] = misc.utils.fetch_geoloc_db(ip)
+            if user_info['priv'] & Privileges.Verified:
+                # TODO: this is a normal, registered & verified player.
+                ...
+            else:
+                # this player is not verified yet, this is their first
+                # time connecting in-game and submitting their hwid set.
+                # we will not allow any banned matches; if there are any,
+                # then ask the user to contact staff and resolve manually.
+                if not all([hw_match['priv'] & Privileges.Normal
+                            for hw_match in hw_matches]):
+                    return (packets.notification('Please contact staff directly '
+                                                 'to create an account.') +
+                            packets.userID(-1)), 'no'
+
+        """ All checks passed, player is safe to login """
+
+        # get clan & clan priv if we're in a clan
+        if user_info['clan_id'] != 0:
+            clan = glob.clans.get(id=user_info.pop('clan_id'))
+            clan_priv = ClanPrivileges(user_info.pop('clan_priv'))
         else:
-            # bad, we must do an external db lookup using
-            # a public api. (depends, `ping ip-api.com`)
-            user_info['geoloc'] = await misc.utils.fetch_geoloc_web(ip)
-
-        if db_country == 'xx':
-            # bugfix for old gulag versions when
-            # country wasn't stored on registration.
-            log(f"Fixing {username}'s country.", Ansi.LGREEN)
+            del user_info['clan_id']
+            del user_info['clan_priv']
+            clan = clan_priv = None
+
+        db_country = user_info.pop('country')
+
+        if not ip.is_private:
+            if glob.geoloc_db is not None:
+                # good, dev has downloaded a geoloc db from maxmind,
+                # so we can do a local db lookup. (typically ~1-5ms)
+                # https://www.maxmind.com/en/home
+                user_info['geoloc'] = misc.utils.fetch_geoloc_db(ip)
+            else:
+                # bad, we must do an external db lookup using
+                # a public api. (depends, `ping ip-api.com`)
+                user_info['geoloc'] = await misc.utils.fetch_geoloc_web(ip)
+
+            if db_country == 'xx':
+                # bugfix for old gulag versions when
+                # country wasn't stored on registration.
+                log(f"Fixing {username}'s country.", Ansi.LGREEN)
             
-            glob.db.users.update_one(
-                {'id': user_info['id']},
-                {'$set': {'country': user_info['geoloc']['country']['acronym']}}
-            )
-
-    p = Player(
-        # {id, name, priv, pw_bcrypt, silence_end, api_key, geoloc?}
-        **user_info,
-        utc_offset=utc_offset,
-        osu_ver=osu_ver_date,
-        pm_private=pm_private,
-        login_time=login_time,
-        clan=clan,
-        clan_priv=clan_priv,
-        tourney_client=using_tourney_client
-    )
+                await glob.db.users.update_one(
+                    {'_id': user_info['id']},
+                    {'$set': {'country': user_info['geoloc']['country']['acronym']}}
+                )
 
-    data = bytearray(packets.protocolVersion(19))
-    data += packets.userID(p.id)
-
-    # *real* client privileges are sent with this packet,
-    # then the user's apparent privileges are sent in the
-    # userPresence packets to other players. we'll send
-    # supporter along with the user's privileges here,
-    # but not in userPresence (so that only donators
-    # show up with the yellow name in-game, but everyone
-    # gets osu!direct & other in-game perks).
-    data += packets.banchoPrivileges(
-        p.bancho_priv | ClientPrivileges.Supporter
-    )
+        p = Player(
+            # {id, name, priv, pw_bcrypt, silence_end, api_key, geoloc?}
+            **user_info,
+            utc_offset=utc_offset,
+            osu_ver=osu_ver_date,
+            pm_private=pm_private,
+            login_time=login_time,
+            clan=clan,
+            clan_priv=clan_priv,
+            tourney_client=using_tourney_client
+        )
 
-    data += WELCOME_NOTIFICATION
-
-    if not glob.has_internet:
-        data += OFFLINE_NOTIFICATION
-
-    # send all appropriate channel info to our player.
-    # the osu! client will attempt to join the channels.
-    for c in glob.channels:
-        if (
-            not c.auto_join or
-            not c.can_read(p.priv) or
-            c._name == '#lobby'  # (can't be in mp lobby @ login)
-        ):
-            continue
-
-        # send chan info to all players who can see
-        # the channel (to update their playercounts)
-        chan_info_packet = packets.channelInfo(
-            c._name, c.topic, len(c.players)
+        data = bytearray(packets.protocolVersion(19))
+        data += packets.userID(p.id)
+
+        # *real* client privileges are sent with this packet,
+        # then the user's apparent privileges are sent in the
+        # userPresence packets to other players. we'll send
+        # supporter along with the user's privileges here,
+        # but not in userPresence (so that only donators
+        # show up with the yellow name in-game, but everyone
+        # gets osu!direct & other in-game perks).
+        data += packets.banchoPrivileges(
+            p.bancho_priv | ClientPrivileges.Supporter
         )
 
-        data += chan_info_packet
+        data += WELCOME_NOTIFICATION
+
+        if not glob.has_internet:
+            data += OFFLINE_NOTIFICATION
+
+        # send all appropriate channel info to our player.
+        # the osu! client will attempt to join the channels.
+        for c in glob.channels:
+            if (
+                not c.auto_join or
+                not c.can_read(p.priv) or
+                c._name == '#lobby'  # (can't be in mp lobby @ login)
+            ):
+                continue
+
+            # send chan info to all players who can see
+            # the channel (to update their playercounts)
+            chan_info_packet = packets.channelInfo(
+                c._name, c.topic, len(c.players)
+            )
 
-        for o in glob.players:
-            if c.can_read(o.priv):
-                o.enqueue(chan_info_packet)
+            data += chan_info_packet
 
-    # tells osu! to reorder channels based on config.
-    data += packets.channelInfoEnd()
+            for o in glob.players:
+                if c.can_read(o.priv):
+                    o.enqueue(chan_info_packet)
 
-    # TODO: fetch p.recent_scores from sql
+        # tells osu! to reorder channels based on config.
+        data += packets.channelInfoEnd()
 
-    data += packets.mainMenuIcon()
-    data += packets.friendsList(*p.friends)
-    data += packets.silenceEnd(p.remaining_silence)
+        # TODO: fetch p.recent_scores from sql
 
-    # update our new player's stats, and broadcast them.
-    user_data = packets.userPresence(p) + packets.userStats(p)
+        data += packets.mainMenuIcon()
+        data += packets.friendsList(*p.friends)
+        data += packets.silenceEnd(p.remaining_silence)
 
-    data += user_data
+        # update our new player's stats, and broadcast them.
+        user_data = p.presence_packet + p.stats_packet
 
-    if not p.restricted:
-        # player is unrestricted, two way data
-        for o in glob.players:
-            # enqueue us to them
-            o.enqueue(user_data)
+        data += user_data
 
-            # enqueue them to us.
-            if not o.restricted:
-                data += packets.userPresence(o)
-                data += packets.userStats(o)
+        if not p.restricted:
+            # player is unrestricted, two way data
+            for o in glob.players:
+                # enqueue us to them
+                o.enqueue(user_data)
+
+                # enqueue them to us.
+                if not o.restricted:
+                    data += o.presence_packet
+                    data += o.stats_packet
+
+            # the player may have been sent mail while offline,
+            # enqueue any messages from their respective authors.
+            await db_cursor.execute(
+                'SELECT m.`msg`, m.`time`, m.`from_id`, '
+                '(SELECT name FROM users WHERE id = m.`from_id`) AS `from`, '
+                '(SELECT name FROM users WHERE id = m.`to_id`) AS `to` '
+                'FROM `mail` m WHERE m.`to_id` = %s AND m.`read` = 0',
+                [p.id]
+            )
 
-        # the player may have been sent mail while offline,
-        # enqueue any messages from their respective authors.
-        await db_cursor.execute(
-            'SELECT m.`msg`, m.`time`, m.`from_id`, '
-            '(SELECT name FROM users WHERE id = m.`from_id`) AS `from`, '
-            '(SELECT name FROM users WHERE id = m.`to_id`) AS `to` '
-            'FROM `mail` m WHERE m.`to_id` = %s AND m.`read` = 0',
-            [p.id]
-        )
+            if glob.db.mail.find({'to_id': p.id, 'read': 0}) is not None:
+                sent_to = set()  # ids
 
-        if glob.db.mail.find({'to_id': p.id, 'read': 0}) is not None:
-            sent_to = set()  # ids
+                async for msg in db_cursor:
+                    if msg['from'] not in sent_to:
+                        data += packets.sendMessage(
+                            sender=msg['from'], msg='Unread messages',
+                            recipient=msg['to'], sender_id=msg['from_id']
+                        )
+                        sent_to.add(msg['from'])
+
+                    msg_time = datetime.fromtimestamp(msg['time'])
+                    msg_ts = f'[{msg_time:%a %b %d @ %H:%M%p}] {msg["msg"]}'
 
-            async for msg in db_cursor:
-                if msg['from'] not in sent_to:
                     data += packets.sendMessage(
-                        sender=msg['from'], msg='Unread messages',
-                        recipient=msg['to'], sender_id=msg['from_id']
+                        sender=msg['from'],
+                        msg=msg_ts,
+                        recipient=msg['to'],
+                        sender_id=msg['from_id']
                     )
-                    sent_to.add(msg['from'])
 
-                msg_time = datetime.fromtimestamp(msg['time'])
-                msg_ts = f'[{msg_time:%a %b %d @ %H:%M%p}] {msg["msg"]}'
+            if not p.priv & Privileges.Verified:
+                # this is the player's first login, verify their
+                # account & send info about the server/its usage.
+                await p.add_privs(Privileges.Verified)
+
+                if p.id == 3:
+                    # this is the first player registering on
+                    # the server, grant them full privileges.
+                    await p.add_privs(
+                        Privileges.Staff | Privileges.Nominator |
+                        Privileges.Whitelisted | Privileges.Tournament |
+                        Privileges.Donator | Privileges.Alumni
+                    )
 
                 data += packets.sendMessage(
-                    sender=msg['from'],
-                    msg=msg_ts,
-                    recipient=msg['to'],
-                    sender_id=msg['from_id']
+                    sender=glob.bot.name, msg=WELCOME_MSG,
+                    recipient=p.name, sender_id=glob.bot.id
                 )
 
-        if not p.priv & Privileges.Verified:
-            # this is the player's first login, verify their
-            # account & send info about the server/its usage.
-            await p.add_privs(Privileges.Verified)
-
-            if p.id == 3:
-                # this is the first player registering on
-                # the server, grant them full privileges.
-                await p.add_privs(
-                    Privileges.Staff | Privileges.Nominator |
-                    Privileges.Whitelisted | Privileges.Tournament |
-                    Privileges.Donator | Privileges.Alumni
-                )
+        else:
+            # player is restricted, one way data
+            for o in glob.players.unrestricted:
+                # enqueue them to us.
+                data += o.presence_packet
+                data += o.stats_packet
 
+            data += packets.accountRestricted()
             data += packets.sendMessage(
-                sender=glob.bot.name, msg=WELCOME_MSG,
-                recipient=p.name, sender_id=glob.bot.id
+                sender=glob.bot.name,
+                msg=RESTRICTED_MSG,
+                recipient=p.name,
+                sender_id=glob.bot.id
             )
 
-    else:
-        # player is restricted, one way data
-        for o in glob.players.unrestricted:
-            # enqueue them to us.
-            data += packets.userPresence(o)
-            data += packets.userStats(o)
-
-        data += packets.accountRestricted()
-        data += packets.sendMessage(
-            sender=glob.bot.name,
-            msg=RESTRICTED_MSG,
-            recipient=p.name,
-            sender_id=glob.bot.id
-        )
+        # TODO: some sort of admin panel for staff members?
 
-    # TODO: some sort of admin panel for staff members?
+        # add `p` to the global player list,
+        # making them officially logged in.
+        glob.players.append(p)
 
-    # add `p` to the global player list,
-    # making them officially logged in.
-    glob.players.append(p)
+        if glob.datadog:
+            if not p.restricted:
+                glob.datadog.increment('gulag.online_players')
 
-    if glob.datadog:
-        if not p.restricted:
-            glob.datadog.increment('gulag.online_players')
+            time_taken = time.time() - login_time
+            glob.datadog.histogram('gulag.login_time', time_taken)
 
-        time_taken = time.time() - login_time
-        glob.datadog.histogram('gulag.login_time', time_taken)
+        user_os = 'unix (wine)' if is_wine else 'win32'
+        log(f'{p} logged in with {osu_ver_str} on {user_os}.', Ansi.LCYAN)
 
-    user_os = 'unix (wine)' if is_wine else 'win32'
-    log(f'{p} logged in with {osu_ver_str} on {user_os}.', Ansi.LCYAN)
-
-    p.update_latest_activity()
-    return bytes(data), p.token
+        p.update_latest_activity()
+        return bytes(data), p.token
 
 
 @register(ClientPackets.START_SPECTATING)
@@ -851,12 +846,12 @@ class SpectateFrames(BasePacket):
         self.frame_bundle = reader.read_replayframe_bundle()
 
     async def handle(self, p: Player) -> None:
+        # the bundle is never parsed here; we only rewrite
+        # the header & forward the client's data untouched.
         # packing this manually is about ~3x faster
         #data = packets.spectateFrames(self.frame_bundle.raw_data)
-        data = (
-            struct.pack('<HxI', 15, len(self.frame_bundle.raw_data)) +
-            self.frame_bundle.raw_data
-        )
+        raw_data = self.frame_bundle.raw_data
+        data = packets.PACKET_HEADER.pack(15, len(raw_data)) + raw_data
 
         # enqueue the data
         # to all spectators.
@@ -954,7 +949,7 @@ class SendPrivateMessage(BasePacket):
                     'receive your messsage on their next login.'
                 ))
 
-            glob.db.mail.insert_one(
+            await glob.db.mail.insert_one(
                 {
                     'from_id': p.id,
                     'to_id': t.id,
@@ -987,7 +982,8 @@ class SendPrivateMessage(BasePacket):
                     # user is /np'ing a map.
                     # save it to their player instance
                     # so we can use this elsewhere owo..
-                    bmap = await Beatmap.from_bid(int(r_match['bid']))
+                    with misc.osuapi.priority(Priority.Leaderboard):
+                        bmap = await Beatmap.from_bid(int(r_match['bid']))
 
                     if bmap:
                         # parse mode_vn int from regex
@@ -1007,86 +1003,40 @@ class SendPrivateMessage(BasePacket):
                             'timeout': time.time() + 300  # /np's last 5mins
                         }
 
-                        # calculate generic pp values from their /np
+                        # serve generic pp values from the map's pp table,
+                        # computing them (off the event loop) if required.
+                        pp_calc_st = time.time_ns()
 
-                        osu_file_path = BEATMAPS_PATH / f'{bmap.id}.osu'
-                        if not await ensure_local_osu_file(osu_file_path, bmap.id, bmap.md5):
-                            resp_msg = ('Mapfile could not be found; '
-                                        'this incident has been reported.')
+                        if r_match['mods'] is not None:
+                            # [1:] to remove leading whitespace
+                            mods_str = r_match['mods'][1:]
+                            mods = Mods.from_np(mods_str, mode_vn)
                         else:
-                            # calculate pp for common generic values
-                            pp_calc_st = time.time_ns()
-
-                            if mode_vn in (0, 1, 2):  # osu, taiko, catch
-                                if r_match['mods'] is not None:
-                                    # [1:] to remove leading whitespace
-                                    mods_str = r_match['mods'][1:]
-                                    mods = Mods.from_np(mods_str, mode_vn)
-                                else:
-                                    mods = None
-
-                                pp_values = []  # [(acc, pp), ...]
-
-                                if mode_vn == 0:
-                                    with OppaiWrapper('oppai-ng/liboppai.so') as ezpp:
-                                        if mods is not None:
-                                            ezpp.set_mods(int(mods))
-
-                                        for acc in glob.config.pp_cached_accs:
-                                            ezpp.set_accuracy_percent(acc)
-
-                                            ezpp.calculate(osu_file_path)
-
-                                            pp_values.append(
-                                                (acc, ezpp.get_pp()))
-                                else:
-                                    beatmap = PeaceMap(osu_file_path)
-                                    peace = PeaceCalculator()
-
-                                    if mods is not None:
-                                        peace.set_mods(int(mods))
+                            mods = Mods.NOMOD
 
-                                    peace.set_mode(mode_vn)
+                        pp_values = await bmap.get_pp(mode_vn, mods)
 
-                                    for acc in glob.config.pp_cached_accs:
-                                        peace.set_acc(acc)
-
-                                        calc = peace.calculate(beatmap)
-
-                                        pp_values.append((acc, calc.pp))
+                        # get the other common mod combinations
+                        # ready for any !with commands to come.
+                        bmap.warm_pp_cache(mode_vn)
 
+                        if pp_values is None:
+                            resp_msg = ('Mapfile could not be found; '
+                                        'this incident has been reported.')
+                        else:
+                            if mode_vn in (0, 1, 2):  # osu, taiko, catch
                                 resp_msg = ' | '.join([
                                     f'{acc}%: {pp:,.2f}pp'
-                                    for acc, pp in pp_values
+                                    for acc, (pp, _) in zip(
+                                        glob.config.pp_cached_accs, pp_values
+                                    )
                                 ])
                             else:  # mania
-                                if r_match['mods'] is not None:
-                                    # [1:] to remove leading whitespace
-                                    mods_str = r_match['mods'][1:]
-                                    mods = Mods.from_np(mods_str, mode_vn)
-                                else:
-                                    mods = None
-
-                                beatmap = PeaceMap(osu_file_path)
-                                peace = PeaceCalculator()
-
-                                if mods is not None:
-                                    peace.set_mods(int(mods))
-
-                                peace.set_mode(mode_vn)
-
-                                pp_values = []
-
-                                for score in glob.config.pp_cached_scores:
-                                    peace.set_score(int(score))
-
-                                    calc = peace.calculate(beatmap)
-
-                                    pp_values.append((score, calc.pp))
-
                                 resp_msg = ' | '.join([
                                     f'{int(score // 1000)}k: {pp:,.2f}pp'
-                                    for score, pp in pp_values
+                                    for score, (pp, _) in zip(
+                                        glob.config.pp_cached_scores, pp_values
+                                    )
                                 ])
 
                             elapsed = time.time_ns() - pp_calc_st
@@ -1851,12 +1801,14 @@ class StatsRequest(BasePacket):
         self.user_ids = reader.read_i32_list_i16l()
 
     async def handle(self, p: Player) -> None:
-        unrestrcted_ids = [p.id for p in glob.players.unrestricted]
-        def is_online(o): return o in unrestrcted_ids and o != p.id
+        unrestricted = glob.players.unrestricted
+
+        for pid in self.user_ids:
+            if pid == p.id:
+                continue
 
-        for online in filter(is_online, self.user_ids):
-            if t := glob.players.get(id=online):
-                p.enqueue(packets.userStats(t))
+            if (t := glob.players.get(id=pid)) and t in unrestricted:
+                p.enqueue(t.stats_packet)
 
 
 @register(ClientPackets.MATCH_INVITE)
@@ -1907,7 +1859,7 @@ class UserPresenceRequest(BasePacket):
     async def handle(self, p: Player) -> None:
         for pid in self.user_ids:
             if t := glob.players.get(id=pid):
-                p.enqueue(packets.userPresence(t))
+                p.enqueue(t.presence_packet)
 
 
 @register(ClientPackets.USER_PRESENCE_REQUEST_ALL)
@@ -1920,7 +1872,7 @@ class UserPresenceRequestAll(BasePacket):
         # NOTE: this packet is only used when there
         # are >256 players visible to the client.
 
-        p.enqueue(b''.join(map(packets.userPresence, glob.players.unrestricted)))
+        p.enqueue(b''.join([o.presence_packet for o in glob.players.unrestricted]))
 
 
 @register(ClientPackets.TOGGLE_BLOCK_NON_FRIEND_DMS)
@@ -20,24 +20,36 @@ from typing import TYPE_CHECKING
 from typing import Union
 from urllib.parse import unquote
 
-import bcrypt
 import orjson
+from bson import ObjectId
 from cmyui.logging import Ansi
 from cmyui.logging import log
 from cmyui.logging import printc
 from cmyui.web import Connection
 from cmyui.web import Domain
 from cmyui.web import ratelimit
+from pymongo import InsertOne
+from pymongo import UpdateOne
 
+import misc.fileio
+import misc.osuapi
+import misc.passwords
+import misc.replays
 import misc.utils
+import misc.write_queue
 import packets
 from constants import regexes
 from constants.clientflags import ClientFlags
 from constants.gamemodes import GameMode
 from constants.mods import Mods
+from misc.osuapi import Priority
 from objects import glob
 from objects.beatmap import Beatmap
 from objects.beatmap import RankedStatus
+from objects.beatmap import ensure_local_osu_file
+from objects.beatmap import read_osu_file
+from objects.leaderboard import Leaderboard
+from objects.leaderboard import LeaderboardEntry
 from objects.player import Privileges
 from objects.score import Grade
 from objects.score import Score
@@ -55,7 +67,6 @@ domain = Domain({f'osu.{BASE_DOMAIN}', 'osu.ppy.sh'})
 
 AVATARS_PATH = Path.cwd() / '.data/avatars'
 BEATMAPS_PATH = Path.cwd() / '.data/osu'
-REPLAYS_PATH = Path.cwd() / '.data/osr'
 SCREENSHOTS_PATH = Path.cwd() / '.data/ss'
 
 """ Some helper decorators (used for /web/ connections) """
@@ -190,12 +201,9 @@ async def osuScreenshot(p: 'Player', conn: Connection) -> HTTPResponse:
     while True:
         filename = f'{secrets.token_urlsafe(6)}.{extension}'
         ss_file = SCREENSHOTS_PATH / filename
-        if not ss_file.exists():
+        if await misc.fileio.create_bytes(ss_file, ss_data_view):
             break
 
-    with ss_file.open('wb') as f:
-        f.write(ss_data_view)
-
     log(f'{p} uploaded {filename}.')
     return filename.encode()
 
@@ -229,7 +237,7 @@ async def osuGetBeatmapInfo(p: 'Player',conn: Connection) -> HTTPResponse:
     for idx, map_filename in enumerate(data['Filenames']):
         # try getting the map from sql
 
-        res = glob.db.maps.find_one({'filename': map_filename})
+        res = await glob.db.maps.find_one({'filename': map_filename})
 
         if res is None:
             continue # no map found
@@ -243,7 +251,7 @@ async def osuGetBeatmapInfo(p: 'Player',conn: Connection) -> HTTPResponse:
         # XXX: perhaps user-customizable in the future?
         grades = ['N', 'N', 'N', 'N']
         
-        for score in glob.db.scores_rx.find_one({'map_md5': res['md5'], 'userid': p.id, 'status': 2}):
+        async for score in glob.db.scores_rx.find({'map_md5': res['md5'], 'userid': p.id, 'status': 2}):
             grades[score['mode']] = score['grade']
 
         ret.append(
@@ -500,11 +508,13 @@ def chart_entry(name: str, before: Optional[object], after: object) -> str:
 async def osuSubmitModularSelector(conn: Connection) -> HTTPResponse:
     mp_args = conn.multipart_args
 
-    # Parse our score data into a score obj.
-    score = await Score.from_submission(
-        data_b64=mp_args['score'], iv_b64=mp_args['iv'],
-        osu_ver=mp_args['osuver'], pw_md5=mp_args['pass']
-    )
+    # Parse our score data into a score obj; any osu!api
+    # requests this needs take priority over all others.
+    with misc.osuapi.priority(Priority.Submission):
+        score = await Score.from_submission(
+            data_b64=mp_args['score'], iv_b64=mp_args['iv'],
+            osu_ver=mp_args['osuver'], pw_md5=mp_args['pass']
+        )
 
     if not score:
         log('Failed to parse a score - invalid format.', Ansi.LRED)
@@ -526,9 +536,10 @@ async def osuSubmitModularSelector(conn: Connection) -> HTTPResponse:
     if score.mode != score.player.status.mode:
         score.player.status.mods = score.mods
         score.player.status.mode = score.mode
+        score.player.invalidate_packets()
 
         if not score.player.restricted:
-            glob.players.enqueue(packets.userStats(score.player))
+            glob.players.enqueue(score.player.stats_packet)
 
     scores_table = score.mode.scores_table
     mode_vn = score.mode.as_vanilla
@@ -536,7 +547,7 @@ async def osuSubmitModularSelector(conn: Connection) -> HTTPResponse:
     # Check for score duplicates
     
 
-    if glob.db[scores_table].find_one({'online_checksum': score.online_checksum}).rowcount != 0:
+    if await glob.db[scores_table].find_one({'online_checksum': score.online_checksum}) is not None:
         log(f'{score.player} submitted a duplicate score.', Ansi.LYELLOW)
         return b'error: no'
 
@@ -608,7 +619,7 @@ async def osuSubmitModularSelector(conn: Connection) -> HTTPResponse:
 
                 # If there was previously a score on the map, add old #1.
 
-                res = glob.db[scores_table].find_one({
+                res = await glob.db[scores_table].find_one({
                     'map_md5': score.bmap.md5,
                     'mode': mode_vn,
                     'status': 2,
@@ -631,18 +642,22 @@ async def osuSubmitModularSelector(conn: Connection) -> HTTPResponse:
 
                 announce_chan.send(' '.join(ann), sender=score.player, to_self=True)
 
+    score_writes = []
+
+    if score.status == SubmissionStatus.BEST:
         # this score is our best score.
         # update any preexisting personal best
         # records with SubmissionStatus.SUBMITTED.
-        glob.db[scores_table].update_one({
+        score_writes.append(UpdateOne({
             'map_md5': score.bmap.md5,
             'userid': score.player.id,
             'mode': mode_vn,
             'status': 2
-        }, {'$set': {'status': 1}})
+        }, {'$set': {'status': 1}}))
 
-    glob.db[scores_table].insert_one({
-        'bmap_md5': score.bmap.md5,
+    score_doc = {
+        '_id': ObjectId(),
+        'map_md5': score.bmap.md5,
         'score': score.score,
         'pp': score.pp,
         'acc': score.acc,
@@ -663,7 +678,18 @@ async def osuSubmitModularSelector(conn: Connection) -> HTTPResponse:
         'userid': score.player.id,
         'perfect': score.perfect,
         'online_checksum': score.online_checksum
-    })
+    }
+    score_writes.append(InsertOne(score_doc))
+
+    # the score itself must be stored before we respond; the
+    # rest of the submission's writes are queued & sent in bulk.
+    await glob.db[scores_table].bulk_write(score_writes, ordered=True)
+    score.id = score_doc['_id']
+
+    if score.status == SubmissionStatus.BEST:
+        # keep the map's leaderboard up to date, if it's loaded.
+        if lb := Leaderboard.from_cache(score.bmap.md5, score.mode):
+            lb.add(LeaderboardEntry.from_score(score, lb.metric))
 
     if score.passed:
         # All submitted plays should have a replay.
@@ -681,12 +707,9 @@ async def osuSubmitModularSelector(conn: Connection) -> HTTPResponse:
                 reason = 'submitted score with no replay'
             )
         else:
-            # TODO: the replay is currently sent from the osu!
-            # client compressed with LZMA; this compression can
-            # be improved pretty decently by serializing it
-            # manually, so we'll probably do that in the future.
-            replay_file = REPLAYS_PATH / f'{score.id}.osr'
-            replay_file.write_bytes(replay_data)
+            # append the replay to the replay store;
+            # it's recompressed in the background.
+            await misc.replays.store_replay(str(score.id), replay_data)
 
     """ Update the user's & beatmap's stats """
 
@@ -700,22 +723,19 @@ async def osuSubmitModularSelector(conn: Connection) -> HTTPResponse:
     stats.plays += 1
     stats.tscore += score.score
 
-    stats_query_l = [
-        'UPDATE stats '
-        'SET plays = %s,'
-        'playtime = %s,'
-        'tscore = %s'
-    ]
-
-    stats_query_args = [stats.plays, stats.playtime, stats.tscore]
+    stats_set = {
+        'plays': stats.plays,
+        'playtime': stats.playtime,
+        'tscore': stats.tscore
+    }
+    stats_inc = {}
 
     if score.passed and score.bmap.has_leaderboard:
         # player passed & map is ranked, approved, or loved.
 
         if score.max_combo > stats.max_combo:
             stats.max_combo = score.max_combo
-            stats_query_l.append('max_combo = %s')
-            stats_query_args.append(stats.max_combo)
+            stats_set['max_combo'] = stats.max_combo
 
         if (
             score.bmap.awards_ranked_pp and
@@ -735,83 +755,63 @@ async def osuSubmitModularSelector(conn: Connection) -> HTTPResponse:
                     if score.grade >= Grade.A:
                         stats.grades[score.grade] += 1
                         grade_col = format(score.grade, 'stats_column')
-                        stats_query_l.append(f'{grade_col} = {grade_col} + 1')
+                        stats_inc[grade_col] = 1
 
                     if score.prev_best.grade >= Grade.A:
                         stats.grades[score.prev_best.grade] -= 1
                         grade_col = format(score.prev_best.grade, 'stats_column')
-                        stats_query_l.append(f'{grade_col} = {grade_col} - 1')
+                        stats_inc[grade_col] = -1
             else:
                 # this is our first submitted score on the map
                 if score.grade >= Grade.A:
                     stats.grades[score.grade] += 1
                     grade_col = format(score.grade, 'stats_column')
-                    stats_query_l.append(f'{grade_col} = {grade_col} + 1')
+                    stats_inc[grade_col] = 1
 
             stats.rscore += additional_rscore
-            stats_query_l.append('rscore = %s')
-            stats_query_args.append(stats.rscore)
-
-            # fetch scores sorted by pp for total acc/pp calc
-            # NOTE: we select all plays (and not just top100)
-            # because bonus pp counts the total amount of ranked
-            # scores. i'm aware this scales horribly and it'll
-            # likely be split into two queries in the future.
-            await db_cursor.execute(
-                f'SELECT s.pp, s.acc FROM {scores_table} s '
-                'INNER JOIN maps m ON s.map_md5 = m.md5 '
-                'WHERE s.userid = %s AND s.mode = %s '
-                'AND s.status = 2 AND m.status IN (2, 3) ' # ranked, approved
-                'ORDER BY s.pp DESC',
-                [score.player.id, mode_vn]
-            )
+            stats_set['rscore'] = stats.rscore
 
-            total_scores = db_cursor.rowcount
-            top_100_pp = await db_cursor.fetchmany(size=100)
+            # update the player's cached top scores, fetching them
+            # if they're not yet loaded (or no longer complete).
+            top_scores = score.player.top_scores.get(score.mode)
+
+            if (
+                top_scores is None or
+                not top_scores.add(score.pp, score.acc, score.bmap.md5,
+                                   replaces_best=score.prev_best is not None)
+            ):
+                # NOTE: the new score has already been inserted,
+                # so it'll be included in the fetched scores.
+                top_scores = await score.player.fetch_top_scores(score.mode)
 
             # update total weighted accuracy
-            tot = div = 0
-            for i, row in enumerate(top_100_pp):
-                add = int((0.95 ** i) * 100)
-                tot += row['acc'] * add
-                div += add
-            stats.acc = tot / div
-            stats_query_l.append('acc = %s')
-            stats_query_args.append(stats.acc)
+            stats.acc = top_scores.weighted_acc
+            stats_set['acc'] = stats.acc
 
             # update total weighted pp
-            weighted_pp = sum([row['pp'] * 0.95 ** i
-                               for i, row in enumerate(top_100_pp)])
-            bonus_pp = 416.6667 * (1 - 0.9994 ** total_scores)
-            stats.pp = round(weighted_pp + bonus_pp)
-            stats_query_l.append('pp = %s')
-            stats_query_args.append(stats.pp)
+            stats.pp = top_scores.weighted_pp
+            stats_set['pp'] = stats.pp
 
             # update rank
-            # TODO: do rankings with bisection algorithms
-            # locally, pulling from the database @ startup.
-            await db_cursor.execute(
-                'SELECT COUNT(*) AS higher_pp_players '
-                'FROM stats s '
-                'INNER JOIN users u USING(id) '
-                'WHERE s.mode = %s '
-                'AND s.pp > %s '
-                'AND u.priv & 1 '
-                'AND u.id != %s',
-                [mode_vn, stats.pp, score.player.id]
-            )
-            stats.rank = 1 + (await db_cursor.fetchone())['higher_pp_players']
+            ranking = glob.rankings[score.mode]
 
-    # create a single querystring from the list of updates
-    stats_query = ','.join(stats_query_l)
+            if not score.player.restricted:
+                ranking.update(score.player.id, stats.pp)
 
-    stats_query += ' WHERE id = %s AND mode = %s'
-    stats_query_args.append(score.player.id)
-    stats_query_args.append(score.mode.value)
+            stats.rank = ranking.rank_of(score.player.id)
 
-    # send any stat changes to sql, and other players
-    await db_cursor.execute(stats_query, stats_query_args)
-    glob.players.enqueue(packets.userStats(score.player))
+    # queue any stat changes for sql, and send them to other players
+    stats_update = {'$set': stats_set}
+    if stats_inc:
+        stats_update['$inc'] = stats_inc
+
+    misc.write_queue.enqueue('stats', UpdateOne(
+        {'id': score.player.id, 'mode': score.mode.value},
+        stats_update
+    ))
+
+    score.player.invalidate_packets()
+    glob.players.enqueue(score.player.stats_packet)
 
     if not score.player.restricted:
         # update beatmap with new stats
@@ -819,11 +819,11 @@ async def osuSubmitModularSelector(conn: Connection) -> HTTPResponse:
         if score.passed:
             score.bmap.passes += 1
 
-        await db_cursor.execute(
-            'UPDATE maps SET plays = %s, '
-            'passes = %s WHERE md5 = %s',
-            [score.bmap.plays, score.bmap.passes, score.bmap.md5]
-        )
+        misc.write_queue.enqueue('maps', UpdateOne(
+            {'md5': score.bmap.md5},
+            {'$set': {'plays': score.bmap.plays,
+                      'passes': score.bmap.passes}}
+        ))
 
     # update their recent score
     score.player.recent_scores[score.mode] = score
@@ -927,19 +927,13 @@ async def osuSubmitModularSelector(conn: Connection) -> HTTPResponse:
 @required_args({'u', 'h', 'm', 'c'})
 @get_login(name_p='u', pass_p='h')
 async def getReplay(p: 'Player', conn: Connection) -> HTTPResponse:
-    if 'c' not in conn.args or not conn.args['c'].isdecimal():
-        return # invalid connection
+    score_id = conn.args['c']
 
-    i64_max = (1 << 63) - 1
-
-    if not 0 < (score_id := int(conn.args['c'])) <= i64_max:
+    if not (score_id.isdecimal() or ObjectId.is_valid(score_id)):
         return # invalid score id
 
-    replay_file = REPLAYS_PATH / f'{score_id}.osr'
-
     # osu! expects empty resp for no replay
-    if replay_file.exists():
-        return replay_file.read_bytes()
+    return await misc.replays.load_replay(score_id)
 
 @domain.route('/web/osu-rate.php')
 @required_args({'u', 'p', 'c'})
@@ -950,43 +944,38 @@ async def osuRate(p: 'Player', conn: Connection) -> HTTPResponse:
     if 'v' not in conn.args:
         # check if we have the map in our cache;
         # if not, the map probably doesn't exist.
-        if map_md5 not in glob.cache['beatmap']:
+        if not (cached := glob.cache['beatmap'].get(map_md5)):
             return b'no exist'
 
-        cached = glob.cache['beatmap'][map_md5]
-
         # only allow rating on maps with a leaderboard.
         if cached.status < RankedStatus.Ranked:
             return b'not ranked'
 
         # osu! client is checking whether we can rate the map or not.
-        await db_cursor.execute(
-            'SELECT 1 FROM ratings WHERE '
-            'map_md5 = %s AND userid = %s',
-            [map_md5, p.id]
-        )
-
         # the client hasn't rated the map, so simply
         # tell them that they can submit a rating.
-        if db_cursor.rowcount == 0:
+        if not await glob.db.ratings.find_one({'map_md5': map_md5,
+                                               'userid': p.id}):
             return b'ok'
     else:
         # the client is submitting a rating for the map.
         if not (rating := conn.args['v']).isdecimal():
             return
 
-        await db_cursor.execute(
-            'INSERT INTO ratings '
-            'VALUES (%s, %s, %s)',
-            [p.id, map_md5, int(rating)]
-        )
+        await glob.db.ratings.insert_one({
+            'userid': p.id,
+            'map_md5': map_md5,
+            'rating': int(rating)
+        })
 
-    await db_cursor.execute(
-        'SELECT rating FROM ratings '
-        'WHERE map_md5 = %s',
-        [map_md5]
-    )
-    ratings = [row[0] async for row in db_cursor]
+        # keep the rating served with any loaded leaderboards up to date.
+        for mode in GameMode:
+            if lb := glob.cache['leaderboard'].get((map_md5, mode)):
+                lb.rating_sum += int(rating)
+                lb.rating_count += 1
+
+    ratings = [row['rating'] async for row in
+               glob.db.ratings.find({'map_md5': map_md5}, {'rating': 1})]
 
     # send back the average rating
     avg = sum(ratings) / len(ratings)
@@ -1041,22 +1030,20 @@ async def getScores(p: 'Player', conn: Connection) -> HTTPResponse:
     if mode != p.status.mode:
         p.status.mods = mods
         p.status.mode = mode
+        p.invalidate_packets()
 
         if not p.restricted:
-            glob.players.enqueue(packets.userStats(p))
+            glob.players.enqueue(p.stats_packet)
 
-    scores_table = mode.scores_table
-    scoring_metric = 'pp' if mode >= GameMode.rx_std else 'score'
-
-    bmap = await Beatmap.from_md5(map_md5, set_id=map_set_id)
+    with misc.osuapi.priority(Priority.Leaderboard):
+        bmap = await Beatmap.from_md5(map_md5, set_id=map_set_id)
 
     if not bmap:
         # map not found, figure out whether it needs an
         # update or isn't submitted using it's filename.
 
-        if (
-            has_set_id and
-            map_set_id not in glob.cache['beatmapset']
+        if has_set_id and not (
+            bmap_set := glob.cache['beatmapset'].get(map_set_id)
         ):
             # set not cached, it doesn't exist
             glob.cache['unsubmitted'].add(map_md5)
@@ -1066,7 +1053,7 @@ async def getScores(p: 'Player', conn: Connection) -> HTTPResponse:
 
         if has_set_id:
             # we can look it up in the specific set from cache
-            for bmap in glob.cache['beatmapset'][map_set_id].maps:
+            for bmap in bmap_set.maps:
                 if map_filename == bmap.filename:
                     map_exists = True
                     break
@@ -1103,53 +1090,29 @@ async def getScores(p: 'Player', conn: Connection) -> HTTPResponse:
         # approved, qualified, or loved maps.
         return f'{int(bmap.status)}|false'.encode()
 
-    # statuses: 0: failed, 1: passed but not top, 2: passed top
-    query = [
-        f"SELECT s.id, s.{scoring_metric} AS _score, "
-        "s.max_combo, s.n50, s.n100, s.n300, "
-        "s.nmiss, s.nkatu, s.ngeki, s.perfect, s.mods, "
-        "UNIX_TIMESTAMP(s.play_time) time, u.id userid, "
-        "COALESCE(CONCAT('[', c.tag, '] ', u.name), u.name) AS name "
-        f"FROM {scores_table} s "
-        "INNER JOIN users u ON u.id = s.userid "
-        "LEFT JOIN clans c ON c.id = u.clan_id "
-        "WHERE s.map_md5 = %s AND s.status = 2 "
-        "AND (u.priv & 1 OR u.id = %s) AND mode = %s"
-    ]
-
-    params = [map_md5, p.id, mode_vn]
+    lb = await Leaderboard.from_map(map_md5, mode)
 
+    # restricted players' scores aren't ranked,
+    # but they can still see their own.
     if rank_type == RankingType.Mods:
-        query.append('AND s.mods = %s')
-        params.append(mods)
+        scores = lb.top(50, lambda e: e.mods == mods, userid=p.id)
     elif rank_type == RankingType.Friends:
-        query.append('AND s.userid IN %s')
-        params.append(p.friends | {p.id})
+        friends = p.friends | {p.id}
+        scores = lb.top(50, lambda e: e.userid in friends, userid=p.id)
     elif rank_type == RankingType.Country:
-        query.append('AND u.country = %s')
-        params.append(p.geoloc['country']['acronym'])
-
-    query.append('ORDER BY _score DESC LIMIT 50')
+        country = p.geoloc['country']['acronym']
+        scores = lb.top(50, lambda e: e.country == country, userid=p.id)
+    else:
+        scores = lb.top(50, userid=p.id)
 
-    await db_cursor.execute(' '.join(query), params)
-    num_scores = db_cursor.rowcount
-    scores = await db_cursor.fetchall()
+    p_best = lb.personal_best(p.id)
 
     l: list[str] = []
 
     # ranked status, serv has osz2, bid, bsid, len(scores)
-    l.append(f'{int(bmap.status)}|false|{bmap.id}|{bmap.set_id}|{num_scores}')
-
-    # fetch beatmap rating from sql
-    await db_cursor.execute(
-        'SELECT AVG(rating) rating '
-        'FROM ratings '
-        'WHERE map_md5 = %s',
-        [bmap.md5]
-    )
-    rating = (await db_cursor.fetchone())['rating']
+    l.append(f'{int(bmap.status)}|false|{bmap.id}|{bmap.set_id}|{len(scores)}')
 
-    if rating is not None:
+    if (rating := lb.rating) is not None:
         rating = f'{rating:.1f}'
     else:
         rating = '10.0'
@@ -1158,47 +1121,16 @@ async def getScores(p: 'Player', conn: Connection) -> HTTPResponse:
     # maps that mods could set for incorrectly timed maps.
     l.append(f'0\n{bmap.full}\n{rating}') # offset, name, rating
 
-    if not scores:
+    if not (scores or p_best):
         # simply return an empty set.
         return ('\n'.join(l) + '\n\n').encode()
 
-    # fetch player's personal best score
-    await db_cursor.execute(
-        f'SELECT id, {scoring_metric} AS _score, '
-        'max_combo, n50, n100, n300, '
-        'nmiss, nkatu, ngeki, perfect, mods, '
-        'UNIX_TIMESTAMP(play_time) time '
-        f'FROM {scores_table} '
-        'WHERE map_md5 = %s AND mode = %s '
-        'AND userid = %s AND status = 2 '
-        'ORDER BY _score DESC LIMIT 1', [
-            map_md5, mode_vn, p.id
-        ]
-    )
-    p_best = await db_cursor.fetchone()
-
+    # player's personal best score
     if p_best:
-        # calculate the rank of the score.
-        await db_cursor.execute(
-            f'SELECT COUNT(*) AS count FROM {scores_table} s '
-            'INNER JOIN users u ON u.id = s.userid '
-            'WHERE s.map_md5 = %s AND s.mode = %s '
-            'AND s.status = 2 AND u.priv & 1 '
-            f'AND s.{scoring_metric} > %s', [
-                map_md5, mode_vn,
-                p_best['_score']
-            ]
-        )
-        p_best_rank = 1 + (await db_cursor.fetchone())['count']
-
         l.append(
             SCORE_LISTING_FMTSTR.format(
-                **p_best,
-                name=p.full_name,
-                userid=p.id,
-                score=int(p_best['_score']),
-                has_replay='1',
-                rank=p_best_rank
+                **p_best.listing,
+                rank=lb.rank_of(-p_best.key[0])
             )
         )
     else:
@@ -1206,9 +1138,7 @@ async def getScores(p: 'Player', conn: Connection) -> HTTPResponse:
 
     l.extend([
         SCORE_LISTING_FMTSTR.format(
-            **s,
-            score=int(s['_score']),
-            has_replay='1',
+            **s.listing,
             rank=idx + 1
         ) for idx, s in enumerate(scores)
     ])
@@ -1397,7 +1327,7 @@ async def checkUpdates(conn: Connection) -> HTTPResponse:
 # GET /api/get_score_info: return information about a given score.
 # GET /api/get_replay: return the file for a given replay (with or without headers).
 # GET /api/get_match: return information for a given multiplayer match.
-# GET /api/get_leaderboard: return the top players for a given mode & sort condition
+# GET /api/get_leaderboard: return the top players for a given mode & sort condition (paginated by offset)
 
 # Authorized (requires valid api key, passed as 'Authorization' header)
 # NOTE: authenticated handlers may have privilege requirements.
@@ -1757,9 +1687,25 @@ async def api_get_map_info(conn: Connection) -> HTTPResponse:
     if not bmap:
         return (404, JSON({'status': 'Map not found.'}))
 
+    # serve whatever pp values we have in the map's pp table,
+    # starting the computation of any we're missing.
+    mode_vn = bmap.mode.as_vanilla
+    bmap.warm_pp_cache(mode_vn)
+
+    if mode_vn == 3:  # mania
+        steps = glob.config.pp_cached_scores
+    else:
+        steps = glob.config.pp_cached_accs
+
+    pp_table = {
+        repr(mods): {str(step): pp for step, (pp, _) in zip(steps, values)}
+        for mods, values in bmap.pp_cache[mode_vn].items()
+    }
+
     return JSON({
         'status': 'success',
-        'map': bmap.as_dict
+        'map': bmap.as_dict,
+        'pp': pp_table
     })
 
 @domain.route('/api/get_map_scores')
@@ -1918,14 +1864,10 @@ async def api_get_replay(conn: Connection) -> HTTPResponse:
     else:
         return (400, JSON({'status': 'Invalid score id.'}))
 
-    # fetch replay file & make sure it exists
-    replay_file = REPLAYS_PATH / f'{score_id}.osr'
-    if not replay_file.exists():
+    # fetch replay frames from the replay store
+    if not (raw_replay := await misc.replays.load_replay(str(score_id))):
         return (404, JSON({'status': 'Replay not found.'}))
 
-    # read replay frames from file
-    raw_replay = replay_file.read_bytes()
-
     if (
         'include_headers' in conn.args and
         conn.args['include_headers'].lower() == 'false'
@@ -2078,28 +2020,75 @@ async def api_get_global_leaderboard(conn: Connection) -> HTTPResponse:
     else:
         limit = 25
 
+    if (offset_arg := conn.args.get('offset', None)) is not None:
+        if not offset_arg.isdecimal():
+            return (400, JSON({'status': 'Invalid offset.'}))
+
+        offset = int(offset_arg)
+    else:
+        offset = 0
+
     if (sort := conn.args.get('sort', None)) is not None:
         if sort not in ('tscore', 'rscore', 'pp', 'acc'):
             return (400, JSON({'status': 'Invalid sort.'}))
     else:
         sort = 'pp'
 
-    res = await glob.db.fetchall(
-        'SELECT u.id as player_id, u.name, u.country, s.tscore, s.rscore, '
-        's.pp, s.plays, s.playtime, s.acc, s.max_combo, '
-        's.xh_count, s.x_count, s.sh_count, s.s_count, s.a_count, '
-        'c.id as clan_id, c.name as clan_name, c.tag as clan_tag '
-        'FROM stats s '
-        'LEFT JOIN users u USING (id) '
-        'LEFT JOIN clans c ON u.clan_id = c.id '
-        f'WHERE s.mode = %s AND u.priv & 1 AND s.{sort} > 0 '
-        f'ORDER BY s.{sort} DESC LIMIT %s',
-        [mode, limit]
-    )
+    if sort == 'pp':
+        # the pp ranking is kept sorted in ram; we
+        # only need to fetch the page's players' data.
+        page = [user_id for user_id, _ in
+                glob.rankings[mode].page(offset, limit)]
+
+        stats = {
+            row['id']: row async for row in glob.db.stats.find(
+                {'id': {'$in': page}, 'mode': mode.value}
+            )
+        }
+
+        users = {
+            row['_id']: row async for row in glob.db.users.find(
+                {'_id': {'$in': page}}, {'name': 1, 'country': 1, 'clan_id': 1}
+            )
+        }
+
+        rows = [(stats[user_id], users[user_id]) for user_id in page
+                if user_id in stats and user_id in users]
+    else:
+        rows = [(row, row['user']) async for row in glob.db.stats.aggregate([
+            {'$match': {'mode': mode.value, sort: {'$gt': 0}}},
+            {'$sort': {sort: -1}},
+            {'$lookup': {'from': 'users', 'localField': 'id',
+                         'foreignField': '_id', 'as': 'user'}},
+            {'$unwind': '$user'},
+            {'$match': {'user.priv': {'$bitsAllSet': int(Privileges.Normal)}}},
+            {'$skip': offset},
+            {'$limit': limit}
+        ])]
+
+    leaderboard = []
+
+    for stats_row, user_row in rows:
+        clan = (glob.clans.get(id=user_row['clan_id'])
+                if user_row.get('clan_id') else None)
+
+        leaderboard.append({
+            'player_id': stats_row['id'],
+            'name': user_row['name'],
+            'country': user_row['country'],
+            **{k: stats_row.get(k, 0) for k in (
+                'tscore', 'rscore', 'pp', 'plays', 'playtime', 'acc',
+                'max_combo', 'xh_count', 'x_count', 'sh_count',
+                's_count', 'a_count'
+            )},
+            'clan_id': clan.id if clan else None,
+            'clan_name': clan.name if clan else None,
+            'clan_tag': clan.tag if clan else None
+        })
 
     return JSON({
         'status': 'success',
-        'leaderboard': res
+        'leaderboard': leaderboard
     })
 
 def requires_api_key(f: Callable) -> Callable:
@@ -2145,7 +2134,7 @@ async def api_set_avatar(conn: Connection, p: 'Player') -> HTTPResponse:
         return (400, JSON({'status': 'invalid file type.'}))
 
     # write to the avatar file
-    (AVATARS_PATH / f'{p.id}.{ext}').write_bytes(ava_file)
+    await misc.fileio.write_bytes(AVATARS_PATH / f'{p.id}.{ext}', ava_file)
     return JSON({'status': 'success.'})
 
 """ Misc handlers """
@@ -2168,10 +2157,10 @@ async def get_screenshot(conn: Connection) -> HTTPResponse:
 
     path = SCREENSHOTS_PATH / conn.path[4:]
 
-    if not path.exists():
+    if not (content := await misc.fileio.read_bytes(path)):
         return (404, JSON({'status': 'Screenshot not found.'}))
 
-    return path.read_bytes()
+    return content
 
 @domain.route(re.compile(r'^/d/\d{1,10}n?$'))
 async def get_osz(conn: Connection) -> HTTPResponse:
@@ -2196,40 +2185,27 @@ async def get_updated_beatmap(conn: Connection) -> HTTPResponse:
         # server switcher, use old method
         map_filename = unquote(conn.path[10:])
 
-        if not (res := await glob.db.fetch(
-            'SELECT id, md5 '
-            'FROM maps '
-            'WHERE filename = %s',
-            [map_filename]
+        if not (res := await glob.db.maps.find_one(
+            {'filename': map_filename},
+            {'id': 1, 'md5': 1}
         )):
             return (404, b'') # map not found in sql
 
         osu_file_path = BEATMAPS_PATH / f'{res["id"]}.osu'
 
-        if (
-            osu_file_path.exists() and
-            res['md5'] == hashlib.md5(osu_file_path.read_bytes()).hexdigest()
-        ):
+        if content := await read_osu_file(osu_file_path, res['md5']):
             # up to date map found on disk.
-            content = osu_file_path.read_bytes()
-        else:
-            if not glob.has_internet:
-                return (503, b'') # requires internet connection
-
-            # map not found, or out of date; get from osu!
-            url = f"https://old.ppy.sh/osu/{res['id']}"
+            return content
 
-            async with glob.http_session.get(url) as resp:
-                if not resp or resp.status != 200:
-                    log(f'Could not find map {osu_file_path}!', Ansi.LRED)
-                    return (404, b'') # couldn't find on osu!'s server
+        if not glob.has_internet:
+            return (503, b'') # requires internet connection
 
-                content = await resp.read()
+        # map not found, or out of date; get from osu!
+        if not await ensure_local_osu_file(osu_file_path, res['id'], res['md5']):
+            log(f'Could not find map {osu_file_path}!', Ansi.LRED)
+            return (404, b'') # couldn't find on osu!'s server
 
-            # save it to disk for future
-            osu_file_path.write_bytes(content)
-
-        return content
+        return await read_osu_file(osu_file_path)
     else:
         # using -devserver, just redirect them to osu
         conn.resp_headers['Location'] = f'https://osu.ppy.sh{conn.path}'
@@ -2276,7 +2252,7 @@ async def register_account(conn: Connection) -> HTTPResponse:
         errors['username'].append('Disallowed username; pick another.')
 
     if 'username' not in errors:
-        if glob.db.users.find_one({'safe_name': safe_name}) is not None:
+        if await glob.db.users.find_one({'safe_name': safe_name}) is not None:
             errors['username'].append('Username already taken by another player.')
 
     # Emails must:
@@ -2285,7 +2261,7 @@ async def register_account(conn: Connection) -> HTTPResponse:
     if not regexes.email.match(email):
         errors['user_email'].append('Invalid email syntax.')
     else:
-        if glob.db.users.find_one({'email': email}) is not None:
+        if await glob.db.users.find_one({'email': email}) is not None:
             errors['user_email'].append('Email already taken by another player.')
 
     # Passwords must:
@@ -2310,12 +2286,12 @@ async def register_account(conn: Connection) -> HTTPResponse:
     if mp_args['check'] == '0':
         # the client isn't just checking values,
         # they want to register the account now.
-        # make the md5 & bcrypt the md5 for sql.
-        async with glob.players._lock:
-            pw_md5 = hashlib.md5(pw_txt.encode()).hexdigest().encode()
-            pw_bcrypt = bcrypt.hashpw(pw_md5, bcrypt.gensalt())
-            glob.cache['bcrypt'][pw_bcrypt] = pw_md5 # cache result for login
+        # make the md5 & bcrypt the md5 for sql; hashing's slow,
+        # so it's done before taking the lock.
+        pw_md5 = hashlib.md5(pw_txt.encode()).hexdigest().encode()
+        pw_bcrypt = await misc.passwords.hash_password(pw_md5)
 
+        async with glob.players._lock:
             if 'CF-IPCountry' in conn.headers:
                 # best case, dev has enabled ip geolocation in the
                 # network tab of cloudflare, so it sends the iso code.
@@ -2356,7 +2332,7 @@ async def register_account(conn: Connection) -> HTTPResponse:
                     country_acronym = 'xx'
 
             # add to `users` table.
-            user_id = glob.db.users.insert_one({
+            user_id = (await glob.db.users.insert_one({
                 'name': name,
                 'safe_name': safe_name,
                 'email': email,
@@ -2364,12 +2340,12 @@ async def register_account(conn: Connection) -> HTTPResponse:
                 'country': country_acronym,
                 'creation_time': time.time(),
                 'latest_activity': time.time()
-            }).inserted_id
-            
-            glob.db.stats.insert_many({
+            })).inserted_id
+
+            await glob.db.stats.insert_many([{
                 'id': user_id,
                 'mode': mode
-                } for mode in range(8))
+                } for mode in range(8)])
 
         if glob.datadog:
             glob.datadog.increment('gulag.registrations')
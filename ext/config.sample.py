@@ -22,15 +22,68 @@ mysql = {
 # your osu!api key, required for beatmap info.
 osu_api_key = ''
 
+# our budget for osu!api requests (per minute, with bursts of
+# up to `osuapi_burst`); requests beyond it are queued, with score
+# submissions first, then leaderboards, then everything else.
+# failed requests are retried with exponential backoff (in seconds).
+osuapi_rate_limit = 600 # ppy's default limit is 1200/min
+osuapi_burst = 60
+osuapi_max_retries = 3
+osuapi_retry_backoff = 0.5
+
+# expired beatmap sets are served from the cache & queued to be
+# refreshed from the osu!api in the background; every interval (in
+# seconds), up to this many sets are refreshed, and at most this
+# many sets are queued (once full, expired sets aren't queued).
+beatmapset_refresh_interval = 5
+beatmapset_refresh_batch = 20
+beatmapset_refresh_queue_size = 1000
+
 # url of the mirror to use, for beatmap downloads.
 mirror = 'https://api.chimu.moe/v1' # https://api.chimu.moe/v1
 
 # in-game bot command prefix.
 command_prefix = '!'
 
-# the max amount of concurrent
-# connections gulag will hold.
-max_conns = 16 # likely ~8-16, depending on playercount & api usage
+# the max amount of pending connections the kernel will
+# queue for gulag to accept (the listen backlog); during
+# bursts, connections beyond this will be refused.
+max_conns = 16 # likely ~16-1024, depending on playercount & api usage
+
+# the number of sockets to accept connections on; with > 1,
+# SO_REUSEPORT is used to let the kernel balance connections
+# between them. (inet sockets only; unix sockets use 1)
+listeners = 1
+
+# the max amount of threads used to hash & verify
+# passwords (bcrypt) outside of the event loop.
+bcrypt_workers = 4 # likely ~2-4, depending on cpu cores & login bursts
+
+# the amount of processes used to calculate pp & star
+# ratings outside of the event loop, and the amount of
+# parsed beatmaps each of those processes will keep.
+pp_workers = 2 # likely ~1-4, depending on cpu cores
+pp_cached_beatmaps = 128
+
+# the max amount of threads used to read & write
+# files in .data/ outside of the event loop.
+file_io_workers = 4
+
+# replays are packed into segment files of up to this size
+# (in bytes), & recompressed in the background using this many threads.
+replay_segment_size = 256 * 1024 * 1024 # 256MiB
+replay_workers = 2
+replay_fetch_workers = 2 # for serving replays to players
+
+# writes nothing waits on (such as stats & map playcounts
+# after a score submission) are queued & sent to the database
+# in bulk; every interval (in seconds), or once this many are queued.
+write_queue_interval = 0.01
+write_queue_max_ops = 500
+
+# players' latest activity is kept in memory & written
+# to the database in bulk, every interval (in seconds).
+activity_flush_interval = 30
 
 # the console gets a whole lot louder.
 # devs can also toggle ingame w/ !debug.
@@ -110,6 +163,40 @@ datadog = {
 pp_cached_accs = (90, 95, 98, 99, 100) # std & taiko
 pp_cached_scores = (8e5, 8.5e5, 9e5, 9.5e5, 10e5) # mania
 
+# the mod combinations which will have their pp values computed
+# in the background once a map is first /np'ed or played, and the
+# max amount of mod combinations cached per map & mode (any others
+# requested will be cached too, until this limit is reached).
+pp_cached_mods = ('NM', 'HD', 'HR', 'DT', 'HDHR', 'HDDT')
+pp_cache_max_mods = 12
+
+# the md5s of .osu files on disk are remembered (along
+# with their mtime & size) so they needn't be re-hashed;
+# the amount of files to remember, and the max amount of
+# memory (in bytes) to keep recently read files' contents in.
+osu_file_index_size = 100000
+osu_file_cache_size = 64 * 1024 * 1024 # 64MiB
+
+# limits for gulag's in-memory caches; once a cache holds
+# more than `max_items` entries, or roughly `max_bytes` of
+# memory, it's least recently used entries are evicted, and
+# entries older than `ttl` (in seconds) expire. (None = no limit)
+# maps are cached for as long as their set is, and evicted along
+# with it; the beatmap cache is bounded by `beatmapset`'s limits.
+caches = {
+    'bcrypt': {'max_items': 10000, 'max_bytes': None, 'ttl': None},
+    'ip': {'max_items': 100000, 'max_bytes': None, 'ttl': None},
+    'beatmap': {'max_items': None, 'max_bytes': None, 'ttl': None},
+    'beatmapset': {'max_items': 50000, 'max_bytes': None, 'ttl': None},
+    'unsubmitted': {'max_items': 100000, 'max_bytes': None, 'ttl': 60 * 60},
+    'needs_update': {'max_items': 100000, 'max_bytes': None, 'ttl': 60 * 60},
+    'replay': {'max_items': None, 'max_bytes': 32 * 1024 * 1024, 'ttl': None}
+}
+
+# the max amount of map leaderboards kept sorted in
+# memory; the least recently viewed will be evicted.
+leaderboard_cache_size = 1000
+
 # whether osu! client urls such as https://osu.your.domain/beatmaps/123
 # should be redirected to osu.ppy.sh (https://osu.ppy.sh/beatmaps/123).
 redirect_osu_urls = False
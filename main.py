@@ -27,8 +27,14 @@ from cmyui.logging import RGB, Ansi, log
 
 import bg_loops
 import misc.context
+import misc.fileio
+import misc.passwords
+import misc.performance
+import misc.replays
+import misc.write_queue
 import misc.utils
 from objects import glob  # (includes config)
+from objects.player import flush_latest_activity
 
 # set the current working directory to /gulag
 os.chdir(os.path.dirname(os.path.realpath(__file__)))
@@ -82,51 +88,86 @@ async def run_server() -> None:
         if os.path.exists(glob.config.server_addr):
             os.remove(glob.config.server_addr)
 
-    # create our transport layer socket; osu! uses tcp/ip
-    with socket.socket(sock_family, socket.SOCK_STREAM) as listening_sock:
+    # with SO_REUSEPORT, multiple sockets may be bound to the same
+    # address, and the kernel will balance connections between them;
+    # each gets it's own accept loop. (only supported for inet sockets)
+    num_listeners = glob.config.listeners
+
+    if num_listeners > 1 and (
+        sock_family != socket.AF_INET or
+        not hasattr(socket, 'SO_REUSEPORT')
+    ):
+        log('SO_REUSEPORT unavailable, using a single listener.', Ansi.LYELLOW)
+        num_listeners = 1
+
+    # create our transport layer sockets; osu! uses tcp/ip
+    listening_socks = [socket.socket(sock_family, socket.SOCK_STREAM)
+                       for _ in range(num_listeners)]
+
+    for listening_sock in listening_socks:
         listening_sock.setblocking(False)  # asynchronous
-        #listening_sock.bind(glob.config.server_addr)
-        #port = 1234
-        print(sock_family, socket.SOCK_STREAM)
-        listening_sock.bind(glob.config.server_addr)
-        log(loop.get_debug(), Ansi.GREEN)
 
-        if sock_family == socket.AF_UNIX:
-            # using unix socket - give the socket file
-            # appropriate (read, write) permissions
-            os.chmod(glob.config.server_addr, 0o666)
+        if num_listeners > 1:
+            listening_sock.setsockopt(socket.SOL_SOCKET,
+                                      socket.SO_REUSEPORT, 1)
 
+        listening_sock.bind(glob.config.server_addr)
         listening_sock.listen(glob.config.max_conns)
-        log(f'-> Listening @ {glob.config.server_addr}', RGB(0x00ff7f))
-        log(f'-> Total users: {glob.db.users.estimated_document_count()}', RGB(0x00ff7f))
-        log(f'-> Max connections: {glob.config.max_conns}', RGB(0x00ff7f))
-        log(f'-> Debug mode: {glob.config.debug}', RGB(0x00ff7f))
-
-        glob.ongoing_conns = []
-        glob.shutting_down = False
-
-        while not glob.shutting_down:
-            # TODO: this timeout based-solution can be heavily
-            #       improved and refactored out.
-            try:
-                conn, _ = await asyncio.wait_for(
-                    fut=loop.sock_accept(listening_sock),
-                    timeout=0.25
-                )
-            except asyncio.TimeoutError:
-                pass
-            else:
-                task = loop.create_task(glob.app.handle(conn))
-                task.add_done_callback(misc.utils._conn_finished_cb)
-                glob.ongoing_conns.append(task)
+
+    if sock_family == socket.AF_UNIX:
+        # using unix socket - give the socket file
+        # appropriate (read, write) permissions
+        os.chmod(glob.config.server_addr, 0o666)
+
+    log(f'-> Listening @ {glob.config.server_addr} '
+        f'({num_listeners} listener(s))', RGB(0x00ff7f))
+    log(f'-> Total users: {await glob.db.users.estimated_document_count()}', RGB(0x00ff7f))
+    log(f'-> Max connections: {glob.config.max_conns}', RGB(0x00ff7f))
+    log(f'-> Debug mode: {glob.config.debug}', RGB(0x00ff7f))
+
+    glob.ongoing_conns = []
+    glob.shutting_down = False
+
+    accept_tasks = [loop.create_task(accept_connections(listening_sock))
+                    for listening_sock in listening_socks]
+
+    # rather than polling a flag, we simply sleep until
+    # a signal handler sets the event; then the accept
+    # loops are cancelled, closing any pending accepts.
+    await glob.shutdown_event.wait()
+
+    for task in accept_tasks:
+        task.cancel()
+
+    await asyncio.gather(*accept_tasks, return_exceptions=True)
+
+    for listening_sock in listening_socks:
+        listening_sock.close()
 
     if sock_family == socket.AF_UNIX:
         # using unix socket - remove from filesystem
         os.remove(glob.config.server_addr)
 
+async def accept_connections(listening_sock: socket.socket) -> None:
+    """Accept & dispatch connections from `listening_sock` until cancelled."""
+    while True:
+        try:
+            conn, _ = await loop.sock_accept(listening_sock)
+        except OSError as exc:
+            # usually EMFILE/ENFILE, when we've run out of file
+            # descriptors; back off a little, until some free up.
+            log(f'Failed to accept connection: {exc}', Ansi.LRED)
+            await asyncio.sleep(0.1)
+            continue
+
+        task = loop.create_task(glob.app.handle(conn))
+        task.add_done_callback(misc.utils._conn_finished_cb)
+        glob.ongoing_conns.append(task)
+
 async def main() -> int:
     """Initialize, and start up the server."""
     glob.loop = asyncio.get_running_loop()
+    glob.shutdown_event = asyncio.Event()
 
     async with (
             misc.context.acquire_http_session(glob.has_internet) as glob.http_session):
@@ -162,6 +203,16 @@ async def main() -> int:
 
             await misc.utils.cancel_housekeeping_tasks()
 
+            # send any writes still queued; the score
+            # submissions they belong to were answered.
+            await flush_latest_activity()
+            await misc.write_queue.flush()
+
+            misc.passwords.shutdown_executor()
+            misc.performance.shutdown_executor()
+            misc.replays.shutdown_executor()
+            misc.fileio.shutdown_executor()
+
     return 0
 
 if __name__ == '__main__':
@@ -0,0 +1,181 @@
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Generic, Hashable, Iterator, Optional, TypeVar
+
+__all__ = (
+    'approx_sizeof',
+    'BoundedCache'
+)
+
+K = TypeVar('K', bound=Hashable)
+V = TypeVar('V')
+
+def approx_sizeof(obj: object) -> int:
+    """Approximate the memory used by `obj` & it's attributes.
+
+    This only looks a single level deep; it's intended for byte
+    accounting in caches, where a rough figure is all we need.
+    """
+    size = sys.getsizeof(obj)
+
+    if hasattr(obj, '__dict__'):
+        size += sum(map(sys.getsizeof, vars(obj).values()))
+
+    for attr in getattr(type(obj), '__slots__', ()):
+        if attr != '__dict__' and hasattr(obj, attr):
+            size += sys.getsizeof(getattr(obj, attr))
+
+    return size
+
+class BoundedCache(Generic[K, V]):
+    """A mapping with lru eviction, optional expiry & byte accounting.
+
+    Entries are evicted (least recently used first) once the cache
+    holds more than `max_items` entries, or more than `max_bytes` as
+    measured by `sizeof`; entries older than `ttl` seconds expire.
+    Any limit left as None is not enforced.
+
+    Lookups via `in` and `get` count towards the cache's hit & miss
+    counters; indexing (`cache[key]`) is assumed to follow an `in`.
+
+    If set, `on_evict(key, value)` is called for entries which are
+    evicted or expire (but not those removed or replaced explicitly).
+    """
+    __slots__ = ('name', 'max_items', 'max_bytes', 'ttl', 'sizeof',
+                 'on_evict', '_entries', 'size', 'hits', 'misses',
+                 'evictions', 'expirations')
+
+    def __init__(self, name: str, max_items: Optional[int] = None,
+                 max_bytes: Optional[int] = None,
+                 ttl: Optional[float] = None,
+                 sizeof: Callable[[Any], int] = approx_sizeof,
+                 on_evict: Optional[Callable[[K, V], None]] = None) -> None:
+        self.name = name
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self.on_evict = on_evict
+
+        # {key: (value, size, expires_at)}; least recently used first.
+        self._entries: 'OrderedDict[K, tuple[V, int, float]]' = OrderedDict()
+        self.size = 0  # bytes; only tracked with `max_bytes`
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __repr__(self) -> str:
+        return f'<{self.name} cache ({len(self)} entries)>'
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[K]:
+        return iter(list(self._entries))
+
+    def _lookup(self, key: K) -> Optional[tuple[V, int, float]]:
+        """Return a live entry, expiring it if it's outlived it's ttl."""
+        if (entry := self._entries.get(key)) is None:
+            return
+
+        if self.ttl is not None and entry[2] < time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+
+            if self.on_evict is not None:
+                self.on_evict(key, entry[0])
+
+            return
+
+        self._entries.move_to_end(key)
+        return entry
+
+    def __contains__(self, key: K) -> bool:
+        if self._lookup(key) is None:
+            self.misses += 1
+            return False
+
+        self.hits += 1
+        return True
+
+    def __getitem__(self, key: K) -> V:
+        if (entry := self._lookup(key)) is None:
+            raise KeyError(key)
+
+        return entry[0]
+
+    def get(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        if (entry := self._lookup(key)) is None:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        return entry[0]
+
+    def __setitem__(self, key: K, value: V) -> None:
+        if key in self._entries:
+            self._remove(key)
+
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        expires_at = (time.monotonic() + self.ttl
+                      if self.ttl is not None else 0.0)
+
+        self._entries[key] = (value, size, expires_at)
+        self.size += size
+
+        self._evict()
+
+    def __delitem__(self, key: K) -> None:
+        if key not in self._entries:
+            raise KeyError(key)
+
+        self._remove(key)
+
+    def touch(self, key: K) -> None:
+        """Mark `key` as recently used, without counting a lookup."""
+        if key in self._entries:
+            self._entries.move_to_end(key)
+
+    def add(self, key: K) -> None:
+        """Add `key` to the cache; for caches used as sets."""
+        self[key] = True  # type: ignore
+
+    def pop(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        if key not in self._entries:
+            return default
+
+        return self._remove(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.size = 0
+
+    def _remove(self, key: K) -> V:
+        value, size, _ = self._entries.pop(key)
+        self.size -= size
+        return value
+
+    def _evict(self) -> None:
+        """Evict the least recently used entries until within limits."""
+        while self._entries and (
+            (self.max_items is not None and
+             len(self._entries) > self.max_items) or
+            (self.max_bytes is not None and
+             self.size > self.max_bytes)
+        ):
+            key = next(iter(self._entries))
+            value = self._remove(key)
+            self.evictions += 1
+
+            if self.on_evict is not None:
+                self.on_evict(key, value)
+
+    @property
+    def hit_rate(self) -> float:
+        """The ratio of lookups which have been hits."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
@@ -7,8 +7,7 @@ import datadog
 import geoip2.database
 import orjson
 from cmyui.logging import log
-from pymongo.database import Database
-from pymongo.mongo_client import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
 
 
 @asynccontextmanager
@@ -25,8 +24,11 @@ async def acquire_http_session(has_internet: bool) -> AsyncIterator[Optional[aio
 
 
 @contextmanager
-def acquire_mongodb(args) -> Iterator[Database]:
-    mongo_client = MongoClient(args)
+def acquire_mongodb(args) -> Iterator[AsyncIOMotorDatabase]:
+    # motor wraps pymongo with a small thread pool, so every
+    # collection method returns an awaitable & the round-trip
+    # happens off of the event loop; handlers simply `await` it.
+    mongo_client = AsyncIOMotorClient(args)
     try:
         yield mongo_client.get_database("circles")
     finally:
@@ -0,0 +1,110 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from objects import glob
+
+__all__ = (
+    'exists',
+    'stat',
+    'read_bytes',
+    'write_bytes',
+    'create_bytes',
+    'file_md5',
+    'shutdown_executor'
+)
+
+# disk i/o (& hashing) releases the gil, so handlers touching .data/
+# hand their file access to a small thread pool, rather than blocking
+# the event loop while the disk (or a network volume) gets around to it.
+_executor = ThreadPoolExecutor(
+    max_workers=glob.config.file_io_workers,
+    thread_name_prefix='fileio'
+)
+
+"""Worker side; runs in the pool's threads."""
+
+def _stat(path: Path) -> Optional[os.stat_result]:
+    try:
+        return path.stat()
+    except FileNotFoundError:
+        return
+
+def _read_bytes(path: Path) -> Optional[bytes]:
+    try:
+        return path.read_bytes()
+    except FileNotFoundError:
+        return
+
+def _write_bytes(path: Path, data: bytes) -> None:
+    # write to a temporary file & rename it over the original,
+    # so readers never see a partially written file. the temp
+    # file's name is unique, so concurrent writers can't collide.
+    with tempfile.NamedTemporaryFile(dir=path.parent, prefix=f'.{path.name}.',
+                                     suffix='.tmp', delete=False) as f:
+        f.write(data)
+
+    try:
+        os.replace(f.name, path)
+    except OSError:
+        os.unlink(f.name)
+        raise
+
+def _create_bytes(path: Path, data: bytes) -> bool:
+    try:
+        with path.open('xb') as f:
+            f.write(data)
+    except FileExistsError:
+        return False
+
+    return True
+
+def _file_md5(path: Path) -> Optional[str]:
+    md5 = hashlib.md5()
+
+    try:
+        with path.open('rb') as f:
+            while chunk := f.read(64 * 1024):
+                md5.update(chunk)
+    except FileNotFoundError:
+        return
+
+    return md5.hexdigest()
+
+"""Public api."""
+
+async def _run(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, func, *args)
+
+async def exists(path: Path) -> bool:
+    """Return whether `path` exists."""
+    return await _run(path.exists)
+
+async def stat(path: Path) -> Optional[os.stat_result]:
+    """Return the stat of `path`, or None if it doesn't exist."""
+    return await _run(_stat, path)
+
+async def read_bytes(path: Path) -> Optional[bytes]:
+    """Read the contents of `path`, or None if it doesn't exist."""
+    return await _run(_read_bytes, path)
+
+async def write_bytes(path: Path, data: bytes) -> None:
+    """Atomically replace the contents of `path` with `data`."""
+    await _run(_write_bytes, path, data)
+
+async def create_bytes(path: Path, data: bytes) -> bool:
+    """Write `data` to a new file; returns False if `path` already exists."""
+    return await _run(_create_bytes, path, data)
+
+async def file_md5(path: Path) -> Optional[str]:
+    """Return the md5 hexdigest of `path`, or None if it doesn't exist."""
+    return await _run(_file_md5, path)
+
+def shutdown_executor() -> None:
+    """Shut down the file i/o pool, waiting on any running work."""
+    _executor.shutdown(wait=True)
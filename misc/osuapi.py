@@ -0,0 +1,217 @@
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from enum import IntEnum, unique
+from typing import Any, Iterator, Optional
+
+import aiohttp
+from cmyui.logging import Ansi, log
+
+from objects import glob
+
+__all__ = (
+    'Priority',
+    'priority',
+    'get_beatmaps',
+    'get_osu_file',
+    'metrics'
+)
+
+OSUAPI_GET_BEATMAPS = 'https://old.ppy.sh/api/get_beatmaps'
+OSU_FILE_URL = 'https://old.ppy.sh/osu/{bmap_id}'
+
+@unique
+class Priority(IntEnum):
+    """The order in which queued osu!api requests are sent."""
+    Submission = 0   # score submission; a player's waiting on their score
+    Leaderboard = 1  # leaderboards, /np & other requests players see
+    Normal = 2       # everything else
+    Background = 3   # housekeeping, such as refreshing mapsets
+
+# the priority of requests made from the current context (a handler,
+# and any tasks it creates); set with `priority(...)` by callers.
+_priority: ContextVar[Priority] = ContextVar('osuapi_priority',
+                                             default=Priority.Normal)
+
+@contextmanager
+def priority(value: Priority) -> Iterator[None]:
+    """Send osu!api requests made within the block at `value`."""
+    token = _priority.set(value)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+# our budget of requests; a token bucket which refills at
+# `osuapi_rate_limit` requests/min, up to `osuapi_burst` tokens.
+_tokens = float(glob.config.osuapi_burst)
+_last_refill = time.monotonic()
+
+# requests waiting on a token; [(priority, seq, future), ...]
+_waiters: list[tuple[int, int, asyncio.Future]] = []
+_waiter_seq = itertools.count()
+_dispatcher: Optional[asyncio.Task] = None
+
+# counters, for `!server` & datadog.
+metrics = {
+    'requests': 0,
+    'failures': 0,
+    'retries': 0,
+    'rate_limited': 0,
+    'wait_time': 0.0,  # seconds spent waiting on the budget
+    'by_priority': {p.name: 0 for p in Priority}
+}
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# the longest we'll honour a Retry-After header for, in seconds.
+MAX_RETRY_AFTER = 60.0
+
+"""Budget."""
+
+def _refill() -> None:
+    global _tokens, _last_refill
+
+    now = time.monotonic()
+    rate = glob.config.osuapi_rate_limit / 60
+
+    _tokens = min(glob.config.osuapi_burst,
+                  _tokens + (now - _last_refill) * rate)
+    _last_refill = now
+
+async def _dispatch() -> None:
+    """Hand out tokens to waiting requests, highest priority first."""
+    global _tokens, _dispatcher
+
+    try:
+        while _waiters:
+            _refill()
+
+            if _tokens < 1:
+                rate = glob.config.osuapi_rate_limit / 60
+                await asyncio.sleep((1 - _tokens) / rate)
+                continue
+
+            _, _, fut = heapq.heappop(_waiters)
+
+            if not fut.done():  # the waiter may've been cancelled
+                _tokens -= 1
+                fut.set_result(None)
+    finally:
+        _dispatcher = None
+
+async def _acquire(prio: Priority) -> None:
+    """Wait for a token from the budget, in order of priority."""
+    global _tokens, _dispatcher
+
+    _refill()
+
+    if not _waiters and _tokens >= 1:
+        _tokens -= 1
+        return
+
+    fut = asyncio.get_running_loop().create_future()
+    heapq.heappush(_waiters, (prio, next(_waiter_seq), fut))
+
+    if _dispatcher is None:
+        _dispatcher = asyncio.create_task(_dispatch())
+
+    start = time.monotonic()
+    await fut
+    metrics['wait_time'] += time.monotonic() - start
+
+"""Requests."""
+
+def _parse_retry_after(value: str) -> Optional[float]:
+    """Parse a Retry-After header; either seconds, or an http-date."""
+    try:
+        delay = float(value)
+    except ValueError:
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError, IndexError):
+            return
+
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+
+        delay = (when - datetime.now(timezone.utc)).total_seconds()
+
+    if delay != delay or delay <= 0:  # nan, or already passed
+        return
+
+    return min(delay, MAX_RETRY_AFTER)
+
+async def _request(url: str, params: Optional[dict[str, Any]] = None,
+                   json: bool = False) -> Optional[Any]:
+    """Send a request within our budget, retrying transient failures.
+
+    Returns the response's body (or json), or None on failure.
+    """
+    prio = _priority.get()
+    max_retries = glob.config.osuapi_max_retries
+
+    for attempt in itertools.count():
+        await _acquire(prio)
+
+        metrics['requests'] += 1
+        metrics['by_priority'][prio.name] += 1
+
+        if glob.datadog:
+            glob.datadog.increment('gulag.osuapi_requests',
+                                   tags=[f'priority:{prio.name}'])
+
+        retry_after = None
+
+        try:
+            async with glob.http_session.get(url, params=params) as resp:
+                if resp.status == 200:
+                    return await (resp.json() if json else resp.read())
+
+                if resp.status == 429:
+                    metrics['rate_limited'] += 1
+
+                    if 'Retry-After' in resp.headers:
+                        retry_after = _parse_retry_after(
+                            resp.headers['Retry-After']
+                        )
+
+                if resp.status not in RETRY_STATUSES:
+                    # a permanent failure; retrying won't help.
+                    metrics['failures'] += 1
+                    return
+
+                error = f'HTTP {resp.status}'
+        except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+            error = repr(exc)
+
+        if attempt >= max_retries:
+            metrics['failures'] += 1
+            log(f'osu!api request failed after {attempt + 1} '
+                f'attempts ({error}).', Ansi.LRED)
+            return
+
+        # exponential backoff, with jitter so retries
+        # from a burst of failures don't line up.
+        metrics['retries'] += 1
+        delay = retry_after or (glob.config.osuapi_retry_backoff *
+                                2 ** attempt * random.uniform(0.5, 1.5))
+        await asyncio.sleep(delay)
+
+async def get_beatmaps(**params: Any) -> Optional[list[dict[str, Any]]]:
+    """Fetch beatmaps from the osu!api's /get_beatmaps endpoint."""
+    params['k'] = glob.config.osu_api_key
+
+    # the osu!api responds with [] for no results.
+    if data := await _request(OSUAPI_GET_BEATMAPS, params, json=True):
+        return data
+
+async def get_osu_file(bmap_id: int) -> Optional[bytes]:
+    """Download a beatmap's .osu file from osu!."""
+    return await _request(OSU_FILE_URL.format(bmap_id=bmap_id))
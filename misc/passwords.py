@@ -0,0 +1,68 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import bcrypt
+
+from objects import glob
+
+__all__ = (
+    'verify_password',
+    'hash_password',
+    'shutdown_executor'
+)
+
+# bcrypt releases the gil while it's hashing, so a small thread pool
+# gets us real parallelism without pickling data to another process.
+# the pool is bounded so a burst of cold logins can't starve the host.
+_executor = ThreadPoolExecutor(
+    max_workers=glob.config.bcrypt_workers,
+    thread_name_prefix='bcrypt'
+)
+
+# checks currently running in the pool; concurrent logins
+# with the same credentials will share a single computation.
+_inflight: dict[tuple[bytes, bytes], asyncio.Future] = {}
+
+def _check_done(key: tuple[bytes, bytes], fut: asyncio.Future) -> None:
+    """Remove a finished check from the pool, caching it if correct."""
+    del _inflight[key]
+
+    if not fut.cancelled() and fut.exception() is None and fut.result():
+        pw_bcrypt, pw_md5 = key
+        glob.cache['bcrypt'][pw_bcrypt] = pw_md5
+
+async def verify_password(pw_md5: bytes, pw_bcrypt: bytes) -> bool:
+    """Check `pw_md5` against `pw_bcrypt` without blocking the event loop."""
+    bcrypt_cache = glob.cache['bcrypt']
+
+    if pw_bcrypt in bcrypt_cache:  # ~0.01 ms
+        return pw_md5 == bcrypt_cache[pw_bcrypt]
+
+    # NOTE: the md5 is part of the key; coalescing on the
+    # bcrypt alone would let a wrong password share a result.
+    key = (pw_bcrypt, pw_md5)
+
+    if not (fut := _inflight.get(key)):
+        loop = asyncio.get_running_loop()
+        fut = loop.run_in_executor(_executor, bcrypt.checkpw,
+                                   pw_md5, pw_bcrypt)  # ~200ms
+        fut.add_done_callback(partial(_check_done, key))
+        _inflight[key] = fut
+
+    # shield the shared future so one waiter
+    # cancelling doesn't cancel the others.
+    return await asyncio.shield(fut)
+
+async def hash_password(pw_md5: bytes) -> bytes:
+    """Hash `pw_md5` with a new salt without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    pw_bcrypt = await loop.run_in_executor(_executor, bcrypt.hashpw,
+                                           pw_md5, bcrypt.gensalt())
+
+    glob.cache['bcrypt'][pw_bcrypt] = pw_md5  # cache result for login
+    return pw_bcrypt
+
+def shutdown_executor() -> None:
+    """Shut down the bcrypt pool, waiting on any running work."""
+    _executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,188 @@
+import asyncio
+import math
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from cmyui.osu.oppai_ng import OppaiWrapper
+from peace_performance_python.objects import Beatmap as PeaceMap
+from peace_performance_python.objects import Calculator as PeaceCalculator
+
+from objects import glob
+
+__all__ = (
+    'PPParams',
+    'calculate',
+    'calculate_many',
+    'shutdown_executor'
+)
+
+class PPParams(NamedTuple):
+    """The score parameters for a single pp calculation."""
+    mods: Optional[int] = None
+    acc: Optional[float] = None
+    nmiss: Optional[int] = None
+    combo: Optional[int] = None
+    score: Optional[int] = None  # mania
+
+"""Worker side; runs in the pool's processes."""
+
+# parsed beatmaps, keyed by md5 so an updated
+# mapfile will never be served from a stale parse.
+# each worker process keeps its own cache.
+_beatmaps: 'OrderedDict[str, PeaceMap]' = OrderedDict()
+
+def _get_peace_map(md5: str, osu_file_path: str,
+                   max_size: int) -> PeaceMap:
+    """Get a parsed beatmap from the worker's lru cache, parsing on miss."""
+    if md5 in _beatmaps:
+        _beatmaps.move_to_end(md5)
+        return _beatmaps[md5]
+
+    beatmap = _beatmaps[md5] = PeaceMap(osu_file_path)
+
+    while len(_beatmaps) > max_size:
+        _beatmaps.popitem(last=False)
+
+    return beatmap
+
+def _calc_std(osu_file_path: str, params: PPParams) -> tuple[float, float]:
+    with OppaiWrapper('oppai-ng/liboppai.so') as ezpp:
+        if params.mods:
+            ezpp.set_mods(params.mods)
+
+        if params.combo is not None:
+            ezpp.set_combo(params.combo)
+
+        if params.nmiss is not None:
+            ezpp.set_nmiss(params.nmiss)  # clobbers acc
+
+        if params.acc is not None:
+            ezpp.set_accuracy_percent(params.acc)
+
+        ezpp.calculate(osu_file_path)
+        return (ezpp.get_pp(), ezpp.get_sr())
+
+def _calc_peace(beatmap: PeaceMap, mode_vn: int,
+                params: PPParams) -> tuple[float, float]:
+    peace = PeaceCalculator()
+
+    if params.mods:
+        peace.set_mods(params.mods)
+
+    peace.set_mode(mode_vn)
+
+    if mode_vn == 3:  # mania
+        if params.score is not None:
+            peace.set_score(params.score)
+    else:
+        if params.combo is not None:
+            peace.set_combo(params.combo)
+
+        if params.nmiss is not None:
+            peace.set_miss(params.nmiss)
+
+        if params.acc is not None:
+            peace.set_acc(params.acc)
+
+    calculated = peace.calculate(beatmap)
+    return (round(calculated.pp, 5), calculated.stars)
+
+def _calculate_batch(md5: str, osu_file_path: str, mode_vn: int,
+                     batch: list[PPParams],
+                     max_size: int) -> list[tuple[float, float]]:
+    """Calculate pp & star rating for a batch of scores on one map."""
+    results = []
+
+    if mode_vn == 0:  # std
+        # NOTE: oppai-ng's wrapper only accepts a file path, so
+        # there's no parsed map for us to keep around for std.
+        for params in batch:
+            results.append(_calc_std(osu_file_path, params))
+    elif mode_vn in (1, 2, 3):  # taiko, catch, mania
+        beatmap = _get_peace_map(md5, osu_file_path, max_size)
+
+        for params in batch:
+            results.append(_calc_peace(beatmap, mode_vn, params))
+    else:
+        raise ValueError(f'Invalid vanilla mode {mode_vn}')
+
+    # TODO: report non-finite results to logserver
+    return [(pp, sr) if math.isfinite(pp) else (0.0, 0.0)
+            for pp, sr in results]
+
+"""Server side; runs on the event loop."""
+
+# pp calculation is cpu-bound and holds the gil,
+# so it's done in a pool of processes, off the event loop.
+# workers are started from a forkserver, rather than forked from
+# the server itself, which would copy it's event loop, sockets &
+# database connections (& any locks held by other threads).
+_executor = ProcessPoolExecutor(
+    max_workers=glob.config.pp_workers,
+    mp_context=multiprocessing.get_context('forkserver')
+)
+
+# requests made in the same iteration of the event loop are
+# grouped by map, and sent to the pool as a single batch.
+_BatchKey = tuple[str, int]  # (md5, mode_vn)
+_pending: dict[_BatchKey, tuple[str, list[PPParams],
+                                 list[asyncio.Future]]] = {}
+
+def _flush_batch(key: _BatchKey) -> None:
+    """Send all pending requests for `key` to the pool."""
+    osu_file_path, batch, waiters = _pending.pop(key)
+    md5, mode_vn = key
+
+    loop = asyncio.get_running_loop()
+    fut = loop.run_in_executor(
+        _executor, _calculate_batch, md5, osu_file_path, mode_vn,
+        batch, glob.config.pp_cached_beatmaps
+    )
+
+    def _resolve(fut: asyncio.Future) -> None:
+        if fut.cancelled():
+            for waiter in waiters:
+                waiter.cancel()
+        elif (exc := fut.exception()) is not None:
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_exception(exc)
+        else:
+            for waiter, result in zip(waiters, fut.result()):
+                if not waiter.done():
+                    waiter.set_result(result)
+
+    fut.add_done_callback(_resolve)
+
+async def calculate(md5: str, osu_file_path: Path, mode_vn: int,
+                    params: PPParams) -> tuple[float, float]:
+    """Calculate pp & star rating for a score without blocking the event loop."""
+    key = (md5, mode_vn)
+    loop = asyncio.get_running_loop()
+
+    if key not in _pending:
+        _pending[key] = (str(osu_file_path), [], [])
+        loop.call_soon(_flush_batch, key)
+
+    _, batch, waiters = _pending[key]
+
+    waiter = loop.create_future()
+    batch.append(params)
+    waiters.append(waiter)
+
+    return await waiter
+
+async def calculate_many(md5: str, osu_file_path: Path, mode_vn: int,
+                         batch: list[PPParams]) -> list[tuple[float, float]]:
+    """Calculate pp & star rating for many scores on a single map."""
+    return await asyncio.gather(*[
+        calculate(md5, osu_file_path, mode_vn, params)
+        for params in batch
+    ])
+
+def shutdown_executor() -> None:
+    """Shut down the pp calculation pool, waiting on any running work."""
+    _executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,429 @@
+import asyncio
+import lzma
+import re
+import struct
+import zlib
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+import misc.fileio
+from cmyui.logging import Ansi, log
+
+from objects import glob
+
+__all__ = (
+    'store_replay',
+    'load_replay',
+    'shutdown_executor'
+)
+
+REPLAYS_PATH = Path.cwd() / '.data/osr'
+SEGMENTS_PATH = REPLAYS_PATH / 'segments'
+
+"""\
+replays are stored in append-only segment files, rather than one file
+per score; each segment is a series of records in the format below.
+
+    u32 crc32 (of the data), u8 codec, u16 key length, u32 data length,
+    the key (score id, utf-8), then the data.
+
+records are located by the `replays` collection (the index), which stores
+each replay's segment, the offset of its record, it's length & codec. since
+records describe themselves, the index can be rebuilt from the segments.
+
+replays are first stored as the client sent them, and recompressed in the
+background; the recompressed record is appended & the index moved to it, so
+a score id may have several records, of which the last is current.
+"""
+
+RECORD_HEADER = struct.Struct('<IBHI')
+
+# how a replay's data is stored in it's record.
+CODEC_RAW = 0     # the client's lzma stream, as-is (couldn't be decoded)
+CODEC_TEXT = 1    # the frame text, xz compressed (frames didn't round trip)
+CODEC_FRAMES = 2  # columns of delta encoded varints, xz compressed
+
+# the client's compression is tuned for speed; we're
+# storing replays long-term, so we'll use the strongest.
+XZ_PRESET = 9 | lzma.PRESET_EXTREME
+
+# streams rebuilt for the client are served once & thrown away,
+# so they're compressed quickly instead (~5x faster, ~10% larger).
+SERVE_PRESET = 1
+
+# the highest precision we'll store cursor coordinates with.
+MAX_DECIMALS = 6
+
+NUMBER_RGX = re.compile(r'^-?\d+(?:\.(\d+))?$')
+
+# lzma releases the gil while (de)compressing, so threads
+# get us parallelism without pickling replays to processes.
+_executor = ThreadPoolExecutor(
+    max_workers=glob.config.replay_workers,
+    thread_name_prefix='replays'
+)
+
+# appends are serialized anyway, so they get a thread of their
+# own; score submission never waits behind a recompression.
+_append_executor = ThreadPoolExecutor(
+    max_workers=1,
+    thread_name_prefix='replays-append'
+)
+
+# replays are fetched on a pool of their own, so a burst of
+# downloads can't hold up the recompression of new replays.
+_fetch_executor = ThreadPoolExecutor(
+    max_workers=glob.config.replay_fetch_workers,
+    thread_name_prefix='replays-fetch'
+)
+
+# held while appending, so records are never interleaved.
+_append_lock: Optional[asyncio.Lock] = None
+
+# background recompressions; kept so they aren't garbage collected.
+_recompress_tasks: set[asyncio.Task] = set()
+
+# the segment currently being appended to; found on first write.
+_segment_id: Optional[int] = None
+
+"""Encoding (runs in the pool's threads)."""
+
+def _write_varints(values: array) -> bytes:
+    """Encode a column of signed ints as zigzag varints."""
+    buf = bytearray()
+
+    for value in values:
+        value = (value << 1) ^ (value >> 63)  # zigzag
+
+        while value > 0x7f:
+            buf.append((value & 0x7f) | 0x80)
+            value >>= 7
+
+        buf.append(value)
+
+    return bytes(buf)
+
+def _read_varints(data: memoryview, offset: int,
+                  count: int) -> tuple[array, int]:
+    """Decode a column of `count` zigzag varints from `data`."""
+    values = array('q')
+
+    for _ in range(count):
+        value = shift = 0
+
+        while True:
+            byte = data[offset]
+            offset += 1
+            value |= (byte & 0x7f) << shift
+            shift += 7
+
+            if not byte & 0x80:
+                break
+
+        values.append((value >> 1) ^ -(value & 1))
+
+    return values, offset
+
+def _deltas(values: array) -> array:
+    """Return each value's difference from the previous value."""
+    return array('q', [b - a for a, b in zip((0, *values), values)])
+
+def _undo_deltas(deltas: array) -> array:
+    """Return the running totals of a column of deltas."""
+    values = array('q')
+    total = 0
+
+    for delta in deltas:
+        total += delta
+        values.append(total)
+
+    return values
+
+def _format_number(value: int, decimals: int) -> str:
+    """Format a fixed point number as the osu! client would."""
+    if not decimals:
+        return str(value)
+
+    whole, frac = divmod(abs(value), 10 ** decimals)
+    sign = '-' if value < 0 else ''
+
+    if frac_str := str(frac).zfill(decimals).rstrip('0'):
+        return f'{sign}{whole}.{frac_str}'
+
+    return f'{sign}{whole}'
+
+def _encode_frames(text: str) -> Optional[bytes]:
+    """Encode a replay's frame text into our compact columnar format."""
+    tokens = text.split(',')
+    trailing_comma = tokens[-1] == ''
+
+    if trailing_comma:
+        tokens.pop()
+
+    # frames are `w|x|y|z`; the time delta since the last frame,
+    # the cursor's coordinates (floats), and the keys pressed.
+    times = array('q')
+    keys = array('q')
+    coords = []
+    decimals = 0
+
+    for token in tokens:
+        parts = token.split('|')
+
+        if len(parts) != 4:
+            return
+
+        for part in parts:
+            if not (m := NUMBER_RGX.match(part)):
+                return
+
+            if m[1] is not None:
+                decimals = max(decimals, len(m[1]))
+
+        if decimals > MAX_DECIMALS:
+            return
+
+        times.append(int(parts[0]))
+        keys.append(int(parts[3]))
+        coords.append((parts[1], parts[2]))
+
+    # store coordinates as fixed point, at the
+    # highest precision used anywhere in the replay.
+    scale = 10 ** decimals
+    xs = array('q', [round(float(x) * scale) for x, _ in coords])
+    ys = array('q', [round(float(y) * scale) for _, y in coords])
+
+    # cursor positions (& times) change in small steps from
+    # frame to frame; as deltas, most fit in a single byte.
+    return b''.join((
+        struct.pack('<IB?', len(times), decimals, trailing_comma),
+        _write_varints(times),
+        _write_varints(_deltas(xs)),
+        _write_varints(_deltas(ys)),
+        _write_varints(keys)
+    ))
+
+def _decode_frames(data: bytes) -> str:
+    """Decode our columnar format back into a replay's frame text."""
+    view = memoryview(data)
+    count, decimals, trailing_comma = struct.unpack_from('<IB?', view)
+    offset = struct.calcsize('<IB?')
+
+    times, offset = _read_varints(view, offset, count)
+    xs, offset = _read_varints(view, offset, count)
+    ys, offset = _read_varints(view, offset, count)
+    keys, offset = _read_varints(view, offset, count)
+
+    text = ','.join([
+        f'{w}|{_format_number(x, decimals)}|{_format_number(y, decimals)}|{z}'
+        for w, x, y, z in zip(times, _undo_deltas(xs), _undo_deltas(ys), keys)
+    ])
+
+    return text + ',' if trailing_comma else text
+
+def _encode_replay(raw_replay: bytes) -> tuple[int, bytes]:
+    """Recompress a replay as submitted by the client."""
+    try:
+        frame_bytes = lzma.decompress(raw_replay, format=lzma.FORMAT_ALONE)
+        text = frame_bytes.decode('ascii')
+    except (lzma.LZMAError, UnicodeDecodeError):
+        return CODEC_RAW, raw_replay
+
+    # only use our format if it reproduces the frames exactly.
+    if (
+        (frames := _encode_frames(text)) is not None and
+        _decode_frames(frames) == text
+    ):
+        return CODEC_FRAMES, lzma.compress(frames, preset=XZ_PRESET)
+
+    return CODEC_TEXT, lzma.compress(frame_bytes, preset=XZ_PRESET)
+
+def _decode_replay(codec: int, data: bytes) -> bytes:
+    """Rebuild the lzma stream the osu! client expects from a record."""
+    if codec == CODEC_RAW:
+        return data
+
+    frame_bytes = lzma.decompress(data)
+
+    if codec == CODEC_FRAMES:
+        frame_bytes = _decode_frames(frame_bytes).encode()
+
+    return lzma.compress(frame_bytes, format=lzma.FORMAT_ALONE,
+                         preset=SERVE_PRESET)
+
+"""Segment i/o (runs in the pool's threads)."""
+
+def _segment_path(segment_id: int) -> Path:
+    return SEGMENTS_PATH / f'{segment_id:06d}.seg'
+
+def _find_segment() -> int:
+    """Find the latest segment, to continue appending to."""
+    SEGMENTS_PATH.mkdir(parents=True, exist_ok=True)
+
+    segment_ids = [int(path.stem) for path in SEGMENTS_PATH.glob('*.seg')
+                   if path.stem.isdecimal()]
+
+    return max(segment_ids, default=0)
+
+def _append_record(segment_id: int, key: str, codec: int,
+                   data: bytes) -> tuple[int, int]:
+    """Append a record to a segment, returning it's segment & offset."""
+    path = _segment_path(segment_id)
+
+    if (
+        path.exists() and
+        path.stat().st_size >= glob.config.replay_segment_size
+    ):
+        # this segment's full; start a new one.
+        segment_id += 1
+        path = _segment_path(segment_id)
+
+    key_bytes = key.encode()
+    header = RECORD_HEADER.pack(zlib.crc32(data), codec,
+                                len(key_bytes), len(data))
+
+    with open(path, 'ab') as f:
+        offset = f.tell()
+        f.write(header + key_bytes + data)
+        f.flush()
+
+    return segment_id, offset
+
+def _read_record(segment_id: int, offset: int, length: int) -> bytes:
+    """Read a record's data from a segment, checking it's integrity."""
+    with open(_segment_path(segment_id), 'rb') as f:
+        f.seek(offset)
+        header = f.read(RECORD_HEADER.size)
+        crc, _, key_len, data_len = RECORD_HEADER.unpack(header)
+
+        f.seek(key_len, 1)
+        data = f.read(data_len)
+
+    if data_len != length or zlib.crc32(data) != crc:
+        raise ValueError(f'Corrupt replay record ({segment_id}:{offset}).')
+
+    return data
+
+def _store(segment_id: Optional[int], key: str, codec: int,
+           data: bytes) -> tuple[int, int]:
+    if segment_id is None:
+        segment_id = _find_segment()
+
+    return _append_record(segment_id, key, codec, data)
+
+def _load(segment_id: int, offset: int, length: int, codec: int) -> bytes:
+    return _decode_replay(codec, _read_record(segment_id, offset, length))
+
+"""Public api."""
+
+def _get_append_lock() -> asyncio.Lock:
+    global _append_lock
+
+    if _append_lock is None:
+        _append_lock = asyncio.Lock()
+
+    return _append_lock
+
+async def _append(score_id: str, codec: int, data: bytes) -> tuple[int, int]:
+    """Append a record to the replay store, returning it's segment & offset."""
+    global _segment_id
+
+    loop = asyncio.get_running_loop()
+
+    async with _get_append_lock():
+        segment_id, offset = await loop.run_in_executor(
+            _append_executor, _store, _segment_id, score_id, codec, data
+        )
+        _segment_id = segment_id
+
+    return segment_id, offset
+
+async def _recompress(score_id: str, raw_replay: bytes,
+                      segment_id: int, offset: int) -> None:
+    """Recompress a stored replay, & move the index to the new record."""
+    loop = asyncio.get_running_loop()
+
+    codec, data = await loop.run_in_executor(
+        _executor, _encode_replay, raw_replay
+    )
+
+    if codec == CODEC_RAW:
+        return  # couldn't be decoded; it's already stored as-is.
+
+    new_segment_id, new_offset = await _append(score_id, codec, data)
+
+    # only if the index still points at the record we recompressed.
+    await glob.db.replays.update_one(
+        {'_id': score_id, 'segment': segment_id, 'offset': offset},
+        {'$set': {
+            'segment': new_segment_id,
+            'offset': new_offset,
+            'length': len(data),
+            'codec': codec
+        }}
+    )
+
+def _recompress_done(task: asyncio.Task) -> None:
+    _recompress_tasks.discard(task)
+
+    if not task.cancelled() and (exc := task.exception()):
+        # the replay's still stored as the client sent it.
+        log(f'Failed to recompress replay: {exc!r}', Ansi.LRED)
+
+async def store_replay(score_id: str, raw_replay: bytes) -> None:
+    """Append a submitted replay to the replay store.
+
+    The replay's stored as the client sent it & recompressed in the
+    background, since compressing a long replay can take most of a second.
+    """
+    segment_id, offset = await _append(score_id, CODEC_RAW, raw_replay)
+
+    await glob.db.replays.replace_one({'_id': score_id}, {
+        'segment': segment_id,
+        'offset': offset,
+        'length': len(raw_replay),
+        'codec': CODEC_RAW
+    }, upsert=True)
+
+    task = asyncio.create_task(
+        _recompress(score_id, raw_replay, segment_id, offset)
+    )
+    task.add_done_callback(_recompress_done)
+    _recompress_tasks.add(task)
+
+async def load_replay(score_id: str) -> Optional[bytes]:
+    """Fetch a replay's lzma stream, as the osu! client expects it."""
+    loop = asyncio.get_running_loop()
+    replay_cache = glob.cache['replay']
+
+    # rebuilding a stream is expensive, and recent
+    # replays tend to be downloaded many times over.
+    if (replay := replay_cache.get(score_id)) is not None:
+        return replay
+
+    if not (res := await glob.db.replays.find_one({'_id': score_id})):
+        # replays submitted before the store existed
+        # are still kept in their own files; use those.
+        return await misc.fileio.read_bytes(REPLAYS_PATH / f'{score_id}.osr')
+
+    try:
+        replay = await loop.run_in_executor(
+            _fetch_executor, _load, res['segment'], res['offset'],
+            res['length'], res['codec']
+        )
+    except (OSError, ValueError, lzma.LZMAError) as exc:
+        log(f'Failed to load replay {score_id}: {exc}', Ansi.LRED)
+        return
+
+    replay_cache[score_id] = replay
+    return replay
+
+def shutdown_executor() -> None:
+    """Shut down the replay pools, waiting on any running work."""
+    # queued recompressions are dropped; their
+    # replays are already stored as the client sent them.
+    _executor.shutdown(wait=True, cancel_futures=True)
+    _append_executor.shutdown(wait=True)
+    _fetch_executor.shutdown(wait=True)
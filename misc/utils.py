@@ -21,6 +21,8 @@ from typing import (Any, AsyncGenerator, Callable, Optional, Sequence, Type,
 import cmyui
 import dill as pickle
 import requests
+
+import misc.fileio
 from cmyui.logging import Ansi, Rainbow, log, printc
 from cmyui.osu.replay import Keys, ReplayFrame
 from constants.countries import country_codes
@@ -112,7 +114,7 @@ def make_safe_name(name: str) -> str:
 
 async def fetch_bot_name() -> str:
     """Fetch the bot's name from the database, if available."""
-    bot = glob.db.users.find_one({'_id': "61932fe7821f7bdc6ed4092a"})
+    bot = await glob.db.users.find_one({'_id': "61932fe7821f7bdc6ed4092a"})
     
     if bot is None:
         return 'Axioma'
@@ -291,12 +293,9 @@ async def log_strange_occurrence(obj: object) -> None:
         # log to a file locally, and prompt the user
         while True:
             log_file = STRANGE_LOG_DIR / f'strange_{secrets.token_hex(4)}.db'
-            if not log_file.exists():
+            if await misc.fileio.create_bytes(log_file, pickled_obj):
                 break
 
-        log_file.touch(exist_ok=False)
-        log_file.write_bytes(pickled_obj)
-
         log('Logged strange occurrence to', Ansi.LYELLOW, end=' ')
         printc('/'.join(log_file.parts[-4:]), Ansi.LBLUE)
 
@@ -389,6 +388,7 @@ def shutdown_signal_handler(signum: Union[int, signal.Signals]) -> None:
     log(f'Received {signal.strsignal(signum)}', Ansi.LRED)
 
     glob.shutting_down = True
+    glob.shutdown_event.set()
 
 def _handle_fut_exception(fut: asyncio.Future) -> None:
     if not fut.cancelled():
@@ -0,0 +1,153 @@
+import asyncio
+from typing import Optional, Union
+
+from cmyui.logging import Ansi, log
+from pymongo import DeleteOne, InsertOne, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from objects import glob
+
+__all__ = (
+    'enqueue',
+    'wait_for_writes',
+    'flush'
+)
+
+WriteOp = Union[InsertOne, UpdateOne, UpdateMany, DeleteOne]
+
+# writes whose results nobody waits on (stats, map plays, etc.)
+# are queued here & sent in bulk, one ordered batch per collection.
+_pending: dict[str, list[WriteOp]] = {}
+_pending_count = 0
+
+# consecutive failed flushes; while the database is unreachable,
+# failed batches are re-queued & retried with exponential backoff.
+_failures = 0
+
+# RETRY_BACKOFF * 2 ** failures seconds, up to MAX_RETRY_BACKOFF.
+RETRY_BACKOFF = 0.5
+MAX_RETRY_BACKOFF = 30.0
+
+# set on the first write queued after a flush, so the flusher can sleep
+# while idle; set once enough writes have queued up to flush early; and
+# held while flushing so a final flush at shutdown waits on any running.
+# all are created lazily, since they must be made inside the loop.
+_queue_nonempty: Optional[asyncio.Event] = None
+_queue_full: Optional[asyncio.Event] = None
+_flush_lock: Optional[asyncio.Lock] = None
+
+def _get_queue_nonempty() -> asyncio.Event:
+    global _queue_nonempty
+
+    if _queue_nonempty is None:
+        _queue_nonempty = asyncio.Event()
+
+    return _queue_nonempty
+
+def _get_queue_full() -> asyncio.Event:
+    global _queue_full
+
+    if _queue_full is None:
+        _queue_full = asyncio.Event()
+
+    return _queue_full
+
+def _get_flush_lock() -> asyncio.Lock:
+    global _flush_lock
+
+    if _flush_lock is None:
+        _flush_lock = asyncio.Lock()
+
+    return _flush_lock
+
+def enqueue(collection: str, op: WriteOp) -> None:
+    """Queue a write to `collection`, to be sent with the next batch."""
+    global _pending_count
+
+    _pending.setdefault(collection, []).append(op)
+    _pending_count += 1
+
+    _get_queue_nonempty().set()
+
+    if _pending_count >= glob.config.write_queue_max_ops:
+        _get_queue_full().set()
+
+def _requeue(collection: str, ops: list[WriteOp]) -> None:
+    """Put a failed batch back in front of any writes queued since."""
+    global _pending_count
+
+    _pending[collection] = ops + _pending.get(collection, [])
+    _pending_count += len(ops)
+
+    _get_queue_nonempty().set()
+
+async def wait_for_writes(timeout: float) -> None:
+    """Wait for a write to be queued, then until `timeout` has
+       passed or the queue has filled up.
+
+    After a failed flush, waits out the retry backoff instead.
+    """
+    queue_nonempty = _get_queue_nonempty()
+    queue_full = _get_queue_full()
+
+    # nothing to write; sleep until there is.
+    await queue_nonempty.wait()
+
+    if _failures:
+        # the database is having trouble; don't hammer it.
+        await asyncio.sleep(min(RETRY_BACKOFF * 2 ** min(_failures, 10),
+                                MAX_RETRY_BACKOFF))
+    else:
+        try:
+            await asyncio.wait_for(queue_full.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    queue_nonempty.clear()
+    queue_full.clear()
+
+async def flush() -> None:
+    """Send all queued writes to the database.
+
+    Batches which fail to send are re-queued, to be retried.
+    """
+    global _pending, _pending_count, _failures
+
+    async with _get_flush_lock():
+        if not _pending:
+            return
+
+        batches = _pending
+        _pending = {}
+        _pending_count = 0
+
+        failed = False
+
+        for collection, ops in batches.items():
+            try:
+                # ordered, so writes to the same document apply in sequence.
+                await glob.db[collection].bulk_write(ops, ordered=True)
+            except BulkWriteError as exc:
+                # the writes before the failed op were applied, & the
+                # op itself was rejected, so retrying it won't help;
+                # drop it, and re-queue the writes after it.
+                if write_errors := exc.details.get('writeErrors'):
+                    idx = write_errors[0]['index']
+                    log(f'Dropped a queued op to {collection}: '
+                        f'{write_errors[0].get("errmsg")}', Ansi.LRED)
+
+                    if remaining := ops[idx + 1:]:
+                        _requeue(collection, remaining)
+                else:
+                    # only the write concern failed;
+                    # the writes were still applied.
+                    log(f'Queued writes to {collection} failed their '
+                        f'write concern: {exc}', Ansi.LYELLOW)
+            except PyMongoError as exc:
+                log(f'Failed to write {len(ops)} queued ops '
+                    f'to {collection}, retrying: {exc}', Ansi.LRED)
+
+                _requeue(collection, ops)
+                failed = True
+
+        _failures = _failures + 1 if failed else 0
@@ -1,46 +1,168 @@
+import asyncio
 import functools
 import hashlib
-from collections import defaultdict
+import os
+from collections import OrderedDict, defaultdict
 #from dataclasses import dataclass
 from datetime import datetime, timedelta
 from enum import IntEnum, unique
 from pathlib import Path
-from typing import Any, Mapping, Optional
+from typing import Any, Awaitable, Callable, Mapping, Optional, TypeVar
 
+import misc.fileio
+import misc.osuapi
+import misc.performance
 import misc.utils
 from cmyui.logging import Ansi, log
 from constants.gamemodes import GameMode
+from constants.mods import Mods
 
 from objects import glob
 
-__all__ = ('ensure_local_osu_file', 'RankedStatus',
+__all__ = ('ensure_local_osu_file', 'read_osu_file',
+           'refresh_stale_sets', 'RankedStatus',
            'Beatmap', 'BeatmapSet')
 
 BASE_DOMAIN = glob.config.domain
 
 BEATMAPS_PATH = Path.cwd() / '.data/osu'
 
-OSUAPI_GET_BEATMAPS = 'https://old.ppy.sh/api/get_beatmaps'
-
 DEFAULT_LAST_UPDATE = datetime(1970, 1, 1)
 
 IGNORED_BEATMAP_CHARS = dict.fromkeys(map(ord, r':\/*<>?"|'), None)
 
+# the mod combinations we'll compute pp for in the
+# background once a map is first /np'ed or played.
+PP_CACHED_MODS = tuple(map(Mods.from_modstr, glob.config.pp_cached_mods))
+
+# the verified md5s of .osu files on disk, along with the files'
+# mtime & size when hashed; while those are unchanged, the md5 can
+# be trusted without reading the file. {path: (md5, mtime_ns, size)}
+_osu_file_index: 'OrderedDict[Path, tuple[str, int, int]]' = OrderedDict()
+
+# the contents of recently read .osu files; {path: (md5, content)}
+_osu_file_contents: 'OrderedDict[Path, tuple[str, bytes]]' = OrderedDict()
+_osu_file_contents_size = 0
+
+T = TypeVar('T')
+
+# lookups & downloads currently in flight; concurrent cache misses for
+# the same map share a single request. {('md5', md5): task, ...}
+_inflight: dict[tuple[str, Any], asyncio.Task] = {}
+
+# sets which have expired & are waiting to be refreshed
+# from the osu!api in the background; {bsid: set, ...}
+_stale_sets: dict[int, 'BeatmapSet'] = {}
+
+# pp tables currently being computed; {(md5, mode_vn, mods): task}
+_pp_inflight: dict[tuple[str, int, Mods], asyncio.Task] = {}
+
+def _uncache_set(bsid: int, bmap_set: 'BeatmapSet') -> None:
+    """Drop an evicted set's maps from the beatmap cache,
+       and from the queue of sets waiting to be refreshed."""
+    beatmap_cache = glob.cache['beatmap']
+
+    for bmap in bmap_set.maps:
+        beatmap_cache.pop(bmap.md5)
+        beatmap_cache.pop(bmap.id)
+
+    _stale_sets.pop(bsid, None)
+
+# maps are cached by md5 & id for as long as their set is cached, and
+# evicted along with it; the beatmap cache is bounded by the set cache.
+glob.cache['beatmapset'].on_evict = _uncache_set
+
 
 async def osuapiv1_getbeatmaps(**params) -> Optional[list[dict[str, Any]]]:
     """Fetch data from the osu!api with a beatmap's md5."""
     if glob.app.debug:
         log(f'Doing osu!api (getbeatmaps) request {params}', Ansi.LMAGENTA)
 
-    params['k'] = glob.config.osu_api_key
+    # sent within our osu!api budget, at the caller's priority.
+    return await misc.osuapi.get_beatmaps(**params)
+
+
+def _inflight_done(key: tuple[str, Any], task: asyncio.Task) -> None:
+    if _inflight.get(key) is task:
+        del _inflight[key]
+
+async def _single_flight(key: tuple[str, Any],
+                         func: Callable[..., Awaitable[T]], *args: Any) -> T:
+    """Run `func(*args)`, or join the run already in flight for `key`."""
+    if not (task := _inflight.get(key)):
+        task = asyncio.create_task(func(*args))
+        task.add_done_callback(functools.partial(_inflight_done, key))
+        _inflight[key] = task
+
+    # shield the shared task so one waiter
+    # cancelling doesn't cancel the others.
+    return await asyncio.shield(task)
+
+def _index_osu_file(osu_file_path: Path, md5: str,
+                    st: os.stat_result) -> None:
+    """Record the verified md5 of a .osu file on disk."""
+    _osu_file_index[osu_file_path] = (md5, st.st_mtime_ns, st.st_size)
+    _osu_file_index.move_to_end(osu_file_path)
+
+    while len(_osu_file_index) > glob.config.osu_file_index_size:
+        _osu_file_index.popitem(last=False)
+
+def _cache_osu_file(osu_file_path: Path, md5: str, content: bytes) -> None:
+    """Keep the contents of a .osu file in memory."""
+    global _osu_file_contents_size
+
+    if osu_file_path in _osu_file_contents:
+        _osu_file_contents_size -= len(_osu_file_contents[osu_file_path][1])
+
+    _osu_file_contents[osu_file_path] = (md5, content)
+    _osu_file_contents.move_to_end(osu_file_path)
+    _osu_file_contents_size += len(content)
+
+    while _osu_file_contents_size > glob.config.osu_file_cache_size:
+        _, (_, evicted) = _osu_file_contents.popitem(last=False)
+        _osu_file_contents_size -= len(evicted)
+
+async def _osu_file_md5(osu_file_path: Path) -> Optional[str]:
+    """Return the md5 of a .osu file on disk, only hashing
+       it if it's changed since we last did (or never have)."""
+    if not (st := await misc.fileio.stat(osu_file_path)):
+        _osu_file_index.pop(osu_file_path, None)
+        return
+
+    if (
+        (entry := _osu_file_index.get(osu_file_path)) and
+        entry[1:] == (st.st_mtime_ns, st.st_size)
+    ):
+        _osu_file_index.move_to_end(osu_file_path)
+        return entry[0]
+
+    # NOTE: we stat before hashing, so if the file's modified
+    # while we're hashing it, the stat won't match next time.
+    if md5 := await misc.fileio.file_md5(osu_file_path):
+        _index_osu_file(osu_file_path, md5, st)
+
+    return md5
+
+async def read_osu_file(osu_file_path: Path,
+                        bmap_md5: Optional[str] = None) -> Optional[bytes]:
+    """Return the contents of a .osu file on disk (if it matches
+       `bmap_md5`), from memory if it's unchanged since last read."""
+    md5 = await _osu_file_md5(osu_file_path)
+
+    if not md5 or (bmap_md5 is not None and md5 != bmap_md5):
+        return
 
-    async with glob.http_session.get(OSUAPI_GET_BEATMAPS, params=params) as resp:
-        if (
-            resp and resp.status == 200 and
-            resp.content.total_bytes != 2  # b'[]'
-        ):
-            return await resp.json()
+    if (
+        (entry := _osu_file_contents.get(osu_file_path)) and
+        entry[0] == md5
+    ):
+        _osu_file_contents.move_to_end(osu_file_path)
+        return entry[1]
 
+    if content := await misc.fileio.read_bytes(osu_file_path):
+        _cache_osu_file(osu_file_path, md5, content)
+
+    return content
 
 async def ensure_local_osu_file(
     osu_file_path: Path,
@@ -48,26 +170,68 @@ async def ensure_local_osu_file(
 ) -> bool:
     """Ensure we have the latest .osu file locally,
        downloading it from the osu!api if required."""
-    if (
-        not osu_file_path.exists() or
-        hashlib.md5(osu_file_path.read_bytes()).hexdigest() != bmap_md5
-    ):
+    if await _osu_file_md5(osu_file_path) != bmap_md5:
         # need to get the file from the osu!api
-        if glob.app.debug:
-            log(f'Doing osu!api (.osu file) request {bmap_id}', Ansi.LMAGENTA)
-
-        url = f'https://old.ppy.sh/osu/{bmap_id}'
-        async with glob.http_session.get(url) as r:
-            if not r or r.status != 200:
-                # temporary logging, not sure how possible this is
-                stacktrace = misc.utils.get_appropriate_stacktrace()
-                await misc.utils.log_strange_occurrence(stacktrace)
-                return False
+        return await _single_flight(('osu_file', osu_file_path),
+                                    _download_osu_file,
+                                    osu_file_path, bmap_id)
 
-            osu_file_path.write_bytes(await r.read())
+    return True
+
+async def _download_osu_file(osu_file_path: Path, bmap_id: int) -> bool:
+    """Download a .osu file from the osu!api, saving it to disk."""
+    if glob.app.debug:
+        log(f'Doing osu!api (.osu file) request {bmap_id}', Ansi.LMAGENTA)
+
+    if not (content := await misc.osuapi.get_osu_file(bmap_id)):
+        # temporary logging, not sure how possible this is
+        stacktrace = misc.utils.get_appropriate_stacktrace()
+        await misc.utils.log_strange_occurrence(stacktrace)
+        return False
+
+    await misc.fileio.write_bytes(osu_file_path, content)
+
+    # we know what we've written; index it without hashing the file.
+    if st := await misc.fileio.stat(osu_file_path):
+        md5 = hashlib.md5(content).hexdigest()
+        _index_osu_file(osu_file_path, md5, st)
+        _cache_osu_file(osu_file_path, md5, content)
 
     return True
 
+async def refresh_stale_sets(max_sets: int) -> None:
+    """Refresh up to `max_sets` expired sets from the osu!api."""
+    batch = []
+
+    while _stale_sets and len(batch) < max_sets:
+        bsid = next(iter(_stale_sets))
+        batch.append(_stale_sets.pop(bsid))
+
+    if not batch:
+        return
+
+    async def refresh(bmap_set: 'BeatmapSet') -> None:
+        # the set may have been refreshed since it was queued.
+        if bmap_set._cache_expired():
+            await bmap_set._update_if_available()
+
+    # these requests are sent within our osu!api budget,
+    # behind any requests players are waiting on.
+    with misc.osuapi.priority(misc.osuapi.Priority.Background):
+        results = await asyncio.gather(*map(refresh, batch),
+                                       return_exceptions=True)
+
+    for bmap_set, res in zip(batch, results):
+        if isinstance(res, Exception):
+            log(f'Failed to refresh set {bmap_set.bmap_id}: {res!r}', Ansi.LRED)
+
+def _pp_task_done(key: tuple[str, int, Mods], task: asyncio.Task) -> None:
+    """Remove a finished pp table computation, logging any failure."""
+    del _pp_inflight[key]
+
+    if not task.cancelled() and (exc := task.exception()):
+        log(f'Failed to compute pp table for {key}: {exc!r}', Ansi.LRED)
+
 # for some ungodly reason, different values are used to
 # represent different ranked statuses all throughout osu!
 # This drives me and probably everyone else pretty insane,
@@ -210,6 +374,9 @@ class Beatmap:
       Beatmap._from_md5_sql(md5: str) -> Optional[Beatmap]
       Beatmap._from_bid_sql(bid: int) -> Optional[Beatmap]
 
+      await Beatmap._fetch_md5(md5: str, set_id: int) -> Optional[Beatmap]
+      await Beatmap._fetch_bid(bid: int) -> Optional[Beatmap]
+
       Beatmap._parse_from_osuapi_resp(osuapi_resp: dict[str, object]) -> None
 
     Note that the BeatmapSet class also provides a similar API.
@@ -221,9 +388,12 @@ class Beatmap:
         version is found in the osu!api.
         # XXX: This is set when a map's status is manually changed.
 
-    pp_cache: dict[`Mods`, list[`float`]]
-        Cached pp values to serve when a map is /np'ed.
-        PP will be cached for whichever mod combination is requested.
+    pp_cache: dict[`int`, dict[`Mods`, list[tuple[`float`, `float`]]]]
+        Cached (pp, sr) values to serve when a map is /np'ed, for
+        each of the configured acc (or score, for mania) steps.
+        The common mod combinations are computed in the background
+        when a map is first /np'ed or played; any other combinations
+        will be cached as requested, up to `pp_cache_max_mods`.
     """
     __slots__ = ('set', 'md5', 'id', 'set_id',
                  'artist', 'title', 'version', 'creator',
@@ -265,7 +435,7 @@ class Beatmap:
         self.diff = kwargs.get('diff', 0.0)
 
         self.filename = kwargs.get('filename', '')
-        # {mode_vn: {mods: (acc/score: pp, ...), ...}}
+        # {mode_vn: {mods: [(pp, sr), ...], ...}}
         self.pp_cache = {0: {}, 1: {}, 2: {}, 3: {}}
 
     def __repr__(self) -> str:
@@ -326,6 +496,103 @@ class Beatmap:
             'diff': self.diff
         }
 
+    """ PP table """
+    # The pp values for a map's common acc (or score) steps are
+    # computed once per mod combination and kept in `pp_cache`,
+    # so things like /np and !with won't need the .osu file.
+
+    def get_cached_pp(
+        self, mode_vn: int, mods: Mods
+    ) -> Optional[list[tuple[float, float]]]:
+        """Return the cached (pp, sr) values for `mods`, if we have them."""
+        mode_cache = self.pp_cache[mode_vn]
+        mods = mods.filter_invalid_combos(mode_vn)
+
+        if mods not in mode_cache:
+            return
+
+        # move to the end so it's evicted last.
+        values = mode_cache[mods] = mode_cache.pop(mods)
+        return values
+
+    async def get_pp(
+        self, mode_vn: int, mods: Mods
+    ) -> Optional[list[tuple[float, float]]]:
+        """Return the (pp, sr) values for `mods` at each acc (or score)
+           step, computing & caching them if we don't have them yet."""
+        if values := self.get_cached_pp(mode_vn, mods):
+            return values
+
+        task = self._pp_task(mode_vn, mods.filter_invalid_combos(mode_vn))
+
+        # shield the shared task so one waiter
+        # cancelling doesn't cancel the others.
+        return await asyncio.shield(task)
+
+    def warm_pp_cache(self, mode_vn: int) -> None:
+        """Compute pp for the common mod combinations in the background."""
+        mode_cache = self.pp_cache[mode_vn]
+
+        for mods in PP_CACHED_MODS:
+            mods = mods.filter_invalid_combos(mode_vn)
+
+            if mods not in mode_cache:
+                self._pp_task(mode_vn, mods)
+
+    def _pp_task(self, mode_vn: int, mods: Mods) -> asyncio.Task:
+        """Get the task computing the pp table for `mods`, starting it if needed."""
+        key = (self.md5, mode_vn, mods)
+
+        if not (task := _pp_inflight.get(key)):
+            task = glob.loop.create_task(self._calc_pp(mode_vn, mods))
+            task.add_done_callback(functools.partial(_pp_task_done, key))
+            _pp_inflight[key] = task
+
+        return task
+
+    async def _calc_pp(
+        self, mode_vn: int, mods: Mods
+    ) -> Optional[list[tuple[float, float]]]:
+        """Compute & cache the (pp, sr) values for `mods`."""
+        md5 = self.md5
+
+        osu_file_path = BEATMAPS_PATH / f'{self.id}.osu'
+        if not await ensure_local_osu_file(osu_file_path, self.id, md5):
+            return
+
+        if mode_vn == 3:  # mania
+            batch = [misc.performance.PPParams(mods=int(mods), score=int(score))
+                     for score in glob.config.pp_cached_scores]
+        else:
+            batch = [misc.performance.PPParams(mods=int(mods), acc=acc)
+                     for acc in glob.config.pp_cached_accs]
+
+        values = await misc.performance.calculate_many(
+            md5, osu_file_path, mode_vn, batch
+        )
+
+        if self.md5 != md5:
+            # the map was updated while we were calculating;
+            # the values are still correct for the old version.
+            return values
+
+        mode_cache = self.pp_cache[mode_vn]
+        mode_cache[mods] = values
+
+        # keep the table bounded, evicting the least recently
+        # used combination (preferring the uncommon ones). the
+        # table's keys are filtered for the mode, so the common
+        # combinations must be filtered the same way to compare.
+        if len(mode_cache) > glob.config.pp_cache_max_mods:
+            common = {m.filter_invalid_combos(mode_vn) for m in PP_CACHED_MODS}
+
+            while len(mode_cache) > glob.config.pp_cache_max_mods:
+                evicted = next((m for m in mode_cache if m not in common),
+                               next(iter(mode_cache)))
+                del mode_cache[evicted]
+
+        return values
+
     # TODO: implement some locking for the map fetch methods
 
     """ High level API """
@@ -340,75 +607,78 @@ class Beatmap:
     @classmethod
     async def from_md5(cls, md5: str, set_id: int = -1) -> Optional['Beatmap']:
         """Fetch a map from the cache, database, or osuapi by md5."""
-        bmap = await cls._from_md5_cache(md5)
-
-        if not bmap:
-            if set_id <= 0:
-                # valid set id not provided, try getting it
-                # from the db, or the osu!api. we want to get
-                # the whole set cached all at once to minimize
-                # osu!api requests overall in the long run.
-                res = glob.db.maps.find_one({'md5': md5})
-
-                if res:
-                    # found set id in db
-                    set_id = res['set_id']
-                else:
-                    # failed to get from db, try osu!api
-                    api_data = await osuapiv1_getbeatmaps(h=md5)
-
-                    if not api_data:
-                        return
-
-                    set_id = int(api_data[0]['beatmapset_id'])
-
-            # we have a valid set id, fetch the whole set.
-            if not await BeatmapSet.from_bsid(set_id):
-                return
-
-            # fetching the set will put all maps in cache
-            bmap = await cls._from_md5_cache(md5, check_updates=False)
-
-            if not bmap:
-                return
+        if bmap := await cls._from_md5_cache(md5):
+            return bmap
 
-        return bmap
+        # concurrent misses for the same map share one fetch.
+        return await _single_flight(('md5', md5), cls._fetch_md5,
+                                    md5, set_id)
 
     @classmethod
-    async def from_bid(cls, bid: int) -> Optional['Beatmap']:
-        """Fetch a map from the cache, database, or osuapi by id."""
-        bmap = await cls._from_bid_cache(bid)
-
-        if not bmap:
-            # try getting the set id either from the db,
-            # or the osu!api. we want to get the whole set
-            # cached all at once to minimize osu!api
-            # requests overall in the long run
-            res = glob.db.maps.find_one({'id': bid})
+    async def _fetch_md5(cls, md5: str, set_id: int) -> Optional['Beatmap']:
+        """Fetch a map's set from the database or osuapi by md5."""
+        if set_id <= 0:
+            # valid set id not provided, try getting it
+            # from the db, or the osu!api. we want to get
+            # the whole set cached all at once to minimize
+            # osu!api requests overall in the long run.
+            res = await glob.db.maps.find_one({'md5': md5})
 
             if res:
                 # found set id in db
                 set_id = res['set_id']
             else:
                 # failed to get from db, try osu!api
-                api_data = await osuapiv1_getbeatmaps(b=bid)
+                api_data = await osuapiv1_getbeatmaps(h=md5)
 
                 if not api_data:
                     return
 
                 set_id = int(api_data[0]['beatmapset_id'])
 
-            # we have a valid set id, fetch the whole set.
-            if not await BeatmapSet.from_bsid(set_id):
-                return
+        # we have a valid set id, fetch the whole set.
+        if not await BeatmapSet.from_bsid(set_id):
+            return
+
+        # fetching the set will put all maps in cache
+        return await cls._from_md5_cache(md5, check_updates=False)
 
-            # fetching the set will put all maps in cache
-            bmap = await cls._from_bid_cache(bid, check_updates=False)
+    @classmethod
+    async def from_bid(cls, bid: int) -> Optional['Beatmap']:
+        """Fetch a map from the cache, database, or osuapi by id."""
+        if bmap := await cls._from_bid_cache(bid):
+            return bmap
+
+        # concurrent misses for the same map share one fetch.
+        return await _single_flight(('bid', bid), cls._fetch_bid, bid)
+
+    @classmethod
+    async def _fetch_bid(cls, bid: int) -> Optional['Beatmap']:
+        """Fetch a map's set from the database or osuapi by id."""
+        # try getting the set id either from the db,
+        # or the osu!api. we want to get the whole set
+        # cached all at once to minimize osu!api
+        # requests overall in the long run
+        res = await glob.db.maps.find_one({'id': bid})
+
+        if res:
+            # found set id in db
+            set_id = res['set_id']
+        else:
+            # failed to get from db, try osu!api
+            api_data = await osuapiv1_getbeatmaps(b=bid)
 
-            if not bmap:
+            if not api_data:
                 return
 
-        return bmap
+            set_id = int(api_data[0]['beatmapset_id'])
+
+        # we have a valid set id, fetch the whole set.
+        if not await BeatmapSet.from_bsid(set_id):
+            return
+
+        # fetching the set will put all maps in cache
+        return await cls._from_bid_cache(bid, check_updates=False)
 
     """ Lower level API """
     # These functions are meant for internal use under
@@ -477,11 +747,12 @@ class Beatmap:
         check_updates: bool = True
     ) -> Optional['Beatmap']:
         """Fetch a map from the cache by md5."""
-        if md5 in glob.cache['beatmap']:
-            bmap: Beatmap = glob.cache['beatmap'][md5]
+        if bmap := glob.cache['beatmap'].get(md5):
+            # the set's cache entry decides when the map's evicted.
+            glob.cache['beatmapset'].touch(bmap.set.bmap_id)
 
             if check_updates and bmap.set._cache_expired():
-                await bmap.set._update_if_available()
+                bmap.set._queue_refresh()
 
             return bmap
 
@@ -491,11 +762,12 @@ class Beatmap:
         check_updates: bool = True
     ) -> Optional['Beatmap']:
         """Fetch a map from the cache by id."""
-        if bid in glob.cache['beatmap']:
-            bmap: Beatmap = glob.cache['beatmap'][bid]
+        if bmap := glob.cache['beatmap'].get(bid):
+            # the set's cache entry decides when the map's evicted.
+            glob.cache['beatmapset'].touch(bmap.set.bmap_id)
 
             if check_updates and bmap.set._cache_expired():
-                await bmap.set._update_if_available()
+                bmap.set._queue_refresh()
 
             return bmap
 
@@ -523,8 +795,11 @@ class BeatmapSet:
       await BeatmapSet._from_bsid_cache(bsid: int) -> Optional[BeatmapSet]
       await BeatmapSet._from_bsid_sql(bsid: int) -> Optional[BeatmapSet]
       await BeatmapSet._from_bsid_osuapi(bsid: int) -> Optional[BeatmapSet]
+      await BeatmapSet._fetch_bsid(bsid: int) -> tuple[Optional[BeatmapSet], bool]
 
+      BeatmapSet._cache() -> None
       BeatmapSet._cache_expired() -> bool
+      BeatmapSet._queue_refresh() -> None
       await BeatmapSet._update_if_available() -> None
       await BeatmapSet._save_to_sql() -> None
     """
@@ -607,9 +882,14 @@ class BeatmapSet:
     async def _update_if_available(self) -> None:
         """Fetch newest data from the osu!api, check for differences
            and propogate any update into our cache & database."""
+        # concurrent requests for an expired set share one update.
+        await _single_flight(('update', self.bmap_id), self._update)
+
+    async def _update(self) -> None:
         if api_data := await osuapiv1_getbeatmaps(s=self.bmap_id):
             current_maps = {bmap.id: bmap for bmap in self.maps}
             self.last_osuapi_check = datetime.now()
+            maps_changed = False
 
             for api_bmap in api_data:
                 bmap_id = int(api_bmap['beatmap_id'])
@@ -625,10 +905,29 @@ class BeatmapSet:
                     bmap.passes = 0
                     bmap.plays = 0
                     bmap.pp_cache = {0: {}, 1: {}, 2: {}, 3: {}}
+
+                    bmap.set = self
+                    self.maps.append(bmap)
                 elif api_bmap['file_md5'] != current_maps[bmap_id].md5:
                     # this is a newer version than we have
                     bmap = current_maps[bmap_id]
+
+                    # the old version's md5 no longer refers to this map.
+                    glob.cache['beatmap'].pop(bmap.md5)
+
                     bmap._parse_from_osuapi_resp(api_bmap)
+                    bmap.pp_cache = {0: {}, 1: {}, 2: {}, 3: {}}
+                    maps_changed = True
+
+            # re-cache the set now, so the new md5s can be found
+            # (& the old ones no longer are) while we're saving.
+            self._cache()
+
+            if maps_changed:
+                # the maps' statuses may have changed, so which
+                # scores count for pp; any cached top scores are stale.
+                for p in glob.players:
+                    p.top_scores.clear()
 
             await self._save_to_sql()
         else:
@@ -639,6 +938,10 @@ class BeatmapSet:
                 f'_update_if_available no data, setid: {self.bmap_id}'
             )
 
+            # don't check again until the set next expires, rather
+            # than re-requesting (& logging) it on every access.
+            self.last_osuapi_check = datetime.now()
+
     async def _save_to_sql(self) -> None:
         """Save the object's attributes into the database."""
         await db_cursor.execute(
@@ -649,7 +952,7 @@ class BeatmapSet:
         )
 
         # Convert to mongodb
-        glob.db.mapsets.update_one(
+        await glob.db.mapsets.update_one(
             {'_id': self.bmap_id},
             {'$set': {
                 'last_osuapi_check': self.last_osuapi_check
@@ -684,13 +987,11 @@ class BeatmapSet:
     @staticmethod
     async def _from_bsid_cache(bsid: int) -> Optional['BeatmapSet']:
         """Fetch a mapset from the cache by set id."""
-        if bsid in glob.cache['beatmapset']:
-            bmap_set: BeatmapSet = glob.cache['beatmapset'][bsid]
-
+        if bmap_set := glob.cache['beatmapset'].get(bsid):
             if bmap_set._cache_expired():
-                await bmap_set._update_if_available()
+                bmap_set._queue_refresh()
 
-            return glob.cache['beatmapset'][bsid]
+            return bmap_set
 
     @classmethod
     async def _from_bsid_osuapi(cls, bsid: int) -> Optional['BeatmapSet']:
@@ -739,6 +1040,19 @@ class BeatmapSet:
             await self._save_to_sql()
             return self
 
+    @classmethod
+    async def _fetch_bsid(cls, bsid: int
+                          ) -> tuple[Optional['BeatmapSet'], bool]:
+        """Fetch a mapset from the database or osuapi by set id,
+           returning it & whether an osu!api request was made."""
+        if bmap_set := await cls._from_bsid_sql(bsid):
+            return bmap_set, False
+
+        if not glob.has_internet:
+            return None, False
+
+        return await cls._from_bsid_osuapi(bsid), True
+
     @classmethod
     async def from_bsid(cls, bsid: int) -> Optional['BeatmapSet']:
         """Cache all maps in a set from the osuapi, optionally
@@ -747,33 +1061,45 @@ class BeatmapSet:
         did_api_request = False
 
         if not bmap_set:
-            bmap_set = await cls._from_bsid_sql(bsid)
+            # concurrent misses for the same set share one fetch.
+            bmap_set, did_api_request = await _single_flight(
+                ('bsid', bsid), cls._fetch_bsid, bsid
+            )
 
             if not bmap_set:
-                if not glob.has_internet:
-                    return
+                return
 
-                bmap_set = await cls._from_bsid_osuapi(bsid)
+        # cache the individual maps & set for future requests
+        bmap_set._cache()
 
-                if not bmap_set:
-                    return
+        # TODO: this can be done less often for certain types of maps,
+        # such as ones that're ranked on bancho and won't be updated,
+        # and perhaps ones that haven't been updated in a long time.
+        if not did_api_request and bmap_set._cache_expired():
+            bmap_set._queue_refresh()
+
+        return bmap_set
 
-                did_api_request = True
+    def _cache(self) -> None:
+        """Cache the set & it's individual maps for future requests."""
+        glob.cache['beatmapset'][self.bmap_id] = self
 
-        # cache the individual maps & set for future requests
-        beatmapset_cache = glob.cache['beatmapset']
         beatmap_cache = glob.cache['beatmap']
 
-        beatmapset_cache[bsid] = bmap_set
-
-        for bmap in bmap_set.maps:
+        for bmap in self.maps:
             beatmap_cache[bmap.md5] = bmap
             beatmap_cache[bmap.id] = bmap
 
-        # TODO: this can be done less often for certain types of maps,
-        # such as ones that're ranked on bancho and won't be updated,
-        # and perhaps ones that haven't been updated in a long time.
-        if not did_api_request and bmap_set._cache_expired():
-            await bmap_set._update_if_available()
+            # the map exists (& is up to date) now, even if
+            # we previously found otherwise.
+            glob.cache['unsubmitted'].pop(bmap.md5)
+            glob.cache['needs_update'].pop(bmap.md5)
 
-        return bmap_set
+    def _queue_refresh(self) -> None:
+        """Queue the set to be refreshed from the osu!api in the
+           background; until then, it'll be served as it is."""
+        if len(_stale_sets) >= glob.config.beatmapset_refresh_queue_size:
+            # we're behind; it'll be queued on a later access.
+            return
+
+        _stale_sets.setdefault(self.bmap_id, self)
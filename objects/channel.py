@@ -115,9 +115,17 @@ class Channel:
     def send_selective(self, msg: str, sender: 'Player',
                        recipients: set['Player']) -> None:
         """Enqueue `sender`'s `msg` to `recipients`."""
+        # serialize once, all recipients share the buffer.
+        data = packets.sendMessage(
+            sender=sender.name,
+            msg=msg,
+            recipient=self.name,
+            sender_id=sender.id
+        )
+
         for p in recipients:
             if p in self:
-                p.send(msg, sender=sender, chan=self)
+                p.enqueue(data)
 
     def append(self, p: 'Player') -> None:
         """Add `p` to the channel's players."""
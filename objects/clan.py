@@ -39,7 +39,7 @@ class Clan:
         """Add a given player to the clan's members."""
         self.members.add(p.id)
 
-        glob.db.users.update_one(
+        await glob.db.users.update_one(
             {'id': p.id},
             {'$set': {'clan_id': self.id, 'clan_priv': 1}}
         )
@@ -51,14 +51,14 @@ class Clan:
         """Remove a given player from the clan's members."""
         self.members.remove(p.id)
 
-        glob.db.users.update_one(
+        await glob.db.users.update_one(
             {'id': p.id},
             {'$set': {'clan_id': 0, 'clan_priv': 0}}
         )
 
         if not self.members:
             # no members left, disband clan.
-            glob.db.clans.remove({'_id': self.id})
+            await glob.db.clans.delete_one({'_id': self.id})
 
         elif p.id == self.owner:
             # owner leaving and members left,
@@ -69,7 +69,7 @@ class Clan:
             glob.clans.update_one({'id': self.id}, {
                                   '$set': {'owner': self.owner}})
 
-            glob.db.users.update_one({'id': self.owner}, {
+            await glob.db.users.update_one({'id': self.owner}, {
                                      '$set': {'clan_priv': 3}})
 
         p.clan = None
@@ -81,7 +81,7 @@ class Clan:
         # clan 'mods', so fetching rank here may
         # be a good idea to sort people into
         # different roles.
-        for row in glob.db.users.find({'clan_id': self.id}):
+        async for row in glob.db.users.find({'clan_id': self.id}):
             self.members.add(row['id'])
 
     def __repr__(self) -> str:
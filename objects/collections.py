@@ -2,8 +2,10 @@
 # in a lot of these classes; needs refactor.
 
 import asyncio
-from typing import Any, Iterator, Optional, Sequence, Union, overload
+from typing import (Any, Iterable, Iterator, Optional, Sequence, Union,
+                    overload)
 
+import misc.passwords
 import misc.utils
 from cmyui.logging import Ansi, log
 from constants.privileges import Privileges
@@ -15,6 +17,7 @@ from objects.channel import Channel
 from objects.clan import Clan, ClanPrivileges
 from objects.match import MapPool, Match
 from objects.player import Player
+from objects.rankings import initialize_rankings
 
 __all__ = (
     'Channels',
@@ -88,7 +91,6 @@ class Channels(list[Channel]):
     async def prepare(cls) -> 'Channels':
         """Fetch data from sql & return; preparing to run the server."""
         log('Fetching channels from sql.', Ansi.LCYAN)
-        channels = glob.db.channels.find({})
         return cls([
             Channel(
                 name=row['name'],
@@ -96,7 +98,7 @@ class Channels(list[Channel]):
                 read_priv=Privileges(row['read_priv']),
                 write_priv=Privileges(row['write_priv']),
                 auto_join=row['auto_join'] == 1
-            ) for row in channels
+            ) async for row in glob.db.channels.find({})
         ])
 
 
@@ -146,12 +148,31 @@ class Matches(list[Match]):
 
 class Players(list[Player]):
     """The currently active players on the server."""
-    __slots__ = ('_lock',)
+    __slots__ = ('_lock', '_members', '_tokens', '_ids', '_safe_names',
+                 '_staff', '_unrestricted')
 
     def __init__(self, *args, **kwargs):
         self._lock = asyncio.Lock()
+
+        # lookups happen on every bancho request, so rather than
+        # scanning the list we keep indexes of the online players,
+        # updated as they're added, removed & their privs change.
+        # more than one player may share an id & name (tourney
+        # clients), so each key maps to all of it's players, in
+        # the order they were added; lookups return the first.
+        self._members: set[Player] = set()
+        self._tokens: dict[str, list[Player]] = {}
+        self._ids: dict[int, list[Player]] = {}
+        self._safe_names: dict[str, list[Player]] = {}
+
+        self._staff: set[Player] = set()
+        self._unrestricted: set[Player] = set()
+
         super().__init__(*args, **kwargs)
 
+        for p in self:
+            self._index(p)
+
     def __iter__(self) -> Iterator[Player]:
         return super().__iter__()
 
@@ -169,22 +190,68 @@ class Players(list[Player]):
     @property
     def ids(self) -> set[int]:
         """Return a set of the current ids in the list."""
-        return {p.id for p in self}
+        return set(self._ids)
 
     @property
     def staff(self) -> set[Player]:
         """Return a set of the current staff online."""
-        return {p for p in self if p.priv & Privileges.Staff}
+        return self._staff
 
     @property
     def restricted(self) -> set[Player]:
         """Return a set of the current restricted players."""
-        return {p for p in self if not p.priv & Privileges.Normal}
+        return set(self) - self._unrestricted
 
     @property
     def unrestricted(self) -> set[Player]:
         """Return a set of the current unrestricted players."""
-        return {p for p in self if p.priv & Privileges.Normal}
+        return self._unrestricted
+
+    def _index(self, p: Player) -> None:
+        """Add `p` to the lookup indexes."""
+        self._members.add(p)
+
+        # NOTE: lookups return the first player added for a key,
+        # matching the behaviour of the previous linear search.
+        self._tokens.setdefault(p.token, []).append(p)
+        self._ids.setdefault(p.id, []).append(p)
+        self._safe_names.setdefault(p.safe_name, []).append(p)
+
+        self.update_privs(p)
+
+    def _unindex(self, p: Player) -> None:
+        """Remove `p` from the lookup indexes."""
+        self._members.discard(p)
+
+        for index, key in (
+            (self._tokens, p.token),
+            (self._ids, p.id),
+            (self._safe_names, p.safe_name)
+        ):
+            if players := index.get(key):
+                # any other players with this key remain indexed.
+                players[:] = [other for other in players if other is not p]
+
+                if not players:
+                    del index[key]
+
+        self._staff.discard(p)
+        self._unrestricted.discard(p)
+
+    def update_privs(self, p: Player) -> None:
+        """Update the staff & unrestricted sets for `p`'s privileges."""
+        if p not in self._members:
+            return # not online
+
+        if p.priv & Privileges.Staff:
+            self._staff.add(p)
+        else:
+            self._staff.discard(p)
+
+        if p.priv & Privileges.Normal:
+            self._unrestricted.add(p)
+        else:
+            self._unrestricted.discard(p)
 
     def enqueue(self, data: bytes, immune: Sequence[Player] = []) -> None:
         """Enqueue `data` to all players, except for those in `immune`."""
@@ -209,14 +276,20 @@ class Players(list[Player]):
         """Get a player by token, id, or name from cache."""
         attr, val = self._parse_attr(kwargs)
 
-        for p in self:
-            if getattr(p, attr) == val:
-                return p
+        if attr == 'token':
+            players = self._tokens.get(val)
+        elif attr == 'id':
+            players = self._ids.get(val)
+        else: # safe_name
+            players = self._safe_names.get(val)
+
+        if players:
+            return players[0]
 
     async def get_sql(self, **kwargs: object) -> Optional[Player]:
         """Get a player by token, id, or name from sql."""
         attr, val = self._parse_attr(kwargs)
-        res = glob.db.users.find_one({f'{attr}': val})
+        res = await glob.db.users.find_one({f'{attr}': val})
 
         if not res:
             return
@@ -250,26 +323,33 @@ class Players(list[Player]):
                 # no player found in sql either.
                 return
 
-        if glob.cache['bcrypt'][p.pw_bcrypt] == pw_md5.encode():
+        if await misc.passwords.verify_password(pw_md5.encode(), p.pw_bcrypt):
             return p
 
     def append(self, p: Player) -> None:
         """Append `p` to the list."""
-        if p in self:
+        if p in self._members:
             if glob.app.debug:
                 log(f'{p} double-added to global player list?')
             return
 
         super().append(p)
+        self._index(p)
+
+    def extend(self, players: Iterable[Player]) -> None:
+        """Extend the list with `players`."""
+        for p in players:
+            self.append(p)
 
     def remove(self, p: Player) -> None:
         """Remove `p` from the list."""
-        if p not in self:
+        if p not in self._members:
             if glob.app.debug:
                 log(f'{p} removed from player list when not online?')
             return
 
         super().remove(p)
+        self._unindex(p)
 
 
 class MapPools(list[MapPool]):
@@ -330,7 +410,7 @@ class MapPools(list[MapPool]):
                 name=row['name'],
                 created_at=row['created_at'],
                 created_by=await glob.players.get_ensure(id=row['created_by'])
-            ) for row in glob.db.tourney_pools.find()
+            ) async for row in glob.db.tourney_pools.find()
         ])
 
         for pool in obj:
@@ -397,7 +477,7 @@ class Clans(list[Clan]):
     async def prepare(cls) -> 'Clans':
         """Fetch data from sql & return; preparing to run the server."""
         log('Fetching clans from sql.', Ansi.LCYAN)
-        obj = cls([Clan(**row) for row in glob.db.clans.find()])
+        obj = cls([Clan(**row) async for row in glob.db.clans.find()])
 
         for clan in obj:
             await clan.members_from_sql()
@@ -426,7 +506,7 @@ async def initialize_ram_caches() -> None:
     # global achievements (sorted by vn gamemodes)
     glob.achievements = []
 
-    for row in glob.db.achievements.find():
+    async for row in glob.db.achievements.find():
         # NOTE: achievement conditions are stored as stringified python
         # expressions in the database to allow for extensive customizability.
         condition = eval(f'lambda score, mode_vn: {row.pop("cond")}')
@@ -436,5 +516,8 @@ async def initialize_ram_caches() -> None:
 
     glob.api_keys = {
         row['api_key']: row['_id']
-        for row in glob.db.users.find({'api_key': {'$exists': True}})
+        async for row in glob.db.users.find({'api_key': {'$exists': True}})
     }
+
+    # global pp rankings, sorted for rank lookups by bisection
+    await initialize_rankings()
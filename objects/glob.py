@@ -2,7 +2,7 @@ from typing import TYPE_CHECKING
 
 # this is used externally, i.e. `glob.config.attr`
 import config  # type: ignore
-from pymongo.mongo_client import MongoClient
+from misc.cache import BoundedCache
 
 # this file contains no actualy definitions
 if TYPE_CHECKING:
@@ -15,36 +15,43 @@ if TYPE_CHECKING:
     from aiohttp.client import ClientSession
     from cmyui.version import Version
     from cmyui.web import Server
+    from constants.gamemodes import GameMode
     from datadog import ThreadStats
     #from objects.score import Score
+    from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
     from packets import BasePacket, ClientPackets
-    from pymongo.database import Database
 
     from objects.achievement import Achievement
     from objects.beatmap import Beatmap, BeatmapSet
     from objects.collections import Channels, Clans, MapPools, Matches, Players
+    from objects.leaderboard import Leaderboard
     from objects.player import Player
+    from objects.rankings import GlobalRanking
 
     IPAddress = Union[ipaddress.IPv4Address, ipaddress.IPv6Address]
 
     class Cache(TypedDict):
-        bcrypt: dict[bytes, bytes]
+        bcrypt: BoundedCache[bytes, bytes]
 
-        ip: dict[str, 'IPAddress']
+        ip: BoundedCache[str, 'IPAddress']
 
-        beatmap: dict[str, 'Beatmap']
-        beatmapset: dict[str, 'BeatmapSet']
+        beatmap: BoundedCache[Union[str, int], 'Beatmap']
+        beatmapset: BoundedCache[int, 'BeatmapSet']
 
-        unsubmitted: set[str]
-        needs_update: set[str]
+        unsubmitted: BoundedCache[str, bool]
+        needs_update: BoundedCache[str, bool]
+
+        leaderboard: BoundedCache[tuple[str, 'GameMode'], 'Leaderboard']
+
+        replay: BoundedCache[str, bytes]
 
 __all__ = (
     # current server state
     'players', 'channels', 'matches',
-    'pools', 'clans', 'achievements',
+    'pools', 'clans', 'achievements', 'rankings',
     'version', 'bot', 'api_keys',
     'bancho_packets', 'mongo', 'db',
-    'has_internet', 'shutting_down', 'boot_time',
+    'has_internet', 'shutting_down', 'shutdown_event', 'boot_time',
     'http_session', 'datadog', 'cache', 'loop',
     'housekeeping_tasks', 'ongoing_conns',
 )
@@ -60,6 +67,9 @@ clans: 'Clans'
 pools: 'MapPools'
 achievements: list['Achievement']
 
+# global pp rankings, kept sorted in ram
+rankings: dict['GameMode', 'GlobalRanking']
+
 bot: 'Player'
 version: 'Version'
 
@@ -71,11 +81,12 @@ api_keys: dict[str, int]  # {api_key: player_id}
 # list of registered packets
 bancho_packets: dict[str, 'dict[ClientPackets, Type[BasePacket]]']
 
-mongo: 'MongoClient'
-db: 'Database'
+mongo: 'AsyncIOMotorClient'
+db: 'AsyncIOMotorDatabase'
 
 has_internet: bool
 shutting_down: bool
+shutdown_event: 'asyncio.Event'
 boot_time: 'datetime'
 http_session: 'Optional[ClientSession]'
 
@@ -85,28 +96,40 @@ datadog: 'Optional[ThreadStats]'
 # the idea here is simple - keep a copy of things either from sql or
 # that take a lot of time to produce in memory for quick and easy access.
 # ideally, the cache is hidden away in methods so that developers do not
-# need to think about it.
+# need to think about it. each cache is bounded by it's limits in the
+# config (`caches`); the least recently used entries are evicted first.
 cache: 'Cache' = {
     # algorithms like brypt these are intentionally designed to be
     # slow; we'll cache the results to speed up subsequent logins.
-    'bcrypt': {},  # {bcrypt: md5, ...}
+    'bcrypt': BoundedCache('bcrypt', **config.caches['bcrypt']),  # {bcrypt: md5, ...}
 
     # converting from a stringified ip address to a python ip
     # object is pretty expensive, so we'll cache known ones.
-    'ip': {},  # {ip_str: IPAddress, ...}
+    'ip': BoundedCache('ip', **config.caches['ip']),  # {ip_str: IPAddress, ...}
 
-    # we'll cache results for osu! client update requests since they
-    # are relatively frequently and won't change very frequently.
-    # cache all beatmap data calculated while online. this way,
-    # the most requested maps will inevitably always end up cached.
-    'beatmap': {},  # {md5: map, id: map, ...}
-    'beatmapset': {},  # {bsid: map_set}
+    # cache beatmap data calculated while online. this way, the
+    # most requested maps will inevitably always end up cached,
+    # while rarely requested ones are eventually evicted. maps
+    # are evicted (by md5 & id) along with their set.
+    'beatmap': BoundedCache('beatmap', **config.caches['beatmap']),  # {md5: map, id: map, ...}
+    'beatmapset': BoundedCache('beatmapset', **config.caches['beatmapset']),  # {bsid: map_set}
 
     # cache all beatmaps which are unsubmitted or need an update,
     # since their osu!api requests will fail and thus we'll do the
-    # request multiple times which is quite slow & not great.
-    'unsubmitted': set(),  # {md5, ...}
-    'needs_update': set()  # {md5, ...}
+    # request multiple times which is quite slow & not great. these
+    # expire, since maps can be submitted (or updated) later on.
+    'unsubmitted': BoundedCache('unsubmitted', **config.caches['unsubmitted']),  # {md5: True, ...}
+    'needs_update': BoundedCache('needs_update', **config.caches['needs_update']),  # {md5: True, ...}
+
+    # leaderboards are our most frequently served web request, so
+    # we keep the most recently viewed ones sorted in memory.
+    'leaderboard': BoundedCache(
+        'leaderboard', max_items=config.leaderboard_cache_size
+    ),  # {(md5, mode): leaderboard, ...}
+
+    # replays are rebuilt into the stream the osu! client
+    # expects when fetched; keep the recently fetched ones.
+    'replay': BoundedCache('replay', **config.caches['replay'])  # {score_id: replay, ...}
 }
 
 loop: 'asyncio.AbstractEventLoop'
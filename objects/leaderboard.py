@@ -0,0 +1,284 @@
+from bisect import bisect_left
+from typing import TYPE_CHECKING, Any, Callable, Optional
+
+from constants.gamemodes import GameMode
+from constants.privileges import Privileges
+
+from objects import glob
+
+if TYPE_CHECKING:
+    from objects.score import Score
+
+__all__ = ('LeaderboardEntry', 'Leaderboard')
+
+# the fields of a score we need to serve it on a leaderboard.
+SCORE_PROJECTION = {
+    '_id': 1, 'userid': 1, 'score': 1, 'pp': 1, 'max_combo': 1,
+    'n50': 1, 'n100': 1, 'n300': 1, 'nmiss': 1, 'nkatu': 1,
+    'ngeki': 1, 'perfect': 1, 'mods': 1, 'play_time': 1
+}
+
+USER_PROJECTION = {'_id': 1, 'name': 1, 'country': 1,
+                   'priv': 1, 'clan_id': 1}
+
+
+class LeaderboardEntry:
+    """A single player's best score on a leaderboard."""
+    __slots__ = ('key', 'userid', 'mods', 'country',
+                 'restricted', 'listing')
+
+    def __init__(self, key: tuple[float, int], userid: int,
+                 mods: int, country: str, restricted: bool,
+                 listing: dict[str, Any]) -> None:
+        self.key = key  # (-metric, play time); ascending = best first
+        self.userid = userid
+        self.mods = mods
+        self.country = country
+        self.restricted = restricted
+
+        # the fields used to format the osu! score listing.
+        self.listing = listing
+
+    @classmethod
+    def from_row(cls, row: dict[str, Any], user: dict[str, Any],
+                 metric: str) -> 'LeaderboardEntry':
+        """Create an entry from a score's & it's user's db rows."""
+        if user.get('clan_id') and (clan := glob.clans.get(id=user['clan_id'])):
+            name = f'[{clan.tag}] {user["name"]}'
+        else:
+            name = user['name']
+
+        play_time = int(row['play_time'].timestamp())
+
+        return cls(
+            key=(-row[metric], play_time),
+            userid=row['userid'],
+            mods=int(row['mods']),
+            country=user['country'],
+            restricted=not user['priv'] & Privileges.Normal,
+            listing={
+                'id': row['_id'],
+                'name': name,
+                'score': int(row[metric]),
+                'max_combo': row['max_combo'],
+                'n50': row['n50'],
+                'n100': row['n100'],
+                'n300': row['n300'],
+                'nmiss': row['nmiss'],
+                'nkatu': row['nkatu'],
+                'ngeki': row['ngeki'],
+                'perfect': int(row['perfect']),
+                'mods': int(row['mods']),
+                'userid': row['userid'],
+                'time': play_time,
+                'has_replay': '1'
+            }
+        )
+
+    @classmethod
+    def from_score(cls, score: 'Score', metric: str) -> 'LeaderboardEntry':
+        """Create an entry from a newly submitted score."""
+        p = score.player
+        value = getattr(score, metric)
+        play_time = int(score.play_time.timestamp())
+
+        return cls(
+            key=(-value, play_time),
+            userid=p.id,
+            mods=int(score.mods),
+            country=p.geoloc['country']['acronym'],
+            restricted=p.restricted,
+            listing={
+                'id': score.id,
+                'name': p.full_name,
+                'score': int(value),
+                'max_combo': score.max_combo,
+                'n50': score.n50,
+                'n100': score.n100,
+                'n300': score.n300,
+                'nmiss': score.nmiss,
+                'nkatu': score.nkatu,
+                'ngeki': score.ngeki,
+                'perfect': int(score.perfect),
+                'mods': int(score.mods),
+                'userid': p.id,
+                'time': play_time,
+                'has_replay': '1'
+            }
+        )
+
+
+class Leaderboard:
+    """A sorted, in-memory leaderboard of the best scores on a map & mode.
+
+    Leaderboards are loaded from the database on first access and
+    kept up to date as new best scores are submitted; the least
+    recently used leaderboards are evicted once we've cached
+    `glob.config.leaderboard_cache_size` of them.
+
+    Only unrestricted players' scores are ranked, but every player's
+    best score is kept so restricted players can still see their own.
+
+    The only methods you should need are:
+      await Leaderboard.from_map(map_md5: str, mode: GameMode) -> Leaderboard
+      Leaderboard.from_cache(map_md5: str, mode: GameMode) -> Optional[Leaderboard]
+
+      Leaderboard.top(n: int, filter: Callable, userid: int) -> list[LeaderboardEntry]
+      Leaderboard.personal_best(userid: int) -> Optional[LeaderboardEntry]
+      Leaderboard.rank_of(value: float) -> int
+      Leaderboard.add(entry: LeaderboardEntry) -> None
+    """
+    __slots__ = ('map_md5', 'mode', 'metric', 'entries',
+                 '_keys', '_bests', 'rating_sum', 'rating_count')
+
+    def __init__(self, map_md5: str, mode: GameMode) -> None:
+        self.map_md5 = map_md5
+        self.mode = mode
+        self.metric = 'pp' if mode >= GameMode.rx_std else 'score'
+
+        # ranked (unrestricted) entries, sorted best first;
+        # `_keys` mirrors `entries` so we can bisect it.
+        self.entries: list[LeaderboardEntry] = []
+        self._keys: list[tuple[float, int]] = []
+
+        # every player's best score; {userid: entry}
+        self._bests: dict[int, LeaderboardEntry] = {}
+
+        # the map's rating is served along with it's leaderboard.
+        self.rating_sum = 0
+        self.rating_count = 0
+
+    def __repr__(self) -> str:
+        return f'<{self.map_md5} ({self.mode!r})>'
+
+    @property
+    def rating(self) -> Optional[float]:
+        """The map's average rating, if it's been rated."""
+        if self.rating_count:
+            return self.rating_sum / self.rating_count
+
+    def top(self, n: int = 50,
+            filter: Optional[Callable[[LeaderboardEntry], bool]] = None,
+            userid: Optional[int] = None) -> list[LeaderboardEntry]:
+        """Return the `n` best entries, optionally matching `filter`.
+
+        If `userid` is given, that player's best entry is included
+        in it's place even if they're restricted, so they can see it.
+        """
+        entries = self.entries
+
+        if (
+            userid is not None and
+            (own := self._bests.get(userid)) and
+            own.restricted
+        ):
+            idx = bisect_left(self._keys, own.key)
+            entries = entries[:idx] + [own] + entries[idx:]
+
+        if filter is None:
+            return entries[:n]
+
+        top = []
+
+        for entry in entries:
+            if filter(entry):
+                top.append(entry)
+
+                if len(top) == n:
+                    break
+
+        return top
+
+    def personal_best(self, userid: int) -> Optional[LeaderboardEntry]:
+        """Return a player's best entry on the leaderboard, if any."""
+        return self._bests.get(userid)
+
+    def rank_of(self, value: float) -> int:
+        """Return the rank a score of `value` would place on the leaderboard."""
+        # entries are sorted by (-value, ...), so the insertion
+        # point of (-value,) is the number of better scores.
+        return bisect_left(self._keys, (-value,)) + 1
+
+    def add(self, entry: LeaderboardEntry) -> None:
+        """Add a player's new best score, replacing their previous."""
+        self.remove(entry.userid)
+        self._bests[entry.userid] = entry
+
+        if not entry.restricted:
+            idx = bisect_left(self._keys, entry.key)
+            self._keys.insert(idx, entry.key)
+            self.entries.insert(idx, entry)
+
+    def remove(self, userid: int) -> None:
+        """Remove a player's best score from the leaderboard."""
+        if not (entry := self._bests.pop(userid, None)):
+            return
+
+        if not entry.restricted:
+            idx = bisect_left(self._keys, entry.key)
+
+            # there may be multiple entries with the same key.
+            while self.entries[idx] is not entry:
+                idx += 1
+
+            del self._keys[idx]
+            del self.entries[idx]
+
+    """ Caching """
+
+    @staticmethod
+    def from_cache(map_md5: str, mode: GameMode) -> Optional['Leaderboard']:
+        """Fetch a leaderboard from the cache, if it's loaded."""
+        return glob.cache['leaderboard'].get((map_md5, mode))
+
+    @classmethod
+    async def from_map(cls, map_md5: str, mode: GameMode) -> 'Leaderboard':
+        """Fetch a leaderboard from the cache, or load it from the database."""
+        if lb := cls.from_cache(map_md5, mode):
+            return lb
+
+        lb = cls(map_md5, mode)
+        await lb._load()
+
+        # another request may have loaded the
+        # leaderboard while we were waiting on ours.
+        if existing := cls.from_cache(map_md5, mode):
+            return existing
+
+        glob.cache['leaderboard'][(map_md5, mode)] = lb
+        return lb
+
+    async def _load(self) -> None:
+        """Load the leaderboard's scores & rating from the database."""
+        rows = await glob.db[self.mode.scores_table].find({
+            'map_md5': self.map_md5,
+            'mode': self.mode.as_vanilla,
+            'status': 2
+        }, SCORE_PROJECTION).to_list(None)
+
+        users = {
+            user['_id']: user async for user in glob.db.users.find(
+                {'_id': {'$in': list({row['userid'] for row in rows})}},
+                USER_PROJECTION
+            )
+        }
+
+        entries = sorted([
+            LeaderboardEntry.from_row(row, users[row['userid']], self.metric)
+            for row in rows if row['userid'] in users
+        ], key=lambda e: e.key)
+
+        for entry in entries:
+            self._bests[entry.userid] = entry
+
+            if not entry.restricted:
+                self.entries.append(entry)
+                self._keys.append(entry.key)
+
+        async for res in glob.db.ratings.aggregate([
+            {'$match': {'map_md5': self.map_md5}},
+            {'$group': {'_id': None, 'sum': {'$sum': '$rating'},
+                        'count': {'$sum': 1}}}
+        ]):
+            self.rating_sum = res['sum']
+            self.rating_count = res['count']
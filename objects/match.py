@@ -124,7 +124,7 @@ class MapPool:
 
     async def maps_from_sql(self) -> None:
         """Retrieve all maps from sql to populate `self.maps`."""
-        async for row in glob.db.tourney_pools.find_one({'pool_id': self.id}):
+        async for row in glob.db.tourney_pools.find({'pool_id': self.id}):
             map_id = row['map_id']
             bmap = await Beatmap.from_bid(map_id)
 
@@ -136,7 +136,7 @@ class MapPool:
                 # TODO: perhaps discord webhook?
                 log(f'Removing {map_id} from pool {self.name} (not found).', Ansi.LRED)
                 
-                glob.db.tourney_pools.delete_one({'map_id': map_id})
+                await glob.db.tourney_pools.delete_one({'map_id': map_id})
                 continue
 
             key: tuple[Mods, int] = (Mods(row['mods']), row['slot'])
@@ -1,11 +1,13 @@
 import time
 import uuid
+from bisect import insort
 from dataclasses import dataclass
 from datetime import date, datetime
 from enum import IntEnum, unique
 from functools import cached_property
 from typing import TYPE_CHECKING, Any, Optional, TypedDict, Union
 
+import misc.write_queue
 import packets
 from cmyui.discord import Webhook
 from cmyui.logging import Ansi, log
@@ -13,6 +15,8 @@ from constants.gamemodes import GameMode
 from constants.mods import Mods
 from constants.privileges import ClientPrivileges, Privileges
 from misc.utils import Geolocation
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
 
 from objects import glob
 from objects.channel import Channel
@@ -28,11 +32,16 @@ if TYPE_CHECKING:
 __all__ = (
     'ModeData',
     'Status',
-    'Player'
+    'Player',
+    'flush_latest_activity'
 )
 
 BASE_DOMAIN = glob.config.domain
 
+# players' latest activity times which have yet to be
+# written to the database; {userid: latest_activity}
+_pending_activity: dict[int, datetime] = {}
+
 
 @unique
 class PresenceFilter(IntEnum):
@@ -61,8 +70,22 @@ class Action(IntEnum):
     OsuDirect = 13
 
 
+class _VersionedData:
+    """Bump `_version` whenever one of the instance's fields changes."""
+    # NOTE: this allows things derived from the data (such as
+    # serialized packets) to know when they need to be rebuilt,
+    # without every mutation site needing to remember to do so.
+    _version = 0
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if getattr(self, name, None) != value:
+            object.__setattr__(self, '_version', self._version + 1)
+
+        object.__setattr__(self, name, value)
+
+
 @dataclass
-class ModeData:
+class ModeData(_VersionedData):
     """A player's stats in a single gamemode."""
     tscore: int
     rscore: int
@@ -76,8 +99,65 @@ class ModeData:
     grades: dict[Grade, int]  # XH, X, SH, S, A
 
 
+# the weights of a player's top 100 scores in their total pp & acc.
+PP_WEIGHTS = tuple(0.95 ** i for i in range(100))
+ACC_WEIGHTS = tuple(int((0.95 ** i) * 100) for i in range(100))
+
+
+class TopScores:
+    """A player's top 100 scores by pp in a single gamemode,
+       along with their total amount of ranked scores."""
+    __slots__ = ('scores', 'total')
+
+    def __init__(self, scores: list[tuple[float, float, str]],
+                 total: int) -> None:
+        self.scores = scores  # [(-pp, acc, map_md5), ...]; best first
+        self.total = total
+
+    def add(self, pp: float, acc: float, map_md5: str,
+            replaces_best: bool) -> bool:
+        """Add a new best score, returning whether we're still complete."""
+        if replaces_best:
+            # remove our previous best on the
+            # map, if it was in our top scores.
+            for idx, (_, _, md5) in enumerate(self.scores):
+                if md5 == map_md5:
+                    del self.scores[idx]
+                    break
+        else:
+            self.total += 1
+
+        insort(self.scores, (-pp, acc, map_md5))
+
+        if len(self.scores) > 100:
+            self.scores.pop()
+
+        # if the previous best was removed & the new score fell out
+        # of the top 100, we no longer know what our 100th score is.
+        return len(self.scores) == min(self.total, 100)
+
+    @property
+    def weighted_acc(self) -> float:
+        """The player's total accuracy, weighted by their top scores."""
+        tot = div = 0
+
+        for (_, acc, _), weight in zip(self.scores, ACC_WEIGHTS):
+            tot += acc * weight
+            div += weight
+
+        return tot / div if div else 0.0
+
+    @property
+    def weighted_pp(self) -> int:
+        """The player's total pp, weighted by their top scores."""
+        weighted_pp = sum([-neg_pp * weight for (neg_pp, _, _), weight
+                           in zip(self.scores, PP_WEIGHTS)])
+        bonus_pp = 416.6667 * (1 - 0.9994 ** self.total)
+        return round(weighted_pp + bonus_pp)
+
+
 @dataclass
-class Status:
+class Status(_VersionedData):
     """The current status of a player."""
     action: Action = Action.Idle
     info_text: str = ''
@@ -143,11 +223,13 @@ class Player:
     tourney_client: `bool`
         Whether this is a management/spectator tourney client.
 
-    _queue: `bytearray`
-        Bytes enqueued to the player which will be transmitted
+    _queue: `list[bytes]`
+        Chunks of bytes enqueued to the player which will be transmitted
         at the tail end of their next connection to the server.
         XXX: cls.enqueue() will add data to this queue, and
              cls.dequeue() will return the data, and remove it.
+        NOTE: chunks are stored by reference, so a packet broadcast
+              to many players is shared between all of their queues.
     """
     __slots__ = (
         'token', 'id', 'name', 'safe_name', 'pw_bcrypt',
@@ -162,8 +244,8 @@ class Player:
         'current_menu', 'previous_menus',
 
         'bot_client', 'tourney_client',
-        'api_key', '_queue',
-        '__dict__'
+        'api_key', '_queue', '_stats_packet', '_stats_packet_key',
+        'top_scores', 'latest_activity', '__dict__'
     )
 
     def __init__(self, _id: str, name: str,
@@ -227,6 +309,7 @@ class Player:
         login_time = extras.get('login_time', 0.0)
         self.login_time = login_time
         self.last_recv_time = login_time
+        self.latest_activity: Optional[datetime] = None
 
         # XXX: below is mostly gulag-specific & internal stuff
 
@@ -235,6 +318,10 @@ class Player:
             mode: None for mode in GameMode
         }
 
+        # store the top 100 scores for each gamemode, loaded
+        # on the first ranked score submitted while online.
+        self.top_scores: dict[GameMode, TopScores] = {}
+
         # store the last beatmap /np'ed by the user.
         self.last_np: LastNp = {  # type: ignore
             'bmap': None,
@@ -258,7 +345,10 @@ class Player:
         self.api_key = extras.get('api_key', None)
 
         # packet queue
-        self._queue = bytearray()
+        self._queue: list[bytes] = []
+
+        self._stats_packet: Optional[bytes] = None
+        self._stats_packet_key: tuple[int, int, int] = (0, 0, 0)
 
     def __repr__(self) -> str:
         return f'<{self.name} ({self.id})>'
@@ -340,6 +430,36 @@ class Player:
         """The player's stats in their currently selected mode."""
         return self.stats[self.status.mode]
 
+    @cached_property
+    def presence_packet(self) -> bytes:
+        """The player's serialized userPresence packet."""
+        # NOTE: this is wiped in `invalidate_packets()`; it's shared
+        # by every login & presence request, so it must be wiped
+        # whenever the player's privs, mode or rank change.
+        return packets.userPresence(self)
+
+    @property
+    def stats_packet(self) -> bytes:
+        """The player's serialized userStats packet."""
+        # clients request stats for their entire friends list, so
+        # we only rebuild the packet if the status or stats in the
+        # current mode have actually changed since it was last built.
+        gm_stats = self.gm_stats
+        key = (self.status._version, id(gm_stats), gm_stats._version)
+
+        if self._stats_packet is None or key != self._stats_packet_key:
+            self._stats_packet = packets.userStats(self)
+            self._stats_packet_key = key
+
+        return self._stats_packet
+
+    def invalidate_packets(self) -> None:
+        """Wipe the player's cached presence & stats packets."""
+        if 'presence_packet' in self.__dict__:
+            del self.presence_packet  # wipe cached_property
+
+        self._stats_packet = None
+
     @cached_property
     def recent_score(self) -> Optional[Score]:
         """The player's most recently submitted score."""
@@ -369,9 +489,6 @@ class Player:
 
     def logout(self) -> None:
         """Log `self` out of the server."""
-        # invalidate the user's token.
-        self.token = ''
-
         if 'online' in self.__dict__:
             del self.online  # wipe cached_property
 
@@ -391,6 +508,18 @@ class Player:
         # enqueue logout to all users.
         glob.players.remove(self)
 
+        # write our latest activity with the next batch of
+        # queued writes, rather than waiting on the flusher.
+        if latest_activity := _pending_activity.pop(self.id, None):
+            misc.write_queue.enqueue('users', UpdateOne(
+                {'_id': self.id},
+                {'$set': {'latest_activity': latest_activity}}
+            ))
+
+        # invalidate the user's token; this is done after
+        # removal so the player list can drop it's index.
+        self.token = ''
+
         if not self.restricted:
             if glob.datadog:
                 glob.datadog.decrement('gulag.online_players')
@@ -403,7 +532,7 @@ class Player:
         """Update `self`'s privileges to `new`."""
         self.priv = new
 
-        glob.db.users.update_one(
+        await glob.db.users.update_one(
             {'_id': self.id},
             {'$set': {'priv': self.priv}}
         )
@@ -411,11 +540,14 @@ class Player:
         if 'bancho_priv' in self.__dict__:
             del self.bancho_priv  # wipe cached_property
 
+        glob.players.update_privs(self)
+        self.invalidate_packets()
+
     async def add_privs(self, bits: Privileges) -> None:
         """Update `self`'s privileges, adding `bits`."""
         self.priv |= bits
 
-        glob.db.users.update_one(
+        await glob.db.users.update_one(
             {'_id': self.id},
             {'$set': {'priv': self.priv}}
         )
@@ -423,11 +555,14 @@ class Player:
         if 'bancho_priv' in self.__dict__:
             del self.bancho_priv
 
+        glob.players.update_privs(self)
+        self.invalidate_packets()
+
     async def remove_privs(self, bits: Privileges) -> None:
         """Update `self`'s privileges, removing `bits`."""
         self.priv &= ~bits
 
-        glob.db.users.update_one(
+        await glob.db.users.update_one(
             {'_id': self.id},
             {'$set': {'priv': self.priv}}
         )
@@ -435,12 +570,15 @@ class Player:
         if 'bancho_priv' in self.__dict__:
             del self.bancho_priv
 
+        glob.players.update_privs(self)
+        self.invalidate_packets()
+
     async def restrict(self, admin: 'Player', reason: str) -> None:
         """Restrict `self` for `reason`, and log to sql."""
         await self.remove_privs(Privileges.Normal)
 
         log_msg = f'{admin} restricted for "{reason}".'
-        glob.db.logs.insert_one(
+        await glob.db.logs.insert_one(
             {
                 'from': admin.id,
                 'to': self.id,
@@ -452,6 +590,13 @@ class Player:
         if 'restricted' in self.__dict__:
             del self.restricted  # wipe cached_property
 
+        # our scores' visibility on leaderboards has changed;
+        # drop the loaded ones, they'll be reloaded on request.
+        glob.cache['leaderboard'].clear()
+
+        for ranking in glob.rankings.values():
+            ranking.remove(self.id)
+
         log_msg = f'{admin} restricted {self} for: {reason}.'
 
         log(log_msg, Ansi.LRED)
@@ -471,7 +616,7 @@ class Player:
         await self.add_privs(Privileges.Normal)
 
         log_msg = f'{admin} unrestricted for "{reason}".'
-        glob.db.logs.insert_one(
+        await glob.db.logs.insert_one(
             {
                 'from': admin.id,
                 'to': self.id,
@@ -483,6 +628,18 @@ class Player:
         if 'restricted' in self.__dict__:
             del self.restricted
 
+        # our scores' visibility on leaderboards has changed;
+        # drop the loaded ones, they'll be reloaded on request.
+        glob.cache['leaderboard'].clear()
+
+        # make sure any queued stat updates
+        # are written before we read them back.
+        await misc.write_queue.flush()
+
+        async for row in glob.db.stats.find({'id': self.id},
+                                            {'mode': 1, 'pp': 1}):
+            glob.rankings[GameMode(row['mode'])].update(self.id, row['pp'])
+
         log_msg = f'{admin} unrestricted {self} for: {reason}.'
 
         log(log_msg, Ansi.LRED)
@@ -503,7 +660,7 @@ class Player:
         self.silence_end = int(time.time() + duration)
 
         log_msg = f'{admin} silenced ({duration}s) for "{reason}".'
-        glob.db.logs.insert_one(
+        await glob.db.logs.insert_one(
             {
                 'from': admin.id,
                 'to': self.id,
@@ -529,13 +686,13 @@ class Player:
         self.silence_end = int(time.time())
 
         # convert to mongodb
-        glob.db.users.update_one(
+        await glob.db.users.update_one(
             {'_id': self.id},
             {'$set': {'silence_end': self.silence_end}}
         )
 
         log_msg = f'{admin} unsilenced.'
-        glob.db.logs.insert_one(
+        await glob.db.logs.insert_one(
             {
                 'from': admin.id,
                 'to': self.id,
@@ -821,7 +978,7 @@ class Player:
         self.friends.add(p.id)
 
         # convert to mongodb
-        await self.db.user.update_one(
+        await glob.db.users.update_one(
             {'_id': self.id},
             {'$addToSet': {'friends': p.id}}
         )
@@ -835,7 +992,7 @@ class Player:
             return
 
         self.friends.remove(p.id)
-        glob.db.user.update_one(
+        await glob.db.users.update_one(
             {'_id': self.id},
             {'$pull': {'friends': p.id}}
         )
@@ -849,7 +1006,7 @@ class Player:
             return
 
         self.blocks.add(p.id)
-        glob.db.user.update_one(
+        await glob.db.users.update_one(
             {'_id': self.id},
             {'$addToSet': {'blocks': p.id}}
         )
@@ -863,7 +1020,7 @@ class Player:
             return
 
         self.blocks.remove(p.id)
-        glob.db.user.update_one(
+        await glob.db.users.update_one(
             {'_id': self.id},
             {'$pull': {'blocks': p.id}}
         )
@@ -872,15 +1029,39 @@ class Player:
 
     async def unlock_achievement(self, a: 'Achievement') -> None:
         """Unlock `ach` for `self`, storing in both cache & sql."""
-        glob.db.user.update_one(
+        misc.write_queue.enqueue('users', UpdateOne(
             {'_id': self.id},
             {'$addToSet': {'achievements': a.id}}
-        )
+        ))
 
         self.achievements.add(a.id)
 
         log(f'{self} unlocked {a}.')
 
+    async def fetch_top_scores(self, mode: GameMode) -> TopScores:
+        """Fetch & cache `self`'s top 100 ranked scores in `mode` from sql."""
+        res = await glob.db[mode.scores_table].aggregate([
+            {'$match': {'userid': self.id, 'mode': mode.as_vanilla,
+                        'status': 2}},
+            {'$lookup': {'from': 'maps', 'localField': 'map_md5',
+                         'foreignField': 'md5', 'as': 'map'}},
+            {'$match': {'map.status': {'$in': [2, 3]}}},  # ranked, approved
+            {'$facet': {
+                'top': [{'$sort': {'pp': -1}}, {'$limit': 100}],
+                'total': [{'$count': 'count'}]
+            }}
+        ]).to_list(1)
+
+        top = res[0]['top']
+        total = res[0]['total'][0]['count'] if res[0]['total'] else 0
+
+        self.top_scores[mode] = TopScores(
+            scores=[(-row['pp'], row['acc'], row['map_md5']) for row in top],
+            total=total
+        )
+
+        return self.top_scores[mode]
+
     def send_menu_clear(self) -> None:
         """Clear the user's osu! chat with the bot
            to make room for a new menu to be sent."""
@@ -908,22 +1089,24 @@ class Player:
         self.send_bot('\n'.join(msg))
 
     def update_latest_activity(self) -> None:
-        """Update the player's latest activity in the database."""
-        task = glob.db.user.update_one(
-            {'_id': self.id},
-            {'$set': {'latest_activity': datetime.utcnow()}}
-        )
-
-        glob.loop.create_task(task)
+        """Update the player's latest activity; this is
+           written to the database in bulk, periodically."""
+        self.latest_activity = datetime.utcnow()
+        _pending_activity[self.id] = self.latest_activity
 
     def enqueue(self, data: bytes) -> None:
         """Add data to be sent to the client."""
-        self._queue += data
+        if type(data) is bytearray:
+            # we store a reference to the data; ensure
+            # it can't be changed by the caller later on.
+            data = bytes(data)
+
+        self._queue.append(data)
 
     def dequeue(self) -> Optional[bytes]:
         """Get data from the queue to send to the client."""
         if self._queue:
-            data = bytes(self._queue)
+            data = b''.join(self._queue)
             self._queue.clear()
             return data
 
@@ -951,3 +1134,24 @@ class Player:
                 sender_id=bot.id
             )
         )
+
+
+async def flush_latest_activity() -> None:
+    """Write all pending latest activity times to the database."""
+    global _pending_activity
+
+    if not _pending_activity:
+        return
+
+    pending = _pending_activity
+    _pending_activity = {}
+
+    try:
+        await glob.db.users.bulk_write([
+            UpdateOne({'_id': user_id},
+                      {'$set': {'latest_activity': latest_activity}})
+            for user_id, latest_activity in pending.items()
+        ], ordered=False)
+    except PyMongoError as exc:
+        log(f'Failed to write latest activity for '
+            f'{len(pending)} players: {exc}', Ansi.LRED)
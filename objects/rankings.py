@@ -0,0 +1,112 @@
+from bisect import bisect_left
+from typing import Optional
+
+import misc.write_queue
+from cmyui.logging import Ansi, log
+from constants.gamemodes import GameMode
+from constants.privileges import Privileges
+
+from objects import glob
+
+__all__ = ('GlobalRanking', 'initialize_rankings')
+
+
+class GlobalRanking:
+    """The global pp ranking of unrestricted players in a single gamemode.
+
+    Players are kept sorted by (-pp, id) so ranks can be found by
+    bisection, rather than counting the players above in the database.
+    """
+    __slots__ = ('mode', '_keys', '_pp')
+
+    def __init__(self, mode: GameMode) -> None:
+        self.mode = mode
+
+        self._keys: list[tuple[int, int]] = []  # [(-pp, id), ...]
+        self._pp: dict[int, int] = {}  # {id: pp, ...}
+
+    def __repr__(self) -> str:
+        return f'<{self.mode!r} ranking ({len(self)} players)>'
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._pp
+
+    def update(self, user_id: int, pp: int) -> None:
+        """Set a player's pp, moving them to their new position."""
+        self.remove(user_id)
+
+        if pp > 0:  # players without pp are unranked
+            key = (-pp, user_id)
+            self._keys.insert(bisect_left(self._keys, key), key)
+            self._pp[user_id] = pp
+
+    def remove(self, user_id: int) -> None:
+        """Remove a player from the ranking."""
+        if (pp := self._pp.pop(user_id, None)) is not None:
+            del self._keys[bisect_left(self._keys, (-pp, user_id))]
+
+    def rank_of(self, user_id: int) -> int:
+        """Return a player's global rank, or 0 if they're unranked."""
+        if (pp := self._pp.get(user_id)) is None:
+            return 0
+
+        # the insertion point of (-pp,) is the number of
+        # players with strictly more pp than the player.
+        return bisect_left(self._keys, (-pp,)) + 1
+
+    def page(self, offset: int, limit: int) -> list[tuple[int, int]]:
+        """Return (id, pp) for `limit` players, starting from `offset`."""
+        return [(user_id, -neg_pp) for neg_pp, user_id
+                in self._keys[offset:offset + limit]]
+
+    @classmethod
+    async def prepare(cls, mode: GameMode,
+                      unrestricted: Optional[set[int]] = None
+                      ) -> 'GlobalRanking':
+        """Fetch a mode's ranked players from the database."""
+        ranking = cls(mode)
+
+        if unrestricted is None:
+            unrestricted = await fetch_unrestricted_ids()
+
+        # stat updates from recent scores may still be queued.
+        await misc.write_queue.flush()
+
+        keys = []
+
+        async for row in glob.db.stats.find(
+            {'mode': mode.value, 'pp': {'$gt': 0}},
+            {'id': 1, 'pp': 1}
+        ):
+            if row['id'] in unrestricted:
+                keys.append((-row['pp'], row['id']))
+                ranking._pp[row['id']] = row['pp']
+
+        keys.sort()
+        ranking._keys = keys
+
+        return ranking
+
+
+async def fetch_unrestricted_ids() -> set[int]:
+    """Fetch the ids of all unrestricted players from the database."""
+    return {
+        row['_id'] async for row in glob.db.users.find(
+            {'priv': {'$bitsAllSet': int(Privileges.Normal)}},
+            {'_id': 1}
+        )
+    }
+
+
+async def initialize_rankings() -> None:
+    """Load the global rankings for all gamemodes."""
+    log('Fetching global rankings from sql.', Ansi.LCYAN)
+    unrestricted = await fetch_unrestricted_ids()
+
+    glob.rankings = {
+        mode: await GlobalRanking.prepare(mode, unrestricted)
+        for mode in GameMode
+    }
@@ -1,22 +1,20 @@
 import functools
-import math
 from base64 import b64decode
 from datetime import datetime
 from enum import IntEnum, unique
 from pathlib import Path
 from typing import TYPE_CHECKING, Optional
 
+import misc.performance
 from cmyui.logging import Ansi, log
-from cmyui.osu.oppai_ng import OppaiWrapper
 from constants.clientflags import ClientFlags
 from constants.gamemodes import GameMode
 from constants.mods import Mods
-from peace_performance_python.objects import Beatmap as PeaceMap
-from peace_performance_python.objects import Calculator as PeaceCalculator
 from py3rijndael import Pkcs7Padding, RijndaelCbc
 
 from objects import glob
 from objects.beatmap import Beatmap, RankedStatus, ensure_local_osu_file
+from objects.leaderboard import Leaderboard
 
 if TYPE_CHECKING:
     from objects.player import Player
@@ -177,7 +175,7 @@ class Score:
         """Create a score object from sql using it's scoreid."""
         # XXX: perhaps in the future this should take a gamemode rather
         # than just the sql table? just faster on the current setup :P
-        res = glob.db[scores_table].find_one({
+        res = await glob.db[scores_table].find_one({
             '_id': score_id
         })
 
@@ -280,7 +278,10 @@ class Score:
         if s.bmap:
             osu_file_path = BEATMAPS_PATH / f'{s.bmap.id}.osu'
             if await ensure_local_osu_file(osu_file_path, s.bmap.id, s.bmap.md5):
-                s.pp, s.sr = s.calc_diff(osu_file_path)
+                s.pp, s.sr = await s.calc_diff(osu_file_path)
+
+                # have the map's common pp values ready for /np & !with.
+                s.bmap.warm_pp_cache(s.mode.as_vanilla)
 
                 if s.passed:
                     await s.calc_status()
@@ -301,102 +302,26 @@ class Score:
     """Methods to calculate internal data for a score."""
 
     async def calc_lb_placement(self) -> int:
-        scores_table = self.mode.scores_table
-
-        if self.mode >= GameMode.rx_std:
-            scoring_metric = 'pp'
-            score = self.pp
-        else:
-            scoring_metric = 'score'
-            score = self.score
+        """Calculate the score's placement on the map's leaderboard."""
+        lb = await Leaderboard.from_map(self.bmap.md5, self.mode)
+        return lb.rank_of(getattr(self, lb.metric))
 
-        res = glob.db[scores_table].count_documents({
-            'map_md5': self.bmap.md5,
-            'mode': self.mode.as_vanilla,
-            '$lookup': {
-                'from': 'users',
-                'localField': 'userid',
-                'foreignField': 'id',
-                'as': 'user'
-            },
-            '$match': {
-                'status': 2,
-                '$expr': {
-                    '$and': [
-                        {'$eq': ['$user.priv', 1]},
-                        {'$gt': [scoring_metric, score]}
-                    ]
-                }
-            }
-        })
-
-        return res + 1 if res else 1
-
-    def calc_diff(self, osu_file_path: Path) -> tuple[float, float]:
+    async def calc_diff(self, osu_file_path: Path) -> tuple[float, float]:
         """Calculate PP and star rating for our score."""
         mode_vn = self.mode.as_vanilla
 
-        if mode_vn == 0:  # std
-            with OppaiWrapper('oppai-ng/liboppai.so') as ezpp:
-                if self.mods:
-                    ezpp.set_mods(int(self.mods))
-
-                if mode_vn:
-                    ezpp.set_mode(mode_vn)
-
-                ezpp.set_combo(self.max_combo)
-                ezpp.set_nmiss(self.nmiss)  # clobbers acc
-                ezpp.set_accuracy_percent(self.acc)
-
-                ezpp.calculate(osu_file_path)
-
-                pp = ezpp.get_pp()
-                if pp not in (math.inf, math.nan):
-                    return (pp, ezpp.get_sr())
-                else:
-                    # TODO: report to logserver
-                    return (0.0, 0.0)
-        elif mode_vn in (1, 2):  # taiko, catch
-            beatmap = PeaceMap(osu_file_path)
-            peace = PeaceCalculator()
-
-            if self.mods != Mods.NOMOD:
-                peace.set_mods(int(self.mods))
-
-            if mode_vn:
-                peace.set_mode(mode_vn)
-
-            peace.set_combo(self.max_combo)
-            peace.set_miss(self.nmiss)
-            peace.set_acc(self.acc)
-
-            calculated = peace.calculate(beatmap)
-
-            if calculated.pp not in (math.inf, math.nan):
-                return (round(calculated.pp, 5), calculated.stars)
-            else:
-                # TODO: report to logserver
-                return (0.0, 0.0)
-        elif mode_vn == 3:  # mania
-            beatmap = PeaceMap(osu_file_path)
-            peace = PeaceCalculator()
-
-            if self.mods != Mods.NOMOD:
-                peace.set_mods(int(self.mods))
-
-            if mode_vn:
-                peace.set_mode(mode_vn)
-
-            peace.set_score(self.score)
-            calculated = peace.calculate(beatmap)
-
-            if calculated.pp not in (math.inf, math.nan):
-                return (round(calculated.pp, 5), calculated.stars)
-            else:
-                # TODO: report to logserver
-                return (0.0, 0.0)
+        if mode_vn == 3:  # mania
+            params = misc.performance.PPParams(
+                mods=int(self.mods), score=self.score
+            )
         else:
-            raise ValueError(f'Invalid vanilla mode {mode_vn}')
+            params = misc.performance.PPParams(
+                mods=int(self.mods), acc=self.acc,
+                nmiss=self.nmiss, combo=self.max_combo
+            )
+
+        return await misc.performance.calculate(self.bmap.md5, osu_file_path,
+                                                mode_vn, params)
 
     async def calc_status(self) -> None:
         """Calculate the submission status of a submitted score."""
@@ -404,7 +329,7 @@ class Score:
 
         # find any other `status = 2` scores we have
         # on the map. If there are any, store
-        res = glob.db[scores_table].find_one({
+        res = await glob.db[scores_table].find_one({
             'map_md5': self.bmap.md5,
             'mode': self.mode.as_vanilla,
             'userid': self.player.id,
@@ -4,11 +4,13 @@ from abc import ABC
 from enum import IntEnum
 from enum import unique
 from functools import cache
+from functools import cached_property
 from functools import lru_cache
 from typing import Any
 from typing import Callable
 from typing import Iterator
 from typing import NamedTuple
+from typing import Optional
 from typing import Sequence
 from typing import Type
 from typing import TYPE_CHECKING
@@ -189,14 +191,52 @@ class ReplayFrame(NamedTuple):
     time: int
 
 
-class ReplayFrameBundle(NamedTuple):
-    replay_frames: list[ReplayFrame]
-    score_frame: ScoreFrame
-    action: ReplayAction
-    extra: int
-    sequence: int
+class ReplayFrameBundle:
+    """\
+    A bundle of replay frames sent by a player to their spectators.
+
+    The bundle is parsed lazily, only once one of it's fields is
+    accessed (i.e. for anticheat or recording); simply forwarding
+    the bundle to spectators only requires the raw data.
+    """
+    __slots__ = ('raw_data', '__dict__')
+
+    def __init__(self, raw_data: memoryview) -> None:
+        self.raw_data = raw_data  # readonly
+
+    @cached_property
+    def _parsed(self) -> tuple[list[ReplayFrame], ScoreFrame,
+                               ReplayAction, int, int]:
+        reader = BanchoPacketReader(self.raw_data, {})
+
+        extra = reader.read_i32()  # bancho proto >= 18
+        framecount = reader.read_u16()
+        frames = reader.read_replayframes(framecount)
+        action = ReplayAction(reader.read_u8())
+        scoreframe = reader.read_scoreframe()
+        sequence = reader.read_u16()
+
+        return frames, scoreframe, action, extra, sequence
 
-    raw_data: memoryview  # readonly
+    @property
+    def replay_frames(self) -> list[ReplayFrame]:
+        return self._parsed[0]
+
+    @property
+    def score_frame(self) -> ScoreFrame:
+        return self._parsed[1]
+
+    @property
+    def action(self) -> ReplayAction:
+        return self._parsed[2]
+
+    @property
+    def extra(self) -> int:
+        return self._parsed[3]
+
+    @property
+    def sequence(self) -> int:
+        return self._parsed[4]
 
 
 class BasePacket(ABC):
@@ -206,6 +246,24 @@ class BasePacket(ABC):
 
 PacketMap = dict[ClientPackets, Type[BasePacket]]
 
+# precompiled structs for the reader's primitive types.
+_I8 = struct.Struct('<b')
+_I16 = struct.Struct('<h')
+_U16 = struct.Struct('<H')
+_I32 = struct.Struct('<i')
+_U32 = struct.Struct('<I')
+_I64 = struct.Struct('<q')
+_U64 = struct.Struct('<Q')
+_F16 = struct.Struct('<e')
+_F32 = struct.Struct('<f')
+_F64 = struct.Struct('<d')
+
+# header of every packet; (id, padding, body length)
+PACKET_HEADER = struct.Struct('<HxI')
+
+# button_state, taiko_byte, x, y, time
+REPLAYFRAME_FMT = struct.Struct('<BBffi')
+
 
 class BanchoPacketReader:
     """\
@@ -217,10 +275,13 @@ class BanchoPacketReader:
     body_view: `memoryview`
         A readonly view of the request's body.
 
+    offset: `int`
+        The position of the reader's cursor within `body_view`.
+
     packet_map: `dict[ClientPackets, BasePacket]`
         The map of registered packets the reader may handle.
 
-    current_length: int
+    current_len: int
         The length in bytes of the packet currently being handled.
 
     Intended Usage:
@@ -229,10 +290,17 @@ class BanchoPacketReader:
     ...     # simply call it's handle method.
     ...     await packet.handle()
     """
-    __slots__ = ('body_view', 'packet_map', 'current_len')
+    __slots__ = ('body_view', 'offset', 'packet_end',
+                 'packet_map', 'current_len')
 
     def __init__(self, body_view: memoryview, packet_map: PacketMap) -> None:
+        # rather than re-slicing the view for each read (allocating
+        # a new memoryview per field), we keep a single view and move
+        # an integer cursor through it, unpacking data in place.
         self.body_view = body_view  # readonly
+        self.offset = 0
+        self.packet_end = 0 # end of the last read packet
+
         self.packet_map = packet_map
 
         self.current_len = 0  # last read packet's length
@@ -241,19 +309,24 @@ class BanchoPacketReader:
         return self
 
     def __next__(self) -> BasePacket:
+        # skip any of the last packet which was not
+        # read by it's handler; we know it's length.
+        self.offset = self.packet_end
+        body_len = len(self.body_view)
+
         # do not break until we've read the
         # header of a packet we can handle.
-        while self.body_view:  # len(self.view) < 7?
+        while self.offset + 7 <= body_len:
             p_type, p_len = self._read_header()
+            self.packet_end = self.offset + p_len
 
-            if p_type not in self.packet_map:
-                # packet type not handled, remove
-                # from internal buffer and continue.
-                if p_len != 0:
-                    self.body_view = self.body_view[p_len:]
-            else:
+            if p_type in self.packet_map:
                 # we can handle this one.
                 break
+
+            # packet type not handled, skip
+            # over it's data and continue.
+            self.offset = self.packet_end
         else:
             raise StopIteration
 
@@ -263,77 +336,81 @@ class BanchoPacketReader:
 
         return packet_cls(self)
 
-    def _read_header(self) -> tuple[ClientPackets, int]:
+    def _read_header(self) -> tuple[int, int]:
         """Read the header of an osu! packet (id & length)."""
         # read type & length from the body
-        data = struct.unpack('<HxI', self.body_view[:7])
-        self.body_view = self.body_view[7:]
-        return ClientPackets(data[0]), data[1]
+        p_type, p_len = PACKET_HEADER.unpack_from(self.body_view, self.offset)
+        self.offset += 7
+
+        # NOTE: we don't convert the type to a ClientPackets member,
+        # since unknown packet ids would raise; it's an IntEnum,
+        # so membership checks & lookups work with a plain int.
+        return p_type, p_len
 
     """ public API (exposed for packet handler's __init__ methods) """
 
     def read_raw(self) -> memoryview:
-        val = self.body_view[:self.current_len]
-        self.body_view = self.body_view[self.current_len:]
+        val = self.body_view[self.offset:self.offset + self.current_len]
+        self.offset += self.current_len
         return val
 
     # integral types
 
     def read_i8(self) -> int:
-        val = self.body_view[0]
-        self.body_view = self.body_view[1:]
-        return val - 256 if val > 127 else val
+        val, = _I8.unpack_from(self.body_view, self.offset)
+        self.offset += 1
+        return val
 
     def read_u8(self) -> int:
-        val = self.body_view[0]
-        self.body_view = self.body_view[1:]
+        val = self.body_view[self.offset]
+        self.offset += 1
         return val
 
     def read_i16(self) -> int:
-        val = int.from_bytes(self.body_view[:2], 'little', signed=True)
-        self.body_view = self.body_view[2:]
+        val, = _I16.unpack_from(self.body_view, self.offset)
+        self.offset += 2
         return val
 
     def read_u16(self) -> int:
-        val = int.from_bytes(self.body_view[:2], 'little', signed=False)
-        self.body_view = self.body_view[2:]
+        val, = _U16.unpack_from(self.body_view, self.offset)
+        self.offset += 2
         return val
 
     def read_i32(self) -> int:
-        val = int.from_bytes(self.body_view[:4], 'little', signed=True)
-        self.body_view = self.body_view[4:]
+        val, = _I32.unpack_from(self.body_view, self.offset)
+        self.offset += 4
         return val
 
     def read_u32(self) -> int:
-        val = int.from_bytes(self.body_view[:4], 'little', signed=False)
-        self.body_view = self.body_view[4:]
+        val, = _U32.unpack_from(self.body_view, self.offset)
+        self.offset += 4
         return val
 
     def read_i64(self) -> int:
-        val = int.from_bytes(self.body_view[:8], 'little', signed=True)
-        self.body_view = self.body_view[8:]
+        val, = _I64.unpack_from(self.body_view, self.offset)
+        self.offset += 8
         return val
 
     def read_u64(self) -> int:
-        val = int.from_bytes(self.body_view[:8], 'little', signed=False)
-        self.body_view = self.body_view[8:]
+        val, = _U64.unpack_from(self.body_view, self.offset)
+        self.offset += 8
         return val
 
     # floating-point types
 
     def read_f16(self) -> float:
-        val, = struct.unpack_from('<e', self.body_view[:2])
-        self.body_view = self.body_view[2:]
+        val, = _F16.unpack_from(self.body_view, self.offset)
+        self.offset += 2
         return val
 
     def read_f32(self) -> float:
-        val, = struct.unpack_from('<f', self.body_view[:4])
-        self.body_view = self.body_view[4:]
+        val, = _F32.unpack_from(self.body_view, self.offset)
+        self.offset += 4
         return val
 
     def read_f64(self) -> float:
-        val, = struct.unpack_from('<d', self.body_view[:8])
-        self.body_view = self.body_view[8:]
+        val, = _F64.unpack_from(self.body_view, self.offset)
+        self.offset += 8
         return val
 
     # complex types
@@ -341,24 +418,22 @@ class BanchoPacketReader:
     # XXX: some osu! packets use i16 for
     # array length, while others use i32
     def read_i32_list_i16l(self) -> tuple[int]:
-        length = int.from_bytes(self.body_view[:2], 'little')
-        self.body_view = self.body_view[2:]
+        length = self.read_u16()
 
-        val = struct.unpack(f'<{"I" * length}', self.body_view[:length * 4])
-        self.body_view = self.body_view[length * 4:]
+        val = struct.unpack_from(f'<{length}I', self.body_view, self.offset)
+        self.offset += length * 4
         return val
 
     def read_i32_list_i32l(self) -> tuple[int]:
-        length = int.from_bytes(self.body_view[:4], 'little')
-        self.body_view = self.body_view[4:]
+        length = self.read_u32()
 
-        val = struct.unpack(f'<{"I" * length}', self.body_view[:length * 4])
-        self.body_view = self.body_view[length * 4:]
+        val = struct.unpack_from(f'<{length}I', self.body_view, self.offset)
+        self.offset += length * 4
         return val
 
     def read_string(self) -> str:
-        exists = self.body_view[0] == 0x0b
-        self.body_view = self.body_view[1:]
+        exists = self.body_view[self.offset] == 0x0b
+        self.offset += 1
 
         if not exists:
             # no string sent.
@@ -368,8 +443,8 @@ class BanchoPacketReader:
         length = shift = 0
 
         while True:
-            b = self.body_view[0]
-            self.body_view = self.body_view[1:]
+            b = self.body_view[self.offset]
+            self.offset += 1
 
             length |= (b & 0b01111111) << shift
             if (b & 0b10000000) == 0:
@@ -377,8 +452,8 @@ class BanchoPacketReader:
 
             shift += 7
 
-        val = self.body_view[:length].tobytes().decode()  # copy
-        self.body_view = self.body_view[length:]
+        val = str(self.body_view[self.offset:self.offset + length], 'utf-8')
+        self.offset += length
         return val
 
     # custom osu! types
@@ -405,7 +480,7 @@ class BanchoPacketReader:
         m = Match()
 
         # ignore match id (i16) and inprogress (i8).
-        self.body_view = self.body_view[3:]
+        self.offset += 3
 
         self.read_i8()  # powerplay unused
 
@@ -427,7 +502,7 @@ class BanchoPacketReader:
         for slot in m.slots:
             if slot.status & SlotStatus.has_player:
                 # we don't need this, ignore it.
-                self.body_view = self.body_view[4:]
+                self.offset += 4
 
         host_id = self.read_i32()
         m.host = glob.players.get(id=host_id)
@@ -449,8 +524,8 @@ class BanchoPacketReader:
         return m
 
     def read_scoreframe(self) -> ScoreFrame:
-        sf = ScoreFrame(*SCOREFRAME_FMT.unpack_from(self.body_view[:29]))
-        self.body_view = self.body_view[29:]
+        sf = ScoreFrame(*SCOREFRAME_FMT.unpack_from(self.body_view, self.offset))
+        self.offset += SCOREFRAME_FMT.size
 
         if sf.score_v2:
             sf.combo_portion = self.read_f64()
@@ -459,29 +534,25 @@ class BanchoPacketReader:
         return sf
 
     def read_replayframe(self) -> ReplayFrame:
-        return ReplayFrame(
-            button_state=self.read_u8(),
-            taiko_byte=self.read_u8(),  # pre-taiko support (<=2008)
-            x=self.read_f32(),
-            y=self.read_f32(),
-            time=self.read_i32()
+        frame = ReplayFrame._make(
+            REPLAYFRAME_FMT.unpack_from(self.body_view, self.offset)
         )
+        self.offset += REPLAYFRAME_FMT.size
+        return frame
+
+    def read_replayframes(self, count: int) -> list[ReplayFrame]:
+        """Read `count` consecutive replay frames in bulk."""
+        end = self.offset + count * REPLAYFRAME_FMT.size
+        frames = list(map(ReplayFrame._make, REPLAYFRAME_FMT.iter_unpack(
+            self.body_view[self.offset:end]
+        )))
+        self.offset = end
+        return frames
 
     def read_replayframe_bundle(self) -> ReplayFrameBundle:
-        # save raw format to distribute to the other clients
-        raw_data = self.body_view[:self.current_len]
-
-        extra = self.read_i32()  # bancho proto >= 18
-        framecount = self.read_u16()
-        frames = [self.read_replayframe() for _ in range(framecount)]
-        action = ReplayAction(self.read_u8())
-        scoreframe = self.read_scoreframe()
-        sequence = self.read_u16()
-
-        return ReplayFrameBundle(
-            frames, scoreframe, action,
-            extra, sequence, raw_data
-        )
+        # the frames are only parsed if they're inspected; we
+        # save the raw format to distribute to the other clients.
+        return ReplayFrameBundle(self.read_raw())
 
 # write functions
 
@@ -641,6 +712,8 @@ _expand_types: dict[osuTypes, Callable[..., bytearray]] = {
 
 def write(packid: int, *args: tuple[Any, osuTypes]) -> bytes:
     """ Write `args` into bytes. """
+    # NOTE: the packets below use precompiled `PacketLayout`s;
+    # this is kept for one-off packets & external tooling.
     ret = bytearray(struct.pack('<Hx', packid))
 
     for p_args, p_type in args:
@@ -655,6 +728,100 @@ def write(packid: int, *args: tuple[Any, osuTypes]) -> bytes:
     ret[3:3] = struct.pack('<I', len(ret) - 3)
     return bytes(ret)
 
+_fixed_fmts: dict[osuTypes, str] = {
+    osuTypes.i8: 'b',
+    osuTypes.u8: 'B',
+    osuTypes.i16: 'h',
+    osuTypes.u16: 'H',
+    osuTypes.i32: 'i',
+    osuTypes.u32: 'I',
+    osuTypes.f32: 'f',
+    osuTypes.i64: 'q',
+    osuTypes.u64: 'Q',
+    osuTypes.f64: 'd'
+}
+
+def write_raw(data: Union[bytes, memoryview]) -> Union[bytes, memoryview]:
+    """ Write `data` as-is (already serialized). """
+    return data
+
+_variable_types: dict[osuTypes, Callable[..., Union[bytes, bytearray]]] = {
+    osuTypes.raw: write_raw,
+    **{t: f for t, f in _noexpand_types.items() if t not in _fixed_fmts},
+    **_expand_types
+}
+
+class PacketLayout:
+    """\
+    A server packet's layout, declared once & compiled into a writer.
+
+    Consecutive fixed-width fields are merged into a single precompiled
+    `struct.Struct`, and when every field is fixed-width (very common),
+    the header is compiled in as well, making the packet a single pack().
+    Otherwise, the header is reserved up front and it's length filled in
+    once the body has been written, rather than spliced in afterwards.
+
+    Calling the layout takes one value per field; fields of types which
+    expand (message, channel, match) take a tuple of their arguments.
+
+    Intended Usage:
+    >>> USER_ID = PacketLayout(ServerPackets.USER_ID, osuTypes.i32)
+    >>> USER_ID(3)
+    b'\x05\x00\x00\x04\x00\x00\x00\x03\x00\x00\x00'
+    """
+    __slots__ = ('packid', 'steps', 'static')
+
+    def __init__(self, packid: ServerPackets, *types: osuTypes) -> None:
+        self.packid = packid
+
+        # (writer, argc, expand) for each run of the body
+        self.steps: list[tuple[Callable[..., Any], int, bool]] = []
+
+        fmt = ''
+        for t in types:
+            if t in _fixed_fmts:
+                fmt += _fixed_fmts[t]
+                continue
+
+            if fmt:
+                self.steps.append((struct.Struct(f'<{fmt}').pack, len(fmt), False))
+                fmt = ''
+
+            self.steps.append((_variable_types[t], 1, t in _expand_types))
+
+        if not self.steps:
+            # entirely fixed-width, compile the header in too.
+            self.static: Optional[struct.Struct] = struct.Struct(f'<HxI{fmt}')
+        else:
+            self.static = None
+
+            if fmt:
+                self.steps.append((struct.Struct(f'<{fmt}').pack, len(fmt), False))
+
+    def __repr__(self) -> str:
+        return f'<PacketLayout {self.packid!r}>'
+
+    def __call__(self, *args: Any) -> bytes:
+        """Write a packet from `args`, in the order of the layout."""
+        if self.static is not None:
+            return self.static.pack(self.packid, self.static.size - 7, *args)
+
+        ret = bytearray(7) # reserved for the header
+        i = 0
+
+        for writer, argc, expand in self.steps:
+            if argc != 1:
+                ret += writer(*args[i:i + argc])
+            elif expand:
+                ret += writer(*args[i])
+            else:
+                ret += writer(args[i])
+
+            i += argc
+
+        PACKET_HEADER.pack_into(ret, 0, self.packid, len(ret) - 7)
+        return bytes(ret)
+
 #
 # packets
 #
@@ -662,6 +829,9 @@ def write(packid: int, *args: tuple[Any, osuTypes]) -> bytes:
 # packet id: 5
 
 
+_USER_ID = PacketLayout(ServerPackets.USER_ID, osuTypes.i32)
+
+
 @cache
 def userID(id: int) -> bytes:
     # id responses:
@@ -674,37 +844,40 @@ def userID(id: int) -> bytes:
     # -7: password reset
     # -8: requires verification
     # ??: valid id
-    return write(
-        ServerPackets.USER_ID,
-        (id, osuTypes.i32)
-    )
+    return _USER_ID(id)
 
 # packet id: 7
 
 
+_SEND_MESSAGE = PacketLayout(ServerPackets.SEND_MESSAGE, osuTypes.message)
+
+
 def sendMessage(sender: str, msg: str, recipient: str,
                 sender_id: int) -> bytes:
-    return write(
-        ServerPackets.SEND_MESSAGE,
-        ((sender, msg, recipient, sender_id), osuTypes.message)
-    )
+    return _SEND_MESSAGE((sender, msg, recipient, sender_id))
 
 # packet id: 8
 
 
+_PONG = PacketLayout(ServerPackets.PONG)
+
+
 @cache
 def pong() -> bytes:
-    return write(ServerPackets.PONG)
+    return _PONG()
 
 # packet id: 9
 # NOTE: deprecated
 
 
+_HANDLE_IRC_CHANGE_USERNAME = PacketLayout(
+    ServerPackets.HANDLE_IRC_CHANGE_USERNAME,
+    osuTypes.string
+)
+
+
 def changeUsername(old: str, new: str) -> bytes:
-    return write(
-        ServerPackets.HANDLE_IRC_CHANGE_USERNAME,
-        (f'{old}>>>>{new}', osuTypes.string)
-    )
+    return _HANDLE_IRC_CHANGE_USERNAME(f'{old}>>>>{new}')
 
 
 BOT_STATUSES = (
@@ -723,26 +896,43 @@ BOT_STATUSES = (
 # `bg_loops.reroll_bot_status` to keep fresh.
 
 
+_USER_STATS = PacketLayout(
+    ServerPackets.USER_STATS,
+    osuTypes.i32,  # id
+    osuTypes.u8,  # action
+    osuTypes.string,  # info_text
+    osuTypes.string,  # map_md5
+    osuTypes.i32,  # mods
+    osuTypes.u8,  # mode
+    osuTypes.i32,  # map_id
+    osuTypes.i64,  # rscore
+    osuTypes.f32,  # acc
+    osuTypes.i32,  # plays
+    osuTypes.i64,  # tscore
+    osuTypes.i32,  # rank
+    osuTypes.i16  # pp
+)
+
+
 @cache
 def botStats() -> bytes:
     # pick at random from list of potential statuses.
     status_id, status_txt = random.choice(BOT_STATUSES)
 
-    return write(
-        ServerPackets.USER_STATS,
-        (glob.bot.id, osuTypes.i32),  # id
-        (status_id, osuTypes.u8),  # action
-        (status_txt, osuTypes.string),  # info_text
-        ('', osuTypes.string),  # map_md5
-        (0, osuTypes.i32),  # mods
-        (0, osuTypes.u8),  # mode
-        (0, osuTypes.i32),  # map_id
-        (0, osuTypes.i64),  # rscore
-        (0.0, osuTypes.f32),  # acc
-        (0, osuTypes.i32),  # plays
-        (0, osuTypes.i64),  # tscore
-        (0, osuTypes.i32),  # rank
-        (0, osuTypes.i16)  # pp
+    return _USER_STATS(
+        glob.bot.id,  # id
+        status_id,  # action
+        status_txt,  # info_text
+        '',  # map_md5
+        0,  # mods
+        0,  # mode
+        0,  # map_id
+        0,  # rscore
+        0.0,  # acc
+        0,  # plays
+        0,  # tscore
+        0,  # rank
+        0  # pp
     )
 
 # packet id: 11
@@ -762,53 +952,54 @@ def userStats(p: 'Player') -> bytes:
         rscore = gm_stats.rscore
         pp = gm_stats.pp
 
-    return write(
-        ServerPackets.USER_STATS,
-        (p.id, osuTypes.i32),
-        (p.status.action, osuTypes.u8),
-        (p.status.info_text, osuTypes.string),
-        (p.status.map_md5, osuTypes.string),
-        (p.status.mods, osuTypes.i32),
-        (p.status.mode.as_vanilla, osuTypes.u8),
-        (p.status.map_id, osuTypes.i32),
-        (rscore, osuTypes.i64),
-        (gm_stats.acc / 100.0, osuTypes.f32),
-        (gm_stats.plays, osuTypes.i32),
-        (gm_stats.tscore, osuTypes.i64),
-        (gm_stats.rank, osuTypes.i32),
-        (pp, osuTypes.i16)  # why not u16 peppy :(
+    return _USER_STATS(
+        p.id,
+        p.status.action,
+        p.status.info_text,
+        p.status.map_md5,
+        p.status.mods,
+        p.status.mode.as_vanilla,
+        p.status.map_id,
+        rscore,
+        gm_stats.acc / 100.0,
+        gm_stats.plays,
+        gm_stats.tscore,
+        gm_stats.rank,
+        pp  # why not u16 peppy :(
     )
 
 # packet id: 12
 
 
+_USER_LOGOUT = PacketLayout(
+    ServerPackets.USER_LOGOUT,
+    osuTypes.i32, osuTypes.u8
+)
+
+
 @cache
 def logout(userID: int) -> bytes:
-    return write(
-        ServerPackets.USER_LOGOUT,
-        (userID, osuTypes.i32),
-        (0, osuTypes.u8)
-    )
+    return _USER_LOGOUT(userID, 0)
 
 # packet id: 13
 
 
+_SPECTATOR_JOINED = PacketLayout(ServerPackets.SPECTATOR_JOINED, osuTypes.i32)
+
+
 @cache
 def spectatorJoined(id: int) -> bytes:
-    return write(
-        ServerPackets.SPECTATOR_JOINED,
-        (id, osuTypes.i32)
-    )
+    return _SPECTATOR_JOINED(id)
 
 # packet id: 14
 
 
+_SPECTATOR_LEFT = PacketLayout(ServerPackets.SPECTATOR_LEFT, osuTypes.i32)
+
+
 @cache
 def spectatorLeft(id: int) -> bytes:
-    return write(
-        ServerPackets.SPECTATOR_LEFT,
-        (id, osuTypes.i32)
-    )
+    return _SPECTATOR_LEFT(id)
 
 # packet id: 15
 # TODO: perhaps optimize this and match
@@ -816,125 +1007,151 @@ def spectatorLeft(id: int) -> bytes:
 # they're literally spammed between clients.
 
 
+_SPECTATE_FRAMES = PacketLayout(ServerPackets.SPECTATE_FRAMES, osuTypes.raw)
+
+
 def spectateFrames(data: bytes) -> bytes:
-    return write(
-        ServerPackets.SPECTATE_FRAMES,
-        (data, osuTypes.raw)
-    )
+    return _SPECTATE_FRAMES(data)
 
 # packet id: 19
 
 
+_VERSION_UPDATE = PacketLayout(ServerPackets.VERSION_UPDATE)
+
+
 @cache
 def versionUpdate() -> bytes:
-    return write(ServerPackets.VERSION_UPDATE)
+    return _VERSION_UPDATE()
 
 # packet id: 22
 
 
+_SPECTATOR_CANT_SPECTATE = PacketLayout(
+    ServerPackets.SPECTATOR_CANT_SPECTATE,
+    osuTypes.i32
+)
+
+
 @cache
 def spectatorCantSpectate(id: int) -> bytes:
-    return write(
-        ServerPackets.SPECTATOR_CANT_SPECTATE,
-        (id, osuTypes.i32)
-    )
+    return _SPECTATOR_CANT_SPECTATE(id)
 
 # packet id: 23
 
 
+_GET_ATTENTION = PacketLayout(ServerPackets.GET_ATTENTION)
+
+
 @cache
 def getAttention() -> bytes:
-    return write(ServerPackets.GET_ATTENTION)
+    return _GET_ATTENTION()
 
 # packet id: 24
 
 
+_NOTIFICATION = PacketLayout(ServerPackets.NOTIFICATION, osuTypes.string)
+
+
 @lru_cache(maxsize=4)
 def notification(msg: str) -> bytes:
-    return write(
-        ServerPackets.NOTIFICATION,
-        (msg, osuTypes.string)
-    )
+    return _NOTIFICATION(msg)
 
 # packet id: 26
 
 
+_UPDATE_MATCH = PacketLayout(ServerPackets.UPDATE_MATCH, osuTypes.match)
+
+
 def updateMatch(m: Match, send_pw: bool = True) -> bytes:
-    return write(
-        ServerPackets.UPDATE_MATCH,
-        ((m, send_pw), osuTypes.match)
-    )
+    return _UPDATE_MATCH((m, send_pw))
 
 # packet id: 27
 
 
+_NEW_MATCH = PacketLayout(ServerPackets.NEW_MATCH, osuTypes.match)
+
+
 def newMatch(m: Match) -> bytes:
-    return write(
-        ServerPackets.NEW_MATCH,
-        ((m, True), osuTypes.match)
-    )
+    return _NEW_MATCH((m, True))
 
 # packet id: 28
 
 
+_DISPOSE_MATCH = PacketLayout(ServerPackets.DISPOSE_MATCH, osuTypes.i32)
+
+
 @cache
 def disposeMatch(id: int) -> bytes:
-    return write(
-        ServerPackets.DISPOSE_MATCH,
-        (id, osuTypes.i32)
-    )
+    return _DISPOSE_MATCH(id)
 
 # packet id: 34
 
 
+_TOGGLE_BLOCK_NON_FRIEND_DMS = PacketLayout(
+    ServerPackets.TOGGLE_BLOCK_NON_FRIEND_DMS
+)
+
+
 @cache
 def toggleBlockNonFriendPM() -> bytes:
-    return write(ServerPackets.TOGGLE_BLOCK_NON_FRIEND_DMS)
+    return _TOGGLE_BLOCK_NON_FRIEND_DMS()
 
 # packet id: 36
 
 
+_MATCH_JOIN_SUCCESS = PacketLayout(
+    ServerPackets.MATCH_JOIN_SUCCESS,
+    osuTypes.match
+)
+
+
 def matchJoinSuccess(m: Match) -> bytes:
-    return write(
-        ServerPackets.MATCH_JOIN_SUCCESS,
-        ((m, True), osuTypes.match)
-    )
+    return _MATCH_JOIN_SUCCESS((m, True))
 
 # packet id: 37
 
 
+_MATCH_JOIN_FAIL = PacketLayout(ServerPackets.MATCH_JOIN_FAIL)
+
+
 @cache
 def matchJoinFail() -> bytes:
-    return write(ServerPackets.MATCH_JOIN_FAIL)
+    return _MATCH_JOIN_FAIL()
 
 # packet id: 42
 
 
+_FELLOW_SPECTATOR_JOINED = PacketLayout(
+    ServerPackets.FELLOW_SPECTATOR_JOINED,
+    osuTypes.i32
+)
+
+
 @cache
 def fellowSpectatorJoined(id: int) -> bytes:
-    return write(
-        ServerPackets.FELLOW_SPECTATOR_JOINED,
-        (id, osuTypes.i32)
-    )
+    return _FELLOW_SPECTATOR_JOINED(id)
 
 # packet id: 43
 
 
+_FELLOW_SPECTATOR_LEFT = PacketLayout(
+    ServerPackets.FELLOW_SPECTATOR_LEFT,
+    osuTypes.i32
+)
+
+
 @cache
 def fellowSpectatorLeft(id: int) -> bytes:
-    return write(
-        ServerPackets.FELLOW_SPECTATOR_LEFT,
-        (id, osuTypes.i32)
-    )
+    return _FELLOW_SPECTATOR_LEFT(id)
 
 # packet id: 46
 
 
+_MATCH_START = PacketLayout(ServerPackets.MATCH_START, osuTypes.match)
+
+
 def matchStart(m: Match) -> bytes:
-    return write(
-        ServerPackets.MATCH_START,
-        ((m, True), osuTypes.match)
-    )
+    return _MATCH_START((m, True))
 
 # packet id: 48
 # NOTE: this is actually unused, since it's
@@ -943,91 +1160,117 @@ def matchStart(m: Match) -> bytes:
 #       end up doing it eventually for security reasons
 
 
+_MATCH_SCORE_UPDATE = PacketLayout(
+    ServerPackets.MATCH_SCORE_UPDATE,
+    osuTypes.scoreframe
+)
+
+
 def matchScoreUpdate(frame: ScoreFrame) -> bytes:
-    return write(
-        ServerPackets.MATCH_SCORE_UPDATE,
-        (frame, osuTypes.scoreframe)
-    )
+    return _MATCH_SCORE_UPDATE(frame)
 
 # packet id: 50
 
 
+_MATCH_TRANSFER_HOST = PacketLayout(ServerPackets.MATCH_TRANSFER_HOST)
+
+
 @cache
 def matchTransferHost() -> bytes:
-    return write(ServerPackets.MATCH_TRANSFER_HOST)
+    return _MATCH_TRANSFER_HOST()
 
 # packet id: 53
 
 
+_MATCH_ALL_PLAYERS_LOADED = PacketLayout(
+    ServerPackets.MATCH_ALL_PLAYERS_LOADED
+)
+
+
 @cache
 def matchAllPlayerLoaded() -> bytes:
-    return write(ServerPackets.MATCH_ALL_PLAYERS_LOADED)
+    return _MATCH_ALL_PLAYERS_LOADED()
 
 # packet id: 57
 
 
+_MATCH_PLAYER_FAILED = PacketLayout(
+    ServerPackets.MATCH_PLAYER_FAILED,
+    osuTypes.i32
+)
+
+
 @cache
 def matchPlayerFailed(slot_id: int) -> bytes:
-    return write(
-        ServerPackets.MATCH_PLAYER_FAILED,
-        (slot_id, osuTypes.i32)
-    )
+    return _MATCH_PLAYER_FAILED(slot_id)
 
 # packet id: 58
 
 
+_MATCH_COMPLETE = PacketLayout(ServerPackets.MATCH_COMPLETE)
+
+
 @cache
 def matchComplete() -> bytes:
-    return write(ServerPackets.MATCH_COMPLETE)
+    return _MATCH_COMPLETE()
 
 # packet id: 61
 
 
+_MATCH_SKIP = PacketLayout(ServerPackets.MATCH_SKIP)
+
+
 @cache
 def matchSkip() -> bytes:
-    return write(ServerPackets.MATCH_SKIP)
+    return _MATCH_SKIP()
 
 # packet id: 64
 
 
+_CHANNEL_JOIN_SUCCESS = PacketLayout(
+    ServerPackets.CHANNEL_JOIN_SUCCESS,
+    osuTypes.string
+)
+
+
 @lru_cache(maxsize=16)
 def channelJoin(name: str) -> bytes:
-    return write(
-        ServerPackets.CHANNEL_JOIN_SUCCESS,
-        (name, osuTypes.string)
-    )
+    return _CHANNEL_JOIN_SUCCESS(name)
 
 # packet id: 65
 
 
+_CHANNEL_INFO = PacketLayout(ServerPackets.CHANNEL_INFO, osuTypes.channel)
+
+
 @lru_cache(maxsize=8)
 def channelInfo(name: str, topic: str,
                 p_count: int) -> bytes:
-    return write(
-        ServerPackets.CHANNEL_INFO,
-        ((name, topic, p_count), osuTypes.channel)
-    )
+    return _CHANNEL_INFO((name, topic, p_count))
 
 # packet id: 66
 
 
+_CHANNEL_KICK = PacketLayout(ServerPackets.CHANNEL_KICK, osuTypes.string)
+
+
 @lru_cache(maxsize=8)
 def channelKick(name: str) -> bytes:
-    return write(
-        ServerPackets.CHANNEL_KICK,
-        (name, osuTypes.string)
-    )
+    return _CHANNEL_KICK(name)
 
 # packet id: 67
 
 
+_CHANNEL_AUTO_JOIN = PacketLayout(
+    ServerPackets.CHANNEL_AUTO_JOIN,
+    osuTypes.channel
+)
+
+
 @lru_cache(maxsize=8)
 def channelAutoJoin(name: str, topic: str,
                     p_count: int) -> bytes:
-    return write(
-        ServerPackets.CHANNEL_AUTO_JOIN,
-        ((name, topic, p_count), osuTypes.channel)
-    )
+    return _CHANNEL_AUTO_JOIN((name, topic, p_count))
 
 # packet id: 69
 # def beatmapInfoReply(maps: Sequence[BeatmapInfo]) -> bytes:
@@ -1039,46 +1282,49 @@ def channelAutoJoin(name: str, topic: str,
 # packet id: 71
 
 
+_PRIVILEGES = PacketLayout(ServerPackets.PRIVILEGES, osuTypes.i32)
+
+
 @cache
 def banchoPrivileges(priv: int) -> bytes:
-    return write(
-        ServerPackets.PRIVILEGES,
-        (priv, osuTypes.i32)
-    )
+    return _PRIVILEGES(priv)
 
 # packet id: 72
 
 
+_FRIENDS_LIST = PacketLayout(ServerPackets.FRIENDS_LIST, osuTypes.i32_list)
+
+
 def friendsList(*friends: int) -> bytes:
-    return write(
-        ServerPackets.FRIENDS_LIST,
-        (friends, osuTypes.i32_list)
-    )
+    return _FRIENDS_LIST(friends)
 
 # packet id: 75
 
 
+_PROTOCOL_VERSION = PacketLayout(ServerPackets.PROTOCOL_VERSION, osuTypes.i32)
+
+
 @cache
 def protocolVersion(ver: int) -> bytes:
-    return write(
-        ServerPackets.PROTOCOL_VERSION,
-        (ver, osuTypes.i32)
-    )
+    return _PROTOCOL_VERSION(ver)
 
 # packet id: 76
 
 
+_MAIN_MENU_ICON = PacketLayout(ServerPackets.MAIN_MENU_ICON, osuTypes.string)
+
+
 @cache
 def mainMenuIcon() -> bytes:
-    return write(
-        ServerPackets.MAIN_MENU_ICON,
-        ('|'.join(glob.config.menu_icon), osuTypes.string)
-    )
+    return _MAIN_MENU_ICON('|'.join(glob.config.menu_icon))
 
 # packet id: 80
 # NOTE: deprecated
 
 
+_MONITOR = PacketLayout(ServerPackets.MONITOR)
+
+
 @cache
 def monitor() -> bytes:
     # this is an older (now removed) 'anticheat' feature of the osu!
@@ -1088,17 +1334,20 @@ def monitor() -> bytes:
 
     # this doesn't work on newer clients, and i had no plans
     # of trying to put it to use - just coded for completion.
-    return write(ServerPackets.MONITOR)
+    return _MONITOR()
 
 # packet id: 81
 
 
+_MATCH_PLAYER_SKIPPED = PacketLayout(
+    ServerPackets.MATCH_PLAYER_SKIPPED,
+    osuTypes.i32
+)
+
+
 @cache
 def matchPlayerSkipped(pid: int) -> bytes:
-    return write(
-        ServerPackets.MATCH_PLAYER_SKIPPED,
-        (pid, osuTypes.i32)
-    )
+    return _MATCH_PLAYER_SKIPPED(pid)
 
 # since the bot is always online and is
 # also automatically added to all player's
@@ -1106,18 +1355,30 @@ def matchPlayerSkipped(pid: int) -> bytes:
 # *very* frequently; only build it once.
 
 
+_USER_PRESENCE = PacketLayout(
+    ServerPackets.USER_PRESENCE,
+    osuTypes.i32,  # id
+    osuTypes.string,  # name
+    osuTypes.u8,  # utc offset
+    osuTypes.u8,  # country
+    osuTypes.u8,  # bancho privileges & mode
+    osuTypes.f32,  # longitude
+    osuTypes.f32,  # latitude
+    osuTypes.i32  # rank
+)
+
+
 @cache
 def botPresence() -> bytes:
-    return write(
-        ServerPackets.USER_PRESENCE,
-        (glob.bot.id, osuTypes.i32),
-        (glob.bot.name, osuTypes.string),
-        (-5 + 24, osuTypes.u8),
-        (245, osuTypes.u8),  # satellite provider
-        (31, osuTypes.u8),
-        (1234.0, osuTypes.f32),  # send coordinates waaay
-        (4321.0, osuTypes.f32),  # off the map for the bot
-        (0, osuTypes.i32)
+    return _USER_PRESENCE(
+        glob.bot.id,
+        glob.bot.name,
+        -5 + 24,
+        245,  # satellite provider
+        31,
+        1234.0,  # send coordinates waaay
+        4321.0,  # off the map for the bot
+        0
     )
 
 # packet id: 83
@@ -1127,72 +1388,77 @@ def userPresence(p: 'Player') -> bytes:
     if p is glob.bot:
         return botPresence()
 
-    return write(
-        ServerPackets.USER_PRESENCE,
-        (p.id, osuTypes.i32),
-        (p.name, osuTypes.string),
-        (p.utc_offset + 24, osuTypes.u8),
-        (p.geoloc['country']['numeric'], osuTypes.u8),
-        (p.bancho_priv | (p.status.mode.as_vanilla << 5), osuTypes.u8),
-        (p.geoloc['longitude'], osuTypes.f32),
-        (p.geoloc['latitude'], osuTypes.f32),
-        (p.gm_stats.rank, osuTypes.i32)
+    return _USER_PRESENCE(
+        p.id,
+        p.name,
+        p.utc_offset + 24,
+        p.geoloc['country']['numeric'],
+        p.bancho_priv | (p.status.mode.as_vanilla << 5),
+        p.geoloc['longitude'],
+        p.geoloc['latitude'],
+        p.gm_stats.rank
     )
 
 # packet id: 86
 
 
+_RESTART = PacketLayout(ServerPackets.RESTART, osuTypes.i32)
+
+
 @cache
 def restartServer(ms: int) -> bytes:
-    return write(
-        ServerPackets.RESTART,
-        (ms, osuTypes.i32)
-    )
+    return _RESTART(ms)
 
 # packet id: 88
 
 
+_MATCH_INVITE = PacketLayout(ServerPackets.MATCH_INVITE, osuTypes.message)
+
+
 def matchInvite(p: 'Player', t_name: str) -> bytes:
     msg = f'Come join my game: {p.match.embed}.'
-    return write(
-        ServerPackets.MATCH_INVITE,
-        ((p.name, msg, t_name, p.id), osuTypes.message)
-    )
+    return _MATCH_INVITE((p.name, msg, t_name, p.id))
 
 # packet id: 89
 
 
+_CHANNEL_INFO_END = PacketLayout(ServerPackets.CHANNEL_INFO_END)
+
+
 @cache
 def channelInfoEnd() -> bytes:
-    return write(ServerPackets.CHANNEL_INFO_END)
+    return _CHANNEL_INFO_END()
 
 # packet id: 91
 
 
+_MATCH_CHANGE_PASSWORD = PacketLayout(
+    ServerPackets.MATCH_CHANGE_PASSWORD,
+    osuTypes.string
+)
+
+
 def matchChangePassword(new: str) -> bytes:
-    return write(
-        ServerPackets.MATCH_CHANGE_PASSWORD,
-        (new, osuTypes.string)
-    )
+    return _MATCH_CHANGE_PASSWORD(new)
 
 # packet id: 92
 
 
+_SILENCE_END = PacketLayout(ServerPackets.SILENCE_END, osuTypes.i32)
+
+
 def silenceEnd(delta: int) -> bytes:
-    return write(
-        ServerPackets.SILENCE_END,
-        (delta, osuTypes.i32)
-    )
+    return _SILENCE_END(delta)
 
 # packet id: 94
 
 
+_USER_SILENCED = PacketLayout(ServerPackets.USER_SILENCED, osuTypes.i32)
+
+
 @cache
 def userSilenced(pid: int) -> bytes:
-    return write(
-        ServerPackets.USER_SILENCED,
-        (pid, osuTypes.i32)
-    )
+    return _USER_SILENCED(pid)
 
 
 """ not sure why 95 & 96 exist? unused in gulag """
@@ -1200,94 +1466,118 @@ def userSilenced(pid: int) -> bytes:
 # packet id: 95
 
 
+_USER_PRESENCE_SINGLE = PacketLayout(
+    ServerPackets.USER_PRESENCE_SINGLE,
+    osuTypes.i32
+)
+
+
 @cache
 def userPresenceSingle(pid: int) -> bytes:
-    return write(
-        ServerPackets.USER_PRESENCE_SINGLE,
-        (pid, osuTypes.i32)
-    )
+    return _USER_PRESENCE_SINGLE(pid)
 
 # packet id: 96
 
 
+_USER_PRESENCE_BUNDLE = PacketLayout(
+    ServerPackets.USER_PRESENCE_BUNDLE,
+    osuTypes.i32_list
+)
+
+
 def userPresenceBundle(pid_list: list[int]) -> bytes:
-    return write(
-        ServerPackets.USER_PRESENCE_BUNDLE,
-        (pid_list, osuTypes.i32_list)
-    )
+    return _USER_PRESENCE_BUNDLE(pid_list)
 
 # packet id: 100
 
 
+_USER_DM_BLOCKED = PacketLayout(
+    ServerPackets.USER_DM_BLOCKED,
+    osuTypes.message
+)
+
+
 def userDMBlocked(target: str) -> bytes:
-    return write(
-        ServerPackets.USER_DM_BLOCKED,
-        (('', '', target, 0), osuTypes.message)
-    )
+    return _USER_DM_BLOCKED(('', '', target, 0))
 
 # packet id: 101
 
 
+_TARGET_IS_SILENCED = PacketLayout(
+    ServerPackets.TARGET_IS_SILENCED,
+    osuTypes.message
+)
+
+
 def targetSilenced(target: str) -> bytes:
-    return write(
-        ServerPackets.TARGET_IS_SILENCED,
-        (('', '', target, 0), osuTypes.message)
-    )
+    return _TARGET_IS_SILENCED(('', '', target, 0))
 
 # packet id: 102
 
 
+_VERSION_UPDATE_FORCED = PacketLayout(ServerPackets.VERSION_UPDATE_FORCED)
+
+
 @cache
 def versionUpdateForced() -> bytes:
-    return write(ServerPackets.VERSION_UPDATE_FORCED)
+    return _VERSION_UPDATE_FORCED()
 
 # packet id: 103
 
 
+_SWITCH_SERVER = PacketLayout(ServerPackets.SWITCH_SERVER, osuTypes.i32)
+
+
 def switchServer(t: int) -> bytes:
     # increment endpoint index if
     # idletime >= t && match == null
-    return write(
-        ServerPackets.SWITCH_SERVER,
-        (t, osuTypes.i32)
-    )
+    return _SWITCH_SERVER(t)
 
 # packet id: 104
 
 
+_ACCOUNT_RESTRICTED = PacketLayout(ServerPackets.ACCOUNT_RESTRICTED)
+
+
 @cache
 def accountRestricted() -> bytes:
-    return write(ServerPackets.ACCOUNT_RESTRICTED)
+    return _ACCOUNT_RESTRICTED()
 
 # packet id: 105
 # NOTE: deprecated
 
 
+_RTX = PacketLayout(ServerPackets.RTX, osuTypes.string)
+
+
 def RTX(msg: str) -> bytes:
     # bit of a weird one, sends a request to the client
     # to show some visual effects on screen for 5 seconds:
     # - black screen, freezes game, beeps loudly.
     # within the next 3-8 seconds at random.
-    return write(
-        ServerPackets.RTX,
-        (msg, osuTypes.string)
-    )
+    return _RTX(msg)
 
 # packet id: 106
 
 
+_MATCH_ABORT = PacketLayout(ServerPackets.MATCH_ABORT)
+
+
 @cache
 def matchAbort() -> bytes:
-    return write(ServerPackets.MATCH_ABORT)
+    return _MATCH_ABORT()
 
 # packet id: 107
 
 
+_SWITCH_TOURNAMENT_SERVER = PacketLayout(
+    ServerPackets.SWITCH_TOURNAMENT_SERVER,
+    osuTypes.string
+)
+
+
 def switchTournamentServer(ip: str) -> bytes:
     # the client only reads the string if it's
     # not on the client's normal endpoints,
     # but we can send it either way xd.
-    return write(
-        ServerPackets.SWITCH_TOURNAMENT_SERVER,
-        (ip, osuTypes.string)
-    )
+    return _SWITCH_TOURNAMENT_SERVER(ip)
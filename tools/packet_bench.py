@@ -0,0 +1,133 @@
+#!/usr/bin/env python3.9
+
+# compare the precompiled packet layouts against the generic
+# tuple-dispatching `packets.write()` for our hottest packets.
+# usage: run from gulag's root directory, `./tools/packet_bench.py`
+
+import os
+import sys
+import timeit
+from types import SimpleNamespace
+
+sys.path.insert(0, os.getcwd())
+
+import packets
+from constants.gamemodes import GameMode
+from constants.mods import Mods
+from constants.types import osuTypes
+from objects import glob
+from objects.match import Match
+from objects.match import SlotStatus
+from packets import ServerPackets
+from packets import write
+
+ITERATIONS = 200_000
+
+# the packet functions as they were prior to the layouts.
+
+def old_userStats(p) -> bytes:
+    gm_stats = p.gm_stats
+    return write(
+        ServerPackets.USER_STATS,
+        (p.id, osuTypes.i32),
+        (p.status.action, osuTypes.u8),
+        (p.status.info_text, osuTypes.string),
+        (p.status.map_md5, osuTypes.string),
+        (p.status.mods, osuTypes.i32),
+        (p.status.mode.as_vanilla, osuTypes.u8),
+        (p.status.map_id, osuTypes.i32),
+        (gm_stats.rscore, osuTypes.i64),
+        (gm_stats.acc / 100.0, osuTypes.f32),
+        (gm_stats.plays, osuTypes.i32),
+        (gm_stats.tscore, osuTypes.i64),
+        (gm_stats.rank, osuTypes.i32),
+        (gm_stats.pp, osuTypes.i16)
+    )
+
+def old_userPresence(p) -> bytes:
+    return write(
+        ServerPackets.USER_PRESENCE,
+        (p.id, osuTypes.i32),
+        (p.name, osuTypes.string),
+        (p.utc_offset + 24, osuTypes.u8),
+        (p.geoloc['country']['numeric'], osuTypes.u8),
+        (p.bancho_priv | (p.status.mode.as_vanilla << 5), osuTypes.u8),
+        (p.geoloc['longitude'], osuTypes.f32),
+        (p.geoloc['latitude'], osuTypes.f32),
+        (p.gm_stats.rank, osuTypes.i32)
+    )
+
+def old_sendMessage(sender: str, msg: str, recipient: str,
+                    sender_id: int) -> bytes:
+    return write(
+        ServerPackets.SEND_MESSAGE,
+        ((sender, msg, recipient, sender_id), osuTypes.message)
+    )
+
+def old_updateMatch(m: Match, send_pw: bool = True) -> bytes:
+    return write(
+        ServerPackets.UPDATE_MATCH,
+        ((m, send_pw), osuTypes.match)
+    )
+
+def make_player() -> SimpleNamespace:
+    """Create a stand-in with everything the stats & presence packets use."""
+    return SimpleNamespace(
+        id=3, name='cmyui', utc_offset=-5, bancho_priv=31,
+        geoloc={
+            'latitude': 43.65, 'longitude': -79.38,
+            'country': {'acronym': 'ca', 'numeric': 38}
+        },
+        status=SimpleNamespace(
+            action=2, info_text='Camellia - Exit This Earth\'s Atomosphere',
+            map_md5='1cf5b2c2edfafd055536d2cefcb89c0e', mods=Mods.HIDDEN,
+            mode=GameMode.vn_std, map_id=2284572
+        ),
+        gm_stats=SimpleNamespace(
+            tscore=123_456_789_012, rscore=12_345_678_901, pp=9876,
+            acc=98.76, plays=12345, rank=1
+        )
+    )
+
+def make_match(host: SimpleNamespace) -> Match:
+    """Create a match with a full lobby of players."""
+    m = Match()
+    m.id = 1
+    m.name = 'cmyui\'s game'
+    m.passwd = 'secret'
+    m.map_name = 'Camellia - Exit This Earth\'s Atomosphere [Evolution]'
+    m.map_id = 2284572
+    m.map_md5 = '1cf5b2c2edfafd055536d2cefcb89c0e'
+    m.host = host
+
+    for slot in m.slots:
+        slot.status = SlotStatus.not_ready
+        slot.player = host
+
+    return m
+
+def bench(name: str, old, new, *args) -> None:
+    assert old(*args) == new(*args), f'{name} output differs!'
+
+    old_t = timeit.timeit(lambda: old(*args), number=ITERATIONS)
+    new_t = timeit.timeit(lambda: new(*args), number=ITERATIONS)
+
+    print(f'{name:<14} {old_t * 1e9 / ITERATIONS:>8.0f}ns '
+          f'{new_t * 1e9 / ITERATIONS:>8.0f}ns '
+          f'{old_t / new_t:>6.2f}x')
+
+def main() -> int:
+    glob.bot = None  # packets check `p is glob.bot`
+    p = make_player()
+    m = make_match(p)
+
+    print(f'{"packet":<14} {"write()":>10} {"layout":>10} {"speedup":>7}')
+    bench('userStats', old_userStats, packets.userStats, p)
+    bench('userPresence', old_userPresence, packets.userPresence, p)
+    bench('sendMessage', old_sendMessage, packets.sendMessage,
+          'cmyui', 'hello world!', '#osu', 3)
+    bench('updateMatch', old_updateMatch, packets.updateMatch, m)
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())